@@ -1,2 +1,3 @@
 from punpy.mc.mc_propagation import MCPropagation
+from punpy.lpu.lpu_propagation import LPUPropagation
 #from punpy.mc.MCMC_retrieval import MCMCRetrieval
@@ -0,0 +1,504 @@
+"""Use the law of propagation of uncertainty (LPU) to propagate uncertainties through a measurement function"""
+
+import numpy as np
+from punpy.mc.mc_propagation import MCPropagation
+from punpy.mc.cholesky_cache import cholesky_cache
+from punpy.mc.structured_covariance import StructuredCovariance
+
+'''___Authorship___'''
+__author__ = "Pieter De Vis"
+__created__ = "18/10/2026"
+__maintainer__ = "Pieter De Vis"
+__email__ = "pieter.de.vis@npl.co.uk"
+__status__ = "Development"
+
+class LPUPropagation:
+    def __init__(self,step=1e-3,central=False,batch_size=None):
+        """
+        Initialise LPU Propagator. The Jacobian of the measurement function is calculated numerically using finite
+        differences, by perturbing each element of each input quantity in turn. All perturbations are evaluated
+        in a single vectorised call of the measurement function, with the perturbations along the last axis of the
+        input quantities (in the same way as the MC iterations for MCPropagation with parallel_cores=0). The
+        covariance matrix of the measurand is then given by J.Cov_x.J^T.
+
+        :param step: size of the finite-difference perturbations, relative to the standard uncertainty of each element of the input quantities (or relative to the value, for elements without uncertainty). Defaults to 1e-3.
+        :type step: float, optional
+        :param central: set to True to use central differences (2n evaluations of the measurement function for n elements of the input quantities, more accurate for non-linear measurement functions) instead of forward differences (n+1 evaluations). Defaults to False.
+        :type central: bool, optional
+        :param batch_size: maximum number of perturbations evaluated in a single call of the measurement function. Defaults to None, for which all perturbations are evaluated at once.
+        :type batch_size: int, optional
+        """
+        self.step = step
+        self.central = central
+        if batch_size is not None and batch_size < 1:
+            raise ValueError("The batch_size needs to be a positive integer (or None).")
+        self.batch_size = batch_size
+
+    def propagate_random(self,func,x,u_x,corr_between=None,return_corr=False,return_Jacobian=False,corr_axis=-99,output_vars=1):
+        """
+        Propagate random uncertainties through measurement function with n input quantities.
+        Input quantities can be floats, vectors or images.
+
+        :param func: measurement function
+        :type func: function
+        :param x: list of input quantities (usually numpy arrays)
+        :type x: list[array]
+        :param u_x: list of random uncertainties on input quantities (usually numpy arrays)
+        :type u_x: list[array]
+        :param corr_between: covariance matrix (n,n) between input quantities, defaults to None
+        :type corr_between: array, optional
+        :param return_corr: set to True to return correlation matrix of measurand, defaults to False
+        :type return_corr: bool, optional
+        :param return_Jacobian: set to True to return the Jacobian matrix of the measurement function, defaults to False
+        :type return_Jacobian: bool, optional
+        :param corr_axis: set to positive integer to select the axis used in the correlation matrix. The correlation matrix will then be averaged over other dimensions. Defaults to -99, for which the input array will be flattened and the full correlation matrix calculated.
+        :type corr_axis: integer, optional
+        :param output_vars: number of output parameters in the measurement function. Defaults to 1.
+        :type output_vars: integer, optional
+        :return: uncertainties on measurand
+        :rtype: array
+        """
+        factors = []
+        for i in range(len(x)):
+            if u_x[i] is None:
+                u_x[i] = np.zeros_like(x[i])
+            factors.append(self.factor_random(x[i],u_x[i]))
+
+        return self.run_lpu(func,x,factors,corr_between,return_corr,return_Jacobian,corr_axis,output_vars)
+
+    def propagate_systematic(self,func,x,u_x,corr_between=None,return_corr=False,return_Jacobian=False,corr_axis=-99,output_vars=1):
+        """
+        Propagate systematic uncertainties through measurement function with n input quantities.
+        Input quantities can be floats, vectors or images.
+
+        :param func: measurement function
+        :type func: function
+        :param x: list of input quantities (usually numpy arrays)
+        :type x: list[array]
+        :param u_x: list of systematic uncertainties on input quantities (usually numpy arrays)
+        :type u_x: list[array]
+        :param corr_between: covariance matrix (n,n) between input quantities, defaults to None
+        :type corr_between: array, optional
+        :param return_corr: set to True to return correlation matrix of measurand, defaults to False
+        :type return_corr: bool, optional
+        :param return_Jacobian: set to True to return the Jacobian matrix of the measurement function, defaults to False
+        :type return_Jacobian: bool, optional
+        :param corr_axis: set to positive integer to select the axis used in the correlation matrix. The correlation matrix will then be averaged over other dimensions. Defaults to -99, for which the input array will be flattened and the full correlation matrix calculated.
+        :type corr_axis: integer, optional
+        :param output_vars: number of output parameters in the measurement function. Defaults to 1.
+        :type output_vars: integer, optional
+        :return: uncertainties on measurand
+        :rtype: array
+        """
+        factors = []
+        for i in range(len(x)):
+            if u_x[i] is None:
+                u_x[i] = np.zeros_like(x[i])
+            factors.append(self.factor_systematic(x[i],u_x[i]))
+
+        return self.run_lpu(func,x,factors,corr_between,return_corr,return_Jacobian,corr_axis,output_vars)
+
+    def propagate_both(self,func,x,u_x_rand,u_x_syst,corr_between=None,return_corr=True,return_Jacobian=False,corr_axis=-99,output_vars=1):
+        """
+        Propagate random and systematic uncertainties through measurement function with n input quantities.
+        Input quantities can be floats, vectors or images.
+
+        :param func: measurement function
+        :type func: function
+        :param x: list of input quantities (usually numpy arrays)
+        :type x: list[array]
+        :param u_x_rand: list of random uncertainties on input quantities (usually numpy arrays)
+        :type u_x_rand: list[array]
+        :param u_x_syst: list of systematic uncertainties on input quantities (usually numpy arrays)
+        :type u_x_syst: list[array]
+        :param corr_between: covariance matrix (n,n) between input quantities, defaults to None
+        :type corr_between: array, optional
+        :param return_corr: set to True to return correlation matrix of measurand, defaults to True
+        :type return_corr: bool, optional
+        :param return_Jacobian: set to True to return the Jacobian matrix of the measurement function, defaults to False
+        :type return_Jacobian: bool, optional
+        :param corr_axis: set to positive integer to select the axis used in the correlation matrix. The correlation matrix will then be averaged over other dimensions. Defaults to -99, for which the input array will be flattened and the full correlation matrix calculated.
+        :type corr_axis: integer, optional
+        :param output_vars: number of output parameters in the measurement function. Defaults to 1.
+        :type output_vars: integer, optional
+        :return: uncertainties on measurand
+        :rtype: array
+        """
+        factors = []
+        for i in range(len(x)):
+            if u_x_rand[i] is None:
+                u_x_rand[i] = np.zeros_like(x[i])
+            if u_x_syst[i] is None:
+                u_x_syst[i] = np.zeros_like(x[i])
+            factors.append(self.factor_both(x[i],u_x_rand[i],u_x_syst[i]))
+
+        return self.run_lpu(func,x,factors,corr_between,return_corr,return_Jacobian,corr_axis,output_vars)
+
+    def propagate_type(self,func,x,u_x,u_type,corr_between=None,return_corr=True,return_Jacobian=False,corr_axis=-99,output_vars=1):
+        """
+        Propagate random or systematic uncertainties through measurement function with n input quantities.
+        Input quantities can be floats, vectors or images.
+
+        :param func: measurement function
+        :type func: function
+        :param x: list of input quantities (usually numpy arrays)
+        :type x: list[array]
+        :param u_x: list of uncertainties on input quantities (usually numpy arrays)
+        :type u_x: list[array]
+        :param u_type: sting identifiers whether uncertainties are random or systematic
+        :type u_type: list[str]
+        :param corr_between: covariance matrix (n,n) between input quantities, defaults to None
+        :type corr_between: array, optional
+        :param return_corr: set to True to return correlation matrix of measurand, defaults to True
+        :type return_corr: bool, optional
+        :param return_Jacobian: set to True to return the Jacobian matrix of the measurement function, defaults to False
+        :type return_Jacobian: bool, optional
+        :param corr_axis: set to positive integer to select the axis used in the correlation matrix. The correlation matrix will then be averaged over other dimensions. Defaults to -99, for which the input array will be flattened and the full correlation matrix calculated.
+        :type corr_axis: integer, optional
+        :param output_vars: number of output parameters in the measurement function. Defaults to 1.
+        :type output_vars: integer, optional
+        :return: uncertainties on measurand
+        :rtype: array
+        """
+        factors = []
+        for i in range(len(x)):
+            if u_x[i] is None:
+                u_x[i] = np.zeros_like(x[i])
+            if u_type[i].lower() == 'rand' or u_type[i].lower() == 'random' or u_type[i].lower() == 'r':
+                factors.append(self.factor_random(x[i],u_x[i]))
+            elif u_type[i].lower() == 'syst' or u_type[i].lower() == 'systematic' or u_type[i].lower() == 's':
+                factors.append(self.factor_systematic(x[i],u_x[i]))
+            else:
+                raise ValueError(
+                    'Uncertainty type not understood. Use random ("random", "rand" or "r") or systematic ("systematic", "syst" or "s").')
+
+        return self.run_lpu(func,x,factors,corr_between,return_corr,return_Jacobian,corr_axis,output_vars)
+
+    def propagate_cov(self,func,x,cov_x,corr_between=None,return_corr=True,return_Jacobian=False,corr_axis=-99,output_vars=1):
+        """
+        Propagate uncertainties with given covariance matrix through measurement function with n input quantities.
+        Input quantities can be floats, vectors or images.
+
+        :param func: measurement function
+        :type func: function
+        :param x: list of input quantities (usually numpy arrays)
+        :type x: list[array]
+        :param cov_x: list of covariance matrices on input quantities (usually numpy arrays). In case the input quantity is an array of shape (m,o), the covariance matrix needs to be given as an array of shape (m*o,m*o). For input quantities that are floats, the standard uncertainty is given (rather than the variance), as for MCPropagation.propagate_cov. Structured covariance matrices (see punpy.mc.structured_covariance) can also be given.
+        :type cov_x: list[array or StructuredCovariance]
+        :param corr_between: covariance matrix (n,n) between input quantities, defaults to None
+        :type corr_between: array, optional
+        :param return_corr: set to True to return correlation matrix of measurand, defaults to True
+        :type return_corr: bool, optional
+        :param return_Jacobian: set to True to return the Jacobian matrix of the measurement function, defaults to False
+        :type return_Jacobian: bool, optional
+        :param corr_axis: set to positive integer to select the axis used in the correlation matrix. The correlation matrix will then be averaged over other dimensions. Defaults to -99, for which the input array will be flattened and the full correlation matrix calculated.
+        :type corr_axis: integer, optional
+        :param output_vars: number of output parameters in the measurement function. Defaults to 1.
+        :type output_vars: integer, optional
+        :return: uncertainties on measurand
+        :rtype: array
+        """
+        factors = []
+        for i in range(len(x)):
+            factors.append(self.factor_cov(x[i],cov_x[i]))
+
+        return self.run_lpu(func,x,factors,corr_between,return_corr,return_Jacobian,corr_axis,output_vars)
+
+    def factor_random(self,param,u_param):
+        """
+        Return a factor B of the covariance matrix (B.B^T) of the flattened input quantity with random uncertainties.
+
+        :param param: values of input quantity
+        :type param: float or array
+        :param u_param: uncertainties on input quantity
+        :type u_param: float or array
+        :return: factor of the covariance matrix, of shape (m,m) for an input quantity with m elements
+        :rtype: array
+        """
+        return np.diag(np.broadcast_to(u_param,np.shape(param)).flatten().astype(np.float64))
+
+    def factor_systematic(self,param,u_param):
+        """
+        Return a factor B of the covariance matrix (B.B^T) of the flattened input quantity with systematic uncertainties.
+
+        :param param: values of input quantity
+        :type param: float or array
+        :param u_param: uncertainties on input quantity
+        :type u_param: float or array
+        :return: factor of the covariance matrix, of shape (m,1) for an input quantity with m elements
+        :rtype: array
+        """
+        return np.broadcast_to(u_param,np.shape(param)).flatten().astype(np.float64)[:,None]
+
+    def factor_both(self,param,u_param_rand,u_param_syst):
+        """
+        Return a factor B of the covariance matrix (B.B^T) of the flattened input quantity with random and systematic uncertainties.
+
+        :param param: values of input quantity
+        :type param: float or array
+        :param u_param_rand: random uncertainties on input quantity
+        :type u_param_rand: float or array
+        :param u_param_syst: systematic uncertainties on input quantity
+        :type u_param_syst: float or array
+        :return: factor of the covariance matrix, of shape (m,m+1) for an input quantity with m elements
+        :rtype: array
+        """
+        return np.concatenate([self.factor_random(param,u_param_rand),self.factor_systematic(param,u_param_syst)],axis=1)
+
+    def factor_cov(self,param,cov_param):
+        """
+        Return a factor B of the covariance matrix (B.B^T) of the flattened input quantity, using Cholesky decomposition.
+
+        :param param: values of input quantity
+        :type param: float or array
+        :param cov_param: covariance matrix of input quantity (or standard uncertainty for a float, as for MCPropagation.propagate_cov)
+        :type cov_param: float or array or StructuredCovariance
+        :return: factor of the covariance matrix, of shape (m,m) for an input quantity with m elements
+        :rtype: array
+        """
+        if isinstance(cov_param,StructuredCovariance):
+            return cov_param.factor(lambda A: cholesky_cache.get(A,MCPropagation.cholesky))
+        if not hasattr(param,"__len__"):
+            return self.factor_systematic(param,np.reshape(cov_param,()))
+        cov_param = np.asarray(cov_param,dtype=np.float64).reshape((np.size(param),np.size(param)))
+        if np.all(cov_param == 0):
+            return np.zeros_like(cov_param)
+        return cholesky_cache.get(cov_param,MCPropagation.cholesky)
+
+    @staticmethod
+    def symmetric_factor(B):
+        """
+        Return the symmetric square root of the covariance matrix B.B^T, which is a square factor of the same covariance matrix.
+
+        :param B: factor of the covariance matrix
+        :type B: array
+        :return: symmetric factor of the covariance matrix
+        :rtype: array
+        """
+        w,V = np.linalg.eigh(np.dot(B,B.T))
+        return np.dot(V*np.sqrt(np.clip(w,0,None)),V.T)
+
+    def assemble_cov(self,factors,corr_between=None):
+        """
+        Assemble the covariance matrix of all (flattened) input quantities together. The covariance between input
+        quantities i and j is given by corr_between[i,j].B_i.B_j^T, so that correlated input quantities need to have the
+        same number of elements. If the factors of correlated input quantities do not have the same shape (e.g. for a
+        random and a systematic input quantity), their symmetric square roots are used instead.
+
+        :param factors: factors of the covariance matrix of each input quantity
+        :type factors: list[array]
+        :param corr_between: covariance matrix (n,n) between input quantities, defaults to None
+        :type corr_between: array, optional
+        :return: covariance matrix of all input quantities
+        :rtype: array
+        """
+        sizes = [len(B) for B in factors]
+        offsets = np.cumsum([0]+sizes)
+        cov_x = np.zeros((offsets[-1],offsets[-1]))
+        if corr_between is None:
+            for i in range(len(factors)):
+                cov_x[offsets[i]:offsets[i+1],offsets[i]:offsets[i+1]] = np.dot(factors[i],factors[i].T)
+            return cov_x
+
+        corr_between = np.asarray(corr_between,dtype=np.float64)
+        if np.max(corr_between) > 1 or len(corr_between) != len(factors):
+            raise ValueError("The correlation matrix between variables is not the right shape or has elements >1.")
+        L = cholesky_cache.get(corr_between,MCPropagation.cholesky)
+        corr_between = np.dot(L,L.T)
+
+        correlated = [i for i in range(len(factors)) if np.any(np.delete(corr_between[i],i) != 0)]
+        if len(set([sizes[i] for i in correlated])) > 1:
+            raise ValueError("Correlated input quantities need to have the same number of elements.")
+        if len(set([factors[i].shape for i in correlated])) > 1:
+            factors = [self.symmetric_factor(B) for B in factors]
+
+        for i in range(len(factors)):
+            for j in range(len(factors)):
+                if i == j or corr_between[i,j] != 0:
+                    cov_x[offsets[i]:offsets[i+1],offsets[j]:offsets[j+1]] = corr_between[i,j]*np.dot(factors[i],factors[j].T)
+        return cov_x
+
+    def run_lpu(self,func,x,factors,corr_between,return_corr,return_Jacobian,corr_axis=-99,output_vars=1):
+        """
+        Calculate the Jacobian of the measurement function and propagate the covariance matrix of the input quantities.
+
+        :param func: measurement function
+        :type func: function
+        :param x: list of input quantities (usually numpy arrays)
+        :type x: list[array]
+        :param factors: factors of the covariance matrix of each input quantity
+        :type factors: list[array]
+        :param corr_between: covariance matrix (n,n) between input quantities
+        :type corr_between: array
+        :param return_corr: set to True to return correlation matrix of measurand
+        :type return_corr: bool
+        :param return_Jacobian: set to True to return the Jacobian matrix of the measurement function
+        :type return_Jacobian: bool
+        :param corr_axis: set to positive integer to select the axis used in the correlation matrix. The correlation matrix will then be averaged over other dimensions. Defaults to -99, for which the input array will be flattened and the full correlation matrix calculated.
+        :type corr_axis: integer, optional
+        :param output_vars: number of output parameters in the measurement function. Defaults to 1.
+        :type output_vars: integer, optional
+        :return: uncertainties on measurand
+        :rtype: array
+        """
+        cov_x = self.assemble_cov(factors,corr_between)
+        J,y,shape_y = self.calculate_Jacobian(func,x,np.sqrt(np.diag(cov_x)))
+        cov_y = np.dot(np.dot(J,cov_x),J.T)
+        u_func = np.sqrt(np.diag(cov_y)).reshape(shape_y)
+        return self.process_output(u_func,cov_y,J,shape_y,return_corr,return_Jacobian,corr_axis,output_vars,y)
+
+    def calculate_Jacobian(self,func,x,u_x):
+        """
+        Calculate the Jacobian matrix of the measurement function numerically, using finite differences.
+
+        :param func: measurement function
+        :type func: function
+        :param x: list of input quantities (usually numpy arrays)
+        :type x: list[array]
+        :param u_x: standard uncertainties of all (flattened) input quantities together, used to set the size of the perturbations
+        :type u_x: array
+        :return: Jacobian matrix of shape (number of elements of measurand, number of elements of input quantities), (flattened) measurand at the input quantities (for central differences, the mean of the measurands of each pair of perturbations, which only differs from it at second order in the perturbations), and shape of the measurand
+        :rtype: tuple(array, array, tuple)
+        """
+        shapes = [np.shape(x[i]) for i in range(len(x))]
+        values = np.concatenate([np.ravel(x[i]) for i in range(len(x))]).astype(np.float64)
+        n = len(values)
+        h = self.step*np.where(u_x > 0,u_x,np.maximum(np.abs(values),1))
+
+        # each perturbation is the index of the perturbed element (-1 for the unperturbed input quantities) and its sign
+        if self.central:
+            index = np.concatenate([np.arange(n),np.arange(n)])
+            sign = np.concatenate([np.ones(n),-np.ones(n)])
+        else:
+            index = np.arange(-1,n)
+            sign = np.concatenate([[0.],np.ones(n)])
+
+        batch_size = len(index) if self.batch_size is None else self.batch_size
+        y = None
+        for start in range(0,len(index),batch_size):
+            stop = min(start+batch_size,len(index))
+            y_batch = self.evaluate_func(func,shapes,values,h,index[start:stop],sign[start:stop])
+            if y is None:
+                shape_y = y_batch.shape[:-1]
+                y = np.empty((int(np.prod(shape_y)),len(index)))
+            y[:,start:stop] = y_batch.reshape((-1,stop-start))
+
+        if self.central:
+            J = (y[:,:n]-y[:,n:])/(2*h)
+            y0 = np.mean(y,axis=1)
+        else:
+            J = (y[:,1:]-y[:,:1])/h
+            y0 = y[:,0]
+        return J,y0,shape_y
+
+    def evaluate_func(self,func,shapes,values,h,index,sign):
+        """
+        Evaluate the measurement function for a set of perturbations of the input quantities in a single vectorised call,
+        with the perturbations along the last axis of the input quantities.
+
+        :param func: measurement function
+        :type func: function
+        :param shapes: shapes of the input quantities
+        :type shapes: list[tuple]
+        :param values: values of all (flattened) input quantities together
+        :type values: array
+        :param h: size of the perturbation of each element of the input quantities
+        :type h: array
+        :param index: index of the perturbed element for each perturbation (-1 for none)
+        :type index: array
+        :param sign: sign of each perturbation
+        :type sign: array
+        :return: measurand for each perturbation, along the last axis
+        :rtype: array
+        """
+        data = np.repeat(values[:,None],len(index),axis=1)
+        perturbed = np.where(index >= 0)[0]
+        data[index[perturbed],perturbed] += sign[perturbed]*h[index[perturbed]]
+
+        inputs = []
+        offset = 0
+        for shape in shapes:
+            size = int(np.prod(shape))
+            inputs.append(data[offset:offset+size].reshape(shape+(len(index),)))
+            offset += size
+        return np.array(func(*inputs),dtype=np.float64)
+
+    def process_output(self,u_func,cov_y,J,shape_y,return_corr,return_Jacobian,corr_axis=-99,output_vars=1,y=None):
+        """
+        Calculate the correlation matrix if required and assemble the requested outputs.
+
+        :param u_func: uncertainties on measurand
+        :type u_func: array
+        :param cov_y: covariance matrix of the (flattened) measurand
+        :type cov_y: array
+        :param J: Jacobian matrix of the measurement function
+        :type J: array
+        :param shape_y: shape of the measurand
+        :type shape_y: tuple
+        :param return_corr: set to True to return correlation matrix of measurand
+        :type return_corr: bool
+        :param return_Jacobian: set to True to return the Jacobian matrix
+        :type return_Jacobian: bool
+        :param corr_axis: set to positive integer to select the axis used in the correlation matrix. The correlation matrix will then be averaged over other dimensions. Defaults to -99, for which the input array will be flattened and the full correlation matrix calculated.
+        :type corr_axis: integer, optional
+        :param output_vars: number of output parameters in the measurement function. Defaults to 1.
+        :type output_vars: integer, optional
+        :param y: (flattened) measurand at the input quantities, used for the correlation matrix between the output parameters. Defaults to None, for which the measurand is taken to be the same for all elements.
+        :type y: array, optional
+        :return: uncertainties on measurand
+        :rtype: array
+        """
+        outputs = [u_func]
+        if return_corr:
+            if output_vars==1:
+                outputs.append(self.calculate_corr(cov_y,shape_y,corr_axis))
+            else:
+                size = len(cov_y)//output_vars
+                cov_blocks = cov_y.reshape((output_vars,size,output_vars,size))
+                corr_ys = np.empty(output_vars,dtype=object)
+                for i in range(output_vars):
+                    corr_ys[i] = self.calculate_corr(cov_blocks[i,:,i],shape_y[1:],corr_axis)
+                # correlation between the different outputs, defined as in MCPropagation as the correlation of the flattened
+                # outputs (pooling the samples of all elements), for which the covariance is the mean covariance of the elements
+                # plus the covariance of the values of the elements around the mean of each output
+                cov_out = np.trace(cov_blocks,axis1=1,axis2=3)/size
+                if y is not None:
+                    y_dev = y.reshape((output_vars,size))
+                    y_dev = y_dev-np.mean(y_dev,axis=1,keepdims=True)
+                    cov_out = cov_out+np.dot(y_dev,y_dev.T)/size
+                u_out = np.sqrt(np.diag(cov_out))
+                with np.errstate(divide="ignore",invalid="ignore"):
+                    corr_out = np.clip(cov_out/u_out[:,None]/u_out[None,:],-1,1)
+                outputs += [corr_ys,corr_out]
+        if return_Jacobian:
+            outputs.append(J)
+
+        if len(outputs) == 1:
+            return outputs[0]
+        return tuple(outputs)
+
+    def calculate_corr(self,cov_y,shape_y,corr_axis=-99):
+        """
+        Calculate the correlation matrix of the measurand from its covariance matrix.
+        If corr_axis is specified, this axis will be the one used to calculate the correlation matrix (e.g. if corr_axis=0 and x.shape[0]=n, the correlation matrix will have shape (n,n)).
+        This will be done for each combination of parameters in the other dimensions and the resulting correlation matrices are averaged.
+
+        :param cov_y: covariance matrix of the (flattened) measurand
+        :type cov_y: array
+        :param shape_y: shape of the measurand
+        :type shape_y: tuple
+        :param corr_axis: set to positive integer to select the axis used in the correlation matrix. The correlation matrix will then be averaged over other dimensions. Defaults to -99, for which the input array will be flattened and the full correlation matrix calculated.
+        :type corr_axis: integer, optional
+        :return: correlation matrix
+        :rtype: array
+        """
+        u_y = np.sqrt(np.diag(cov_y))
+        with np.errstate(divide="ignore",invalid="ignore"):
+            corr_y = cov_y/u_y[:,None]/u_y[None,:]
+        if len(shape_y) == 0:
+            return corr_y[0,0]
+        if len(shape_y) > 1 and 0 <= corr_axis < len(shape_y):
+            # index of the flattened measurand for each element along corr_axis and each combination of the other axes
+            index = np.moveaxis(np.arange(len(u_y)).reshape(shape_y),corr_axis,0).reshape((shape_y[corr_axis],-1))
+            corr_y = np.mean(corr_y[index[:,None,:],index[None,:,:]],axis=-1)
+        return corr_y
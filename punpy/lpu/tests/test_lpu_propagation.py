@@ -0,0 +1,172 @@
+"""
+Tests for lpu propagation class
+"""
+
+import unittest
+import numpy as np
+import numpy.testing as npt
+from punpy.version import __version__
+from punpy.lpu.lpu_propagation import LPUPropagation
+from punpy.mc.mc_propagation import MCPropagation
+
+'''___Authorship___'''
+__author__ = "Pieter De Vis"
+__created__ = "18/10/2026"
+__version__ = __version__
+__maintainer__ = "Pieter De Vis"
+__email__ = "pieter.de.vis@npl.co.uk"
+__status__ = "Development"
+
+def function(x1,x2):
+    return x1**2 - 10*x2
+
+x1=np.ones(20)*10
+x2=np.ones(20)*30
+x1err=np.ones(20)
+x2err=2*np.ones(20)
+
+xs=np.array([x1,x2])
+xerrs=np.array([x1err,x2err])
+
+#the LPU only takes the first order Taylor expansion terms into account.
+yerr_uncorr=800**0.5*np.ones(20)
+yerr_corr=np.zeros(20)
+
+def functionb(x1,x2):
+    return 2* x1 - x2
+
+x1b=np.ones((5,3))*50
+x2b=np.ones((5,3))*30
+x1errb=np.ones((5,3))
+x2errb=2*np.ones((5,3))
+
+xsb=np.array([x1b,x2b])
+xerrsb=np.array([x1errb,x2errb])
+
+yerr_uncorrb=8**0.5*np.ones((5,3))
+yerr_corrb=np.zeros((5,3))
+
+def functionc(x1,x2,x3):
+    return x1  +4*x2 -2*x3
+
+x1c=np.ones(20)*10
+x2c=np.ones(20)*10
+x3c=np.ones(20)*10
+
+x1errc=12*np.ones(20)
+x2errc=5*np.ones(20)
+x3errc=np.zeros(20)
+
+xsc=np.array([x1c,x2c,x3c])
+xerrsc=np.array([x1errc,x2errc,x3errc])
+yerr_uncorrc=544**0.5*np.ones(20)
+
+def functiond(x1,x2):
+    return 2* x1 - x2, 2*x1+x2
+
+x1d=np.ones((5,3,4))*50
+x2d=np.ones((5,3,4))*30
+x1errd=np.ones((5,3,4))
+x2errd=2*np.ones((5,3,4))
+
+xsd=np.array([x1d,x2d])
+xerrsd=np.array([x1errd,x2errd])
+
+yerr_uncorrd=[8**0.5*np.ones((5,3,4)),8**0.5*np.ones((5,3,4))]
+
+class TestLPUPropagation(unittest.TestCase):
+    """
+    Class for unit tests
+    """
+    def test_propagate_random(self):
+        prop = LPUPropagation()
+
+        uf,ucorr = prop.propagate_random(function,xs,xerrs,return_corr=True)
+        npt.assert_allclose(ucorr,np.eye(len(ucorr)),atol=1e-8)
+        npt.assert_allclose(uf,yerr_uncorr,rtol=1e-3)
+
+        uf = prop.propagate_random(function,xs,xerrs,corr_between=np.ones((2,2)))
+        npt.assert_allclose(uf,yerr_corr,atol=0.01)
+
+        ufb,ucorrb = prop.propagate_random(functionb,xsb,xerrsb,return_corr=True)
+        npt.assert_allclose(ucorrb,np.eye(len(ucorrb)),atol=1e-8)
+        npt.assert_allclose(ufb,yerr_uncorrb,rtol=1e-6)
+
+        ufb,ucorrb = prop.propagate_random(functionb,xsb,xerrsb,return_corr=True,corr_axis=0)
+        npt.assert_allclose(ucorrb,np.eye(5),atol=1e-8)
+
+        ufd,ucorrd,corr_out = prop.propagate_random(functiond,xsd,xerrsd,return_corr=True,output_vars=2)
+        npt.assert_allclose(ufd,yerr_uncorrd,rtol=1e-6)
+        npt.assert_allclose(ucorrd[0],np.eye(60),atol=1e-8)
+        npt.assert_allclose(corr_out,np.eye(2),atol=1e-8)
+
+    def test_corr_out(self):
+        # the measurand varies over the elements, which contributes to the correlation between the flattened outputs
+        x1 = np.arange(60.).reshape((5,3,4))
+        corr_out = LPUPropagation().propagate_random(functiond,[x1,x2d],xerrsd,return_corr=True,output_vars=2)[2]
+        corr_out_mc = MCPropagation(10000,seed=12345).propagate_random(functiond,[x1,x2d],xerrsd,return_corr=True,output_vars=2)[2]
+        npt.assert_allclose(corr_out,corr_out_mc,atol=1e-3)
+        corr_out_central = LPUPropagation(central=True).propagate_random(functiond,[x1,x2d],xerrsd,return_corr=True,output_vars=2)[2]
+        npt.assert_allclose(corr_out_central,corr_out,atol=1e-8)
+
+    def test_propagate_systematic(self):
+        prop = LPUPropagation()
+
+        uf,ucorr = prop.propagate_systematic(function,xs,xerrs,return_corr=True)
+        npt.assert_allclose(ucorr,np.ones_like(ucorr),atol=1e-8)
+        npt.assert_allclose(uf,yerr_uncorr,rtol=1e-3)
+
+        ufb,ucorrb = prop.propagate_systematic(functionb,xsb,xerrsb,return_corr=True,corr_axis=1)
+        npt.assert_allclose(ucorrb,np.ones((3,3)),atol=1e-8)
+        npt.assert_allclose(ufb,yerr_uncorrb,rtol=1e-6)
+
+    def test_propagate_both(self):
+        prop = LPUPropagation()
+
+        uf,ucorr = prop.propagate_both(function,xs,xerrs,xerrs)
+        npt.assert_allclose(uf,2**0.5*yerr_uncorr,rtol=1e-3)
+        npt.assert_allclose(ucorr,0.5*np.ones_like(ucorr)+0.5*np.eye(len(ucorr)),atol=1e-6)
+
+        # same correlation structure for both input quantities, so corr_between can be applied
+        ufb,ucorrb = prop.propagate_both(functionb,xsb,xerrsb,xerrsb,corr_between=np.ones((2,2)))
+        npt.assert_allclose(ufb,yerr_corrb,atol=1e-6)
+
+    def test_propagate_cov(self):
+        prop = LPUPropagation()
+
+        cov = [MCPropagation.convert_corr_to_cov(np.eye(len(xerr.flatten())),xerr) for xerr in xerrsc]
+        ufc,ucorrc = prop.propagate_cov(functionc,xsc,cov)
+        npt.assert_allclose(ucorrc,np.eye(len(ucorrc)),atol=1e-8)
+        npt.assert_allclose(ufc,yerr_uncorrc,rtol=1e-6)
+
+        cov = [MCPropagation.convert_corr_to_cov(np.ones((len(xerr.flatten()),len(xerr.flatten()))),xerr) for xerr in xerrsb]
+        ufb,ucorrb = prop.propagate_cov(functionb,xsb,cov)
+        npt.assert_allclose(ucorrb,np.ones_like(ucorrb),atol=1e-6)
+        npt.assert_allclose(ufb,yerr_uncorrb,rtol=1e-6)
+
+        # a random input quantity correlated with an input quantity with a full covariance matrix
+        prop_mc = MCPropagation(100000,seed=12345)
+        cov = [MCPropagation.convert_corr_to_cov(np.eye(20),x1err),np.diag(x2err**2)]
+        uf = prop.propagate_cov(function,xs,cov,corr_between=np.array([[1,0.5],[0.5,1]]),return_corr=False)
+        uf_mc = prop_mc.propagate_cov(function,xs,cov,corr_between=np.array([[1,0.5],[0.5,1]]),return_corr=False)
+        npt.assert_allclose(uf,uf_mc,rtol=0.05)
+
+        # for scalar input quantities, the standard uncertainty is given (as for MCPropagation)
+        uf = prop.propagate_cov(lambda a,b: a*b,[2.,3.],[0.1,0.2],return_corr=False)
+        uf_mc = prop_mc.propagate_cov(lambda a,b: a*b,[2.,3.],[0.1,0.2],return_corr=False)
+        npt.assert_allclose(uf,0.5,rtol=1e-6)
+        npt.assert_allclose(uf,uf_mc,rtol=0.05)
+
+    def test_Jacobian(self):
+        prop = LPUPropagation(central=True,batch_size=7)
+        uf,J = prop.propagate_random(function,xs,xerrs,return_Jacobian=True)
+        npt.assert_allclose(J,np.concatenate([20*np.eye(20),-10*np.eye(20)],axis=1),atol=1e-6)
+        npt.assert_allclose(uf,yerr_uncorr,rtol=1e-8)
+
+        # scalar input quantities
+        uf,J = LPUPropagation().propagate_random(function,[10.,30.],[1.,2.],return_Jacobian=True)
+        self.assertEqual(J.shape,(1,2))
+        npt.assert_allclose(uf,800**0.5,rtol=1e-3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,212 @@
+"""Benchmarks of the run time and peak memory of the MC propagation, run with python -m punpy.mc.benchmark"""
+
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+import numpy as np
+from punpy.version import __version__
+from punpy.mc.mc_propagation import MCPropagation
+
+'''___Authorship___'''
+__author__ = "Pieter De Vis"
+__created__ = "18/10/2026"
+__maintainer__ = "Pieter De Vis"
+__email__ = "pieter.de.vis@npl.co.uk"
+__status__ = "Development"
+
+PROPAGATE_METHODS = ("propagate_random","propagate_systematic","propagate_both","propagate_type","propagate_cov")
+
+def benchmark_function(x1,x2):
+    """
+    Measurement function used in the benchmarks (defined at module level, so that it can be sent to worker processes).
+    """
+    return x1*x2-x1
+
+class Benchmark:
+    def __init__(self,ndims=(0,1,2,3),MCsteps=(100,1000),corr_axes=(-99,0),parallel_cores=(0,),size=10,repeat=1,seed=12345):
+        """
+        Initialise benchmark suite, which times and records the peak memory of every propagate_* method, calculate_corr and
+        generate_samples_cov, for each combination of the dimensionality of the input quantities, the number of MC iterations,
+        the corr_axis and the number of parallel cores. Peak memory is measured with tracemalloc (which includes the numpy arrays)
+        in a separate run from the timed runs, and only covers the main process.
+
+        :param ndims: numbers of dimensions of the input quantities (0 for scalars), each of length size, defaults to (0,1,2,3)
+        :type ndims: tuple[int], optional
+        :param MCsteps: numbers of MC iterations, defaults to (100,1000)
+        :type MCsteps: tuple[int], optional
+        :param corr_axes: corr_axis settings (only those smaller than the number of dimensions are used, apart from -99), defaults to (-99,0)
+        :type corr_axes: tuple[int], optional
+        :param parallel_cores: numbers of parallel cores used for the propagate_* methods, defaults to (0,)
+        :type parallel_cores: tuple[int], optional
+        :param size: length of the input quantities along each dimension, defaults to 10
+        :type size: int, optional
+        :param repeat: number of times each case is run, of which the fastest run is reported, defaults to 1
+        :type repeat: int, optional
+        :param seed: seed of the propagators, defaults to 12345
+        :type seed: int, optional
+        """
+        self.ndims = ndims
+        self.MCsteps = MCsteps
+        self.corr_axes = corr_axes
+        self.parallel_cores = parallel_cores
+        self.size = size
+        self.repeat = repeat
+        self.seed = seed
+
+    def make_inputs(self,ndim):
+        """
+        Create the input quantities, their uncertainties and covariance matrices for a number of dimensions.
+
+        :param ndim: number of dimensions of the input quantities
+        :type ndim: int
+        :return: input quantities, uncertainties and covariance matrices
+        :rtype: tuple
+        """
+        shape = (self.size,)*ndim
+        x = [np.full(shape,2.),np.full(shape,3.)]
+        u_x = [np.full(shape,0.1),np.full(shape,0.2)]
+        cov_x = [np.diag(np.atleast_1d(u.flatten()**2)) for u in u_x]
+        return x,u_x,cov_x
+
+    def measure(self,run,*args,**kwargs):
+        """
+        Measure the run time and peak memory of a call. The run time is the fastest of repeat runs without tracing, as
+        tracemalloc slows down every allocation, and the peak memory is measured in a separate run with tracemalloc.
+
+        :param run: function to benchmark
+        :type run: function
+        :return: run time in s and peak memory in bytes
+        :rtype: dict
+        """
+        times = []
+        for i in range(self.repeat):
+            start = time.perf_counter()
+            run(*args,**kwargs)
+            times.append(time.perf_counter()-start)
+        tracemalloc.start()
+        try:
+            run(*args,**kwargs)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return {"time":min(times),"peak_memory":peak}
+
+    def run_propagate(self,method,prop,x,u_x,cov_x,corr_axis):
+        """
+        Run one of the propagate_* methods.
+
+        :param method: name of the method
+        :type method: str
+        :param prop: propagator
+        :type prop: MCPropagation
+        :param x: input quantities
+        :type x: list[array]
+        :param u_x: uncertainties on the input quantities
+        :type u_x: list[array]
+        :param cov_x: covariance matrices of the input quantities
+        :type cov_x: list[array]
+        :param corr_axis: corr_axis setting
+        :type corr_axis: int
+        :return: outputs of the method
+        :rtype: tuple
+        """
+        if method == "propagate_random":
+            return prop.propagate_random(benchmark_function,x,u_x,return_corr=True,corr_axis=corr_axis)
+        if method == "propagate_systematic":
+            return prop.propagate_systematic(benchmark_function,x,u_x,return_corr=True,corr_axis=corr_axis)
+        if method == "propagate_both":
+            return prop.propagate_both(benchmark_function,x,u_x,u_x,corr_axis=corr_axis)
+        if method == "propagate_type":
+            return prop.propagate_type(benchmark_function,x,u_x,["rand","syst"],corr_axis=corr_axis)
+        return prop.propagate_cov(benchmark_function,x,cov_x,corr_axis=corr_axis)
+
+    def cases(self):
+        """
+        Return all benchmark cases.
+
+        :return: for each case, the benchmarked method, number of dimensions, number of MC iterations, corr_axis and number of parallel cores (None if not applicable)
+        :rtype: list[dict]
+        """
+        cases = []
+        for ndim in self.ndims:
+            corr_axes = [corr_axis for corr_axis in self.corr_axes if corr_axis == -99 or 0 <= corr_axis < ndim]
+            for steps in self.MCsteps:
+                for corr_axis in corr_axes:
+                    for method in PROPAGATE_METHODS:
+                        for cores in self.parallel_cores:
+                            cases.append({"method":method,"ndim":ndim,"MCsteps":steps,"corr_axis":corr_axis,"parallel_cores":cores})
+                    cases.append({"method":"calculate_corr","ndim":ndim,"MCsteps":steps,"corr_axis":corr_axis,"parallel_cores":None})
+                cases.append({"method":"generate_samples_cov","ndim":ndim,"MCsteps":steps,"corr_axis":None,"parallel_cores":None})
+        return cases
+
+    def run_case(self,case):
+        """
+        Run one benchmark case.
+
+        :param case: benchmark case, as returned by cases()
+        :type case: dict
+        :return: benchmark case with the run time in s and peak memory in bytes
+        :rtype: dict
+        """
+        x,u_x,cov_x = self.make_inputs(case["ndim"])
+        prop = MCPropagation(case["MCsteps"],parallel_cores=case["parallel_cores"] or 0,seed=self.seed)
+        if case["method"] == "calculate_corr":
+            MC_y = prop.generate_samples_random(x[0],u_x[0])
+            result = self.measure(prop.calculate_corr,MC_y,case["corr_axis"])
+        elif case["method"] == "generate_samples_cov":
+            result = self.measure(prop.generate_samples_cov,x[0],cov_x[0])
+        else:
+            with prop:
+                result = self.measure(self.run_propagate,case["method"],prop,x,u_x,cov_x,case["corr_axis"])
+        return dict(case,**result)
+
+    def run(self,verbose=False):
+        """
+        Run all benchmark cases.
+
+        :param verbose: set to True to print the progress, defaults to False
+        :type verbose: bool, optional
+        :return: benchmark settings, environment and results of all cases
+        :rtype: dict
+        """
+        results = []
+        for case in self.cases():
+            results.append(self.run_case(case))
+            if verbose:
+                print("%(method)s ndim=%(ndim)s MCsteps=%(MCsteps)s corr_axis=%(corr_axis)s parallel_cores=%(parallel_cores)s: %(time).4f s, %(peak_memory)s bytes"%results[-1],
+                      file=sys.stderr)
+        return {"punpy_version":__version__,"numpy_version":np.__version__,"python_version":platform.python_version(),
+                "size":self.size,"repeat":self.repeat,"results":results}
+
+def main(argv=None):
+    """
+    Run the benchmarks from the command line and write the results as JSON to a file or to stdout.
+
+    :param argv: command line arguments, defaults to None, for which sys.argv is used
+    :type argv: list[str], optional
+    :return: None
+    """
+    parser = argparse.ArgumentParser(prog="python -m punpy.mc.benchmark",description="Benchmark the run time and peak memory of the MC propagation.")
+    parser.add_argument("--ndims",type=int,nargs="+",default=[0,1,2,3],help="numbers of dimensions of the input quantities")
+    parser.add_argument("--MCsteps",type=int,nargs="+",default=[100,1000],help="numbers of MC iterations")
+    parser.add_argument("--corr-axes",type=int,nargs="+",default=[-99,0],help="corr_axis settings")
+    parser.add_argument("--parallel-cores",type=int,nargs="+",default=[0],help="numbers of parallel cores")
+    parser.add_argument("--size",type=int,default=10,help="length of the input quantities along each dimension")
+    parser.add_argument("--repeat",type=int,default=1,help="number of runs of each case (the fastest is reported)")
+    parser.add_argument("--output",default=None,help="JSON file to write the results to, defaults to stdout")
+    parser.add_argument("--verbose",action="store_true",help="print the progress to stderr")
+    args = parser.parse_args(argv)
+
+    benchmark = Benchmark(args.ndims,args.MCsteps,args.corr_axes,args.parallel_cores,args.size,args.repeat)
+    results = benchmark.run(args.verbose)
+    if args.output is None:
+        json.dump(results,sys.stdout,indent=1)
+    else:
+        with open(args.output,"w") as f:
+            json.dump(results,f,indent=1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Out-of-core calculation of large correlation matrices, one tile at a time"""
+
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+'''___Authorship___'''
+__author__ = "Pieter De Vis"
+__created__ = "18/10/2026"
+__maintainer__ = "Pieter De Vis"
+__email__ = "pieter.de.vis@npl.co.uk"
+__status__ = "Development"
+
+class BlockedCorrelation:
+    def __init__(self,path,tile_size=2048,upper=False,threads=0):
+        """
+        Initialise out-of-core calculation of the correlation matrix of MC samples of n elements, for measurands of which
+        the (n,n) correlation matrix does not fit in memory. The samples are standardised once (centred along the MC axis and
+        normalised to unit norm) into a temporary .npy file, after which each (tile_size,tile_size) tile of the correlation matrix
+        is calculated as a matrix product of two blocks of standardised samples, and written into a memory-mapped .npy file.
+
+        :param path: path of the .npy file in which the correlation matrix is written
+        :type path: str
+        :param tile_size: number of rows and columns of each tile, defaults to 2048
+        :type tile_size: int, optional
+        :param upper: set to True to only calculate the tiles on and above the diagonal, leaving the lower triangle zero (corr[i,j] for i>j is then corr[j,i]). Defaults to False.
+        :type upper: bool, optional
+        :param threads: number of threads calculating tiles in parallel, defaults to 0, for which the tiles are calculated one after the other
+        :type threads: int, optional
+        """
+        if tile_size < 1:
+            raise ValueError("The tile_size needs to be a positive integer.")
+        self.path = path
+        self.tile_size = tile_size
+        self.upper = upper
+        self.threads = threads
+
+    def standardise(self,MC_y,path):
+        """
+        Write the samples centred along the MC axis and normalised to unit norm for each element into a .npy file,
+        processing tile_size elements at a time.
+
+        :param MC_y: MC samples, of shape (n,K)
+        :type MC_y: array
+        :param path: path of the .npy file for the standardised samples
+        :type path: str
+        :return: memory-mapped standardised samples
+        :rtype: numpy.memmap
+        """
+        Z = np.lib.format.open_memmap(path,mode="w+",dtype=np.float64,shape=MC_y.shape)
+        for start in range(0,len(MC_y),self.tile_size):
+            z = np.array(MC_y[start:start+self.tile_size],dtype=np.float64)
+            z -= np.mean(z,axis=-1,keepdims=True)
+            with np.errstate(divide="ignore",invalid="ignore"):
+                z /= np.sqrt(np.einsum("ij,ij->i",z,z))[:,None]
+            Z[start:start+self.tile_size] = z
+        return Z
+
+    def tiles(self,n):
+        """
+        Return the tiles of an (n,n) correlation matrix that are calculated.
+
+        :param n: number of elements
+        :type n: int
+        :return: (rows, cols) slices of each tile
+        :rtype: list[tuple]
+        """
+        starts = range(0,n,self.tile_size)
+        return [(slice(i,i+self.tile_size),slice(j,j+self.tile_size)) for i in starts for j in starts if j >= i or not self.upper]
+
+    def compute_tile(self,corr,Z,rows,cols):
+        """
+        Calculate one tile of the correlation matrix and write it into the output.
+
+        :param corr: output correlation matrix
+        :type corr: numpy.memmap
+        :param Z: standardised samples
+        :type Z: array
+        :param rows: rows of the tile
+        :type rows: slice
+        :param cols: columns of the tile
+        :type cols: slice
+        :return: None
+        """
+        tile = np.dot(Z[rows],Z[cols].T)
+        np.clip(tile,-1,1,out=tile)
+        if self.upper and rows == cols:
+            tile = np.triu(tile)
+        corr[rows,cols] = tile
+
+    def compute(self,MC_y):
+        """
+        Calculate the correlation matrix of MC samples.
+
+        :param MC_y: MC samples, of shape (n,K)
+        :type MC_y: array
+        :return: read-only memory-mapped correlation matrix, of shape (n,n)
+        :rtype: numpy.memmap
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory,exist_ok=True)
+        path_standardised = os.path.splitext(self.path)[0]+"_standardised.npy"
+        try:
+            Z = self.standardise(MC_y,path_standardised)
+            corr = np.lib.format.open_memmap(self.path,mode="w+",dtype=np.float64,shape=(len(MC_y),len(MC_y)))
+            tiles = self.tiles(len(MC_y))
+            # the matrix products release the GIL, and the tiles are written to disjoint parts of the output
+            if self.threads > 1:
+                with ThreadPoolExecutor(self.threads) as executor:
+                    futures = [executor.submit(self.compute_tile,corr,Z,rows,cols) for rows,cols in tiles]
+                    for future in futures:
+                        future.result()
+            else:
+                for rows,cols in tiles:
+                    self.compute_tile(corr,Z,rows,cols)
+            corr.flush()
+            del corr,Z
+        finally:
+            if os.path.exists(path_standardised):
+                os.remove(path_standardised)
+        return np.load(self.path,mmap_mode="r")
@@ -0,0 +1,111 @@
+"""Cache of the Cholesky factors of covariance and correlation matrices"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+'''___Authorship___'''
+__author__ = "Pieter De Vis"
+__created__ = "18/10/2026"
+__maintainer__ = "Pieter De Vis"
+__email__ = "pieter.de.vis@npl.co.uk"
+__status__ = "Development"
+
+class CholeskyCache:
+    def __init__(self,max_bytes=256*1024**2):
+        """
+        Initialise a least-recently-used cache of Cholesky factors, keyed by a hash of the contents of the matrix,
+        so that each distinct matrix only needs to be factorised once per process.
+        When the cached factors take more than max_bytes of memory, the least recently used factors are removed.
+
+        :param max_bytes: maximum memory taken by the cached factors in bytes. Set to 0 to disable caching. Defaults to 256 MB.
+        :type max_bytes: int, optional
+        """
+        self.max_bytes = max_bytes
+        self.factors = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(matrix):
+        """
+        Return the key of a matrix in the cache, which is a hash of its contents, shape and data type.
+
+        :param matrix: matrix
+        :type matrix: array
+        :return: key
+        :rtype: str
+        """
+        matrix = np.ascontiguousarray(matrix)
+        digest = hashlib.sha1(matrix.data)
+        digest.update(str((matrix.shape,matrix.dtype.str)).encode())
+        return digest.hexdigest()
+
+    def get(self,matrix,factorise,dtype=None):
+        """
+        Return the Cholesky factor of a matrix, from the cache if available, otherwise factorising it and adding it to the cache.
+        The returned factors are read-only, as they are shared between calls.
+
+        :param matrix: covariance or correlation matrix
+        :type matrix: array
+        :param factorise: function returning the Cholesky factor of the matrix
+        :type factorise: function
+        :param dtype: data type of the returned factor, which is cached in this data type (so that it is not converted on every call). Defaults to None, for which the factor is returned as calculated.
+        :type dtype: numpy.dtype, optional
+        :return: Cholesky factor
+        :rtype: array
+        """
+        key = self.key(matrix)
+        if dtype is not None:
+            key += np.dtype(dtype).str
+        with self._lock:
+            if key in self.factors:
+                self.factors.move_to_end(key)
+                self.hits += 1
+                return self.factors[key]
+            self.misses += 1
+
+        L = np.asarray(factorise(matrix))
+        if dtype is not None:
+            L = L.astype(dtype,copy=False)
+        L.flags.writeable = False
+        with self._lock:
+            if key not in self.factors and L.nbytes <= self.max_bytes:
+                self.factors[key] = L
+                self.nbytes += L.nbytes
+                while self.nbytes > self.max_bytes:
+                    _,evicted = self.factors.popitem(last=False)
+                    self.nbytes -= evicted.nbytes
+                    self.evictions += 1
+        return L
+
+    def clear(self):
+        """
+        Remove all factors from the cache and reset the statistics.
+
+        :return: None
+        """
+        with self._lock:
+            self.factors.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """
+        Return the statistics of the cache.
+
+        :return: number of hits, misses and evictions, number of cached factors and memory taken by them in bytes
+        :rtype: dict
+        """
+        with self._lock:
+            return {"hits":self.hits,"misses":self.misses,"evictions":self.evictions,
+                    "size":len(self.factors),"nbytes":self.nbytes}
+
+# cache shared by all propagators in this process
+cholesky_cache = CholeskyCache()
@@ -0,0 +1,163 @@
+"""Lazy MC samples of input quantities that are stored in factored form"""
+
+import numpy as np
+from numpy.lib.mixins import NDArrayOperatorsMixin
+
+'''___Authorship___'''
+__author__ = "Pieter De Vis"
+__created__ = "18/10/2026"
+__maintainer__ = "Pieter De Vis"
+__email__ = "pieter.de.vis@npl.co.uk"
+__status__ = "Development"
+
+class SystematicSamples(NDArrayOperatorsMixin):
+    def __init__(self,param,u_param,z):
+        """
+        Initialise MC samples param+u_param*z of an input quantity with systematic uncertainties, which are stored as the
+        values, the uncertainties and the standard normal random numbers (shared by all elements) rather than as an array
+        of shape param.shape+(MCsteps,). The samples only take O(elements+MCsteps) memory and are expanded when they are
+        converted to an array (e.g. when they are passed to the measurement function), or per range of MC iterations when
+        they are indexed along the last axis. Arithmetic with the samples expands them and returns arrays.
+
+        :param param: values of input quantity (mean of distribution)
+        :type param: float or array
+        :param u_param: systematic uncertainties on input quantity (std of distribution)
+        :type u_param: float or array
+        :param z: standard normal random numbers, of shape (MCsteps,)
+        :type z: array
+        """
+        self.param = np.asarray(param)
+        self.u_param = np.asarray(u_param)
+        self.z = np.asarray(z)
+        self.element_shape = np.broadcast(self.param,self.u_param).shape
+        self.shape = self.element_shape+self.z.shape
+        self.ndim = len(self.shape)
+        self.size = int(np.prod(self.shape))
+        self.dtype = np.result_type(self.param,self.u_param,self.z)
+
+    @property
+    def nbytes(self):
+        """
+        Memory taken by the factors of the samples in bytes.
+        """
+        return self.param.nbytes+self.u_param.nbytes+self.z.nbytes
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __repr__(self):
+        return "SystematicSamples(shape=%s, dtype=%s)"%(self.shape,self.dtype)
+
+    def expand(self,start=0,stop=None):
+        """
+        Return the samples for a range of MC iterations as an array, computed in the same way as for fully generated samples.
+
+        :param start: first MC iteration, defaults to 0
+        :type start: int, optional
+        :param stop: end of the range of MC iterations (exclusive), defaults to None, for which all MC iterations after start are used
+        :type stop: int, optional
+        :return: samples of shape element_shape+(stop-start,)
+        :rtype: array
+        """
+        z = self.z[start:stop]
+        samples = np.empty(self.element_shape+z.shape,dtype=self.dtype)
+        np.multiply(np.expand_dims(self.u_param,-1),z,out=samples)
+        samples += np.expand_dims(self.param,-1)
+        return samples
+
+    def __array__(self,dtype=None,copy=None):
+        if copy is False:
+            raise ValueError("SystematicSamples can only be converted to an array by expanding them.")
+        samples = self.expand()
+        if dtype is not None:
+            samples = samples.astype(dtype,copy=False)
+        return samples
+
+    def __array_ufunc__(self,ufunc,method,*inputs,**kwargs):
+        if any(isinstance(out,SystematicSamples) for out in kwargs.get("out",())):
+            return NotImplemented
+        inputs = tuple(np.asarray(input) if isinstance(input,SystematicSamples) else input for input in inputs)
+        return getattr(ufunc,method)(*inputs,**kwargs)
+
+    def __getitem__(self,key):
+        if not isinstance(key,tuple):
+            key = (key,)
+        if len(key) == 2 and key[0] is Ellipsis:
+            # a range of MC iterations stays factored, a single MC iteration is expanded
+            if isinstance(key[1],slice):
+                return SystematicSamples(self.param,self.u_param,self.z[key[1]])
+            if isinstance(key[1],(int,np.integer)):
+                return np.broadcast_to(self.u_param*self.z[key[1]]+self.param,self.element_shape).copy()
+        if len(key) < self.ndim and all(isinstance(k,(int,np.integer,slice)) for k in key):
+            # selecting elements (e.g. a spatial tile) keeps all MC iterations
+            return SystematicSamples(np.broadcast_to(self.param,self.element_shape)[key],
+                                     np.broadcast_to(self.u_param,self.element_shape)[key],self.z)
+        return np.asarray(self)[key]
+
+    def reshape(self,*shape,**kwargs):
+        return np.asarray(self).reshape(*shape,**kwargs)
+
+    def astype(self,dtype,**kwargs):
+        return np.asarray(self).astype(dtype,**kwargs)
+
+    def is_mc_axis(self,axis):
+        """
+        Check whether an axis is the last (MC) axis of the samples.
+
+        :param axis: axis
+        :type axis: int
+        :return: True if the axis is the MC axis
+        :rtype: bool
+        """
+        return axis is not None and not isinstance(axis,tuple) and axis in (-1,self.ndim-1)
+
+    def mean(self,axis=None,dtype=None,out=None,keepdims=False,**kwargs):
+        """
+        Calculate the mean of the samples. Along the MC axis or over all samples, this is done from the factors.
+        Other axes expand the samples and use numpy.mean.
+        """
+        if out is not None or keepdims or kwargs or not (axis is None or self.is_mc_axis(axis)):
+            return np.asarray(self).mean(axis=axis,dtype=dtype,out=out,keepdims=keepdims,**kwargs)
+        dtype = self.dtype if dtype is None else dtype
+        z_mean = np.mean(self.z,dtype=np.float64)
+        if axis is None:
+            param = np.broadcast_to(self.param,self.element_shape)
+            u_param = np.broadcast_to(self.u_param,self.element_shape)
+            return np.dtype(dtype).type(np.mean(param,dtype=np.float64)+np.mean(u_param,dtype=np.float64)*z_mean)
+        return np.broadcast_to(self.param+self.u_param*z_mean,self.element_shape).astype(dtype)
+
+    def std(self,axis=None,dtype=None,out=None,ddof=0,keepdims=False,**kwargs):
+        """
+        Calculate the standard deviation of the samples. Along the MC axis or over all samples, this is done from the factors.
+        Other axes expand the samples and use numpy.std.
+        """
+        if out is not None or keepdims or kwargs or not (axis is None or self.is_mc_axis(axis)):
+            return np.asarray(self).std(axis=axis,dtype=dtype,out=out,ddof=ddof,keepdims=keepdims,**kwargs)
+        dtype = self.dtype if dtype is None else dtype
+        if axis is not None:
+            u_param = np.abs(self.u_param.astype(np.float64))
+            return np.broadcast_to(u_param*np.std(self.z,dtype=np.float64,ddof=ddof),self.element_shape).astype(dtype)
+
+        # the deviations from the mean are a+u*w, with w the centred random numbers, and a independent of the MC iteration
+        param = np.broadcast_to(self.param,self.element_shape).astype(np.float64)
+        u_param = np.broadcast_to(self.u_param,self.element_shape).astype(np.float64)
+        z_mean = np.mean(self.z,dtype=np.float64)
+        a = (param-np.mean(param))+(u_param-np.mean(u_param))*z_mean
+        var = np.mean(a**2)+np.mean(u_param**2)*np.mean((self.z-z_mean)**2,dtype=np.float64)
+        return np.dtype(dtype).type(np.sqrt(var*self.size/(self.size-ddof)))
+
+def concatenate_samples(batches):
+    """
+    Concatenate batches of MC samples of an input quantity along the MC axis. Batches of systematic samples with the
+    same factors are concatenated without expanding them.
+
+    :param batches: MC samples of each batch
+    :type batches: list[array or SystematicSamples]
+    :return: MC samples of all batches
+    :rtype: array or SystematicSamples
+    """
+    if all(isinstance(batch,SystematicSamples) for batch in batches):
+        first = batches[0]
+        if all(np.array_equal(batch.param,first.param) and np.array_equal(batch.u_param,first.u_param) for batch in batches):
+            return SystematicSamples(first.param,first.u_param,np.concatenate([batch.z for batch in batches]))
+    return np.concatenate([np.asarray(batch) for batch in batches],axis=-1)
@@ -0,0 +1,195 @@
+"""Timing and memory instrumentation of the stages of the MC propagation"""
+
+import time
+import tracemalloc
+import numpy as np
+
+'''___Authorship___'''
+__author__ = "Pieter De Vis"
+__created__ = "18/10/2026"
+__maintainer__ = "Pieter De Vis"
+__email__ = "pieter.de.vis@npl.co.uk"
+__status__ = "Development"
+
+def describe_arrays(arrays):
+    """
+    Return the shapes and total memory of (object arrays of) arrays, without expanding samples stored in factored form.
+
+    :param arrays: arrays
+    :type arrays: list[array]
+    :return: shapes of the arrays, and memory taken by the arrays in bytes
+    :rtype: tuple
+    """
+    shapes = []
+    nbytes = 0
+    for array in arrays:
+        if isinstance(array,np.ndarray) and array.dtype == object:
+            sub_shapes,sub_nbytes = describe_arrays(list(array.flat))
+            shapes += sub_shapes
+            nbytes += sub_nbytes
+        elif array is not None:
+            shapes.append(tuple(np.shape(array)))
+            nbytes += int(getattr(array,"nbytes",np.asarray(array).nbytes))
+    return shapes,nbytes
+
+class Stage:
+    def __init__(self,stats,name):
+        """
+        Initialise measurement of one stage of a propagation call, used as a context manager.
+        The wall time, the peak memory allocated during the stage (if trace_memory is set) and the shapes and memory of the
+        arrays produced by the stage are recorded when the stage ends.
+
+        :param stats: statistics to which the record of the stage is added
+        :type stats: StageStats
+        :param name: name of the stage
+        :type name: str
+        """
+        self.stats = stats
+        self.record = {"call":stats.calls,"method":stats.method,"stage":name,"time":None,"bytes":None,"shapes":[],"nbytes":0}
+        self.start_tracing = False
+
+    def __enter__(self):
+        if self.stats.trace_memory:
+            self.start_tracing = not tracemalloc.is_tracing()
+            if self.start_tracing:
+                tracemalloc.start()
+            elif hasattr(tracemalloc,"reset_peak"): # Python >= 3.9
+                tracemalloc.reset_peak()
+            self.memory_start = tracemalloc.get_traced_memory()[0]
+        self.time_start = time.perf_counter()
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        self.record["time"] = time.perf_counter()-self.time_start
+        if self.stats.trace_memory:
+            self.record["bytes"] = max(tracemalloc.get_traced_memory()[1]-self.memory_start,0)
+            if self.start_tracing:
+                tracemalloc.stop()
+        self.stats.add(self.record)
+
+    def output(self,*arrays):
+        """
+        Record the shapes and memory of the arrays produced by the stage.
+
+        :param arrays: arrays produced by the stage
+        :type arrays: array
+        :return: None
+        """
+        shapes,nbytes = describe_arrays(arrays)
+        self.record["shapes"] += shapes
+        self.record["nbytes"] += nbytes
+
+class StageStats:
+    def __init__(self,trace_memory=True,callback=None):
+        """
+        Initialise the statistics of the stages (sample generation, correlation of the samples, evaluation of the measurement
+        function, standard deviation, correlation matrix, ...) of each propagation call. For each stage, a record is kept with the
+        index of the call, the propagate method, the name of the stage, the wall time in s, the peak memory allocated during the
+        stage in bytes, and the shapes and total memory in bytes of the arrays produced by the stage.
+
+        :param trace_memory: set to True to measure the memory allocated in each stage using tracemalloc (which slows down allocations), defaults to True
+        :type trace_memory: bool, optional
+        :param callback: function called with the record of each stage when it ends, defaults to None
+        :type callback: function, optional
+        """
+        self.trace_memory = trace_memory
+        self.callback = callback
+        self.records = []
+        self.calls = 0
+        self.method = None
+
+    def start_call(self,method):
+        """
+        Start recording a new propagation call.
+
+        :param method: name of the propagate method
+        :type method: str
+        :return: None
+        """
+        self.calls += 1
+        self.method = method
+
+    def stage(self,name):
+        """
+        Return a context manager measuring a stage of the current propagation call.
+
+        :param name: name of the stage
+        :type name: str
+        :return: stage
+        :rtype: Stage
+        """
+        return Stage(self,name)
+
+    def add(self,record):
+        """
+        Add the record of a stage, and pass it to the callback.
+
+        :param record: record of the stage
+        :type record: dict
+        :return: None
+        """
+        self.records.append(record)
+        if self.callback is not None:
+            self.callback(record)
+
+    def summary(self,call=None):
+        """
+        Return the total time, peak memory and number of records of each stage.
+
+        :param call: index of the propagation call to summarise, defaults to None, for which all calls are summarised
+        :type call: int, optional
+        :return: for each stage, the total time in s, the maximum peak memory in bytes and the number of records
+        :rtype: dict
+        """
+        summary = {}
+        for record in self.records:
+            if call is not None and record["call"] != call:
+                continue
+            stage = summary.setdefault(record["stage"],{"time":0.,"bytes":None,"count":0})
+            stage["time"] += record["time"]
+            if record["bytes"] is not None:
+                stage["bytes"] = max(stage["bytes"] or 0,record["bytes"])
+            stage["count"] += 1
+        return summary
+
+    def clear(self):
+        """
+        Remove all records.
+
+        :return: None
+        """
+        self.records = []
+        self.calls = 0
+        self.method = None
+
+class NullStage:
+    """
+    Stage that does not measure anything.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        return None
+
+    def output(self,*arrays):
+        return None
+
+class NullStats:
+    """
+    Statistics that do not record anything, used when the instrumentation is switched off.
+    """
+    records = ()
+    _stage = NullStage()
+
+    def start_call(self,method):
+        return None
+
+    def stage(self,name):
+        return self._stage
+
+    def summary(self,call=None):
+        return {}
+
+    def clear(self):
+        return None
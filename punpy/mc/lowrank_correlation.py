@@ -0,0 +1,119 @@
+"""Correlation matrices of the measurand stored as a low-rank factor"""
+
+import numpy as np
+
+'''___Authorship___'''
+__author__ = "Pieter De Vis"
+__created__ = "18/10/2026"
+__maintainer__ = "Pieter De Vis"
+__email__ = "pieter.de.vis@npl.co.uk"
+__status__ = "Development"
+
+class LowRankCorrelation:
+    def __init__(self,factor):
+        """
+        Initialise correlation matrix of the form factor.factor^T, with factor of shape (n,k).
+        The correlation matrix of MC samples of n elements with K MC iterations has at most rank K-1, so that it is fully
+        described by a factor of shape (n,K), which takes O(n*k) memory rather than O(n^2).
+
+        :param factor: factor of the correlation matrix, of shape (n,k)
+        :type factor: array
+        """
+        self.factor = np.asarray(factor)
+        self.shape = (len(self.factor),len(self.factor))
+        self.rank = self.factor.shape[1]
+
+    @classmethod
+    def from_samples(cls,MC_y,rank=None):
+        """
+        Calculate the low-rank correlation matrix of MC samples, from the samples centred along the MC axis and normalised
+        to unit norm for each element. If a rank is given, the factor is truncated to the leading singular vectors, which are
+        found from the eigendecomposition of the (k,k) Gram matrix of the factor.
+
+        :param MC_y: MC samples, of shape (n,K)
+        :type MC_y: array
+        :param rank: rank of the truncated factor, defaults to None, for which the full factor is kept
+        :type rank: int, optional
+        :return: correlation matrix
+        :rtype: LowRankCorrelation
+        """
+        factor = np.array(MC_y,dtype=np.float64,order="C")
+        factor -= np.mean(factor,axis=-1,keepdims=True)
+        with np.errstate(divide="ignore",invalid="ignore"):
+            factor /= np.sqrt(np.einsum("ij,ij->i",factor,factor))[:,None]
+        if rank is not None and rank < factor.shape[1]:
+            w,V = np.linalg.eigh(np.dot(factor.T,factor))
+            factor = np.dot(factor,V[:,::-1][:,:rank])
+        return cls(factor)
+
+    @property
+    def nbytes(self):
+        """
+        Memory taken by the factor in bytes.
+        """
+        return self.factor.nbytes
+
+    def __array__(self,dtype=None,copy=None):
+        if copy is False:
+            raise ValueError("LowRankCorrelation can only be converted to an array by forming the dense matrix.")
+        corr = self.to_dense()
+        if dtype is not None:
+            corr = corr.astype(dtype,copy=False)
+        return corr
+
+    def matvec(self,v):
+        """
+        Multiply the correlation matrix with a vector (or the columns of a matrix), in O(n*k) operations.
+
+        :param v: vector of shape (n,) or matrix of shape (n,m)
+        :type v: array
+        :return: product of the correlation matrix with v
+        :rtype: array
+        """
+        return np.dot(self.factor,np.dot(self.factor.T,v))
+
+    def block(self,rows,cols=None):
+        """
+        Return a block of the correlation matrix.
+
+        :param rows: rows of the block, as a slice or indices
+        :type rows: slice or array
+        :param cols: columns of the block, as a slice or indices, defaults to None, for which the diagonal block of the rows is returned
+        :type cols: slice or array, optional
+        :return: block of the correlation matrix
+        :rtype: array
+        """
+        if cols is None:
+            cols = rows
+        return np.clip(np.dot(self.factor[rows],self.factor[cols].T),-1,1)
+
+    def entry(self,i,j):
+        """
+        Return a single entry of the correlation matrix.
+
+        :param i: row index
+        :type i: int
+        :param j: column index
+        :type j: int
+        :return: correlation between elements i and j
+        :rtype: float
+        """
+        return float(np.clip(np.dot(self.factor[i],self.factor[j]),-1,1))
+
+    def diagonal(self):
+        """
+        Return the diagonal of the correlation matrix (ones, unless the factor is truncated).
+
+        :return: diagonal of the correlation matrix
+        :rtype: array
+        """
+        return np.einsum("ij,ij->i",self.factor,self.factor)
+
+    def to_dense(self):
+        """
+        Return the dense correlation matrix (only feasible for small measurands).
+
+        :return: correlation matrix
+        :rtype: array
+        """
+        return self.block(slice(None))
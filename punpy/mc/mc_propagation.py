@@ -1,7 +1,22 @@
 """Use Monte Carlo to propagate uncertainties"""
 
+import os
+import copy
+import itertools
 import numpy as np
 from multiprocessing import Pool
+from concurrent.futures import ThreadPoolExecutor
+from punpy.mc.cholesky_cache import cholesky_cache
+from punpy.mc.structured_covariance import StructuredCovariance
+from punpy.mc.factored_samples import SystematicSamples,concatenate_samples
+from punpy.mc.sample_store import SampleStore
+from punpy.mc.lowrank_correlation import LowRankCorrelation
+from punpy.mc.blocked_correlation import BlockedCorrelation
+from punpy.mc.instrumentation import StageStats,NullStats
+from punpy.mc.result_cache import ResultCache,function_identity
+from punpy.mc.running_statistics import RunningStatistics,RunningCorrelation,RunningCovariance
+from punpy.mc.random_streams import RandomStream,SobolDimensions,SAMPLING_METHODS,qmc
+from punpy.mc.parallel import init_worker,get_worker_func,run_worker_func,run_worker_steps,run_worker_chunk,run_steps,run_chunk,create_shared_array,shared_memory
 
 '''___Authorship___'''
 __author__ = "Pieter De Vis"
@@ -11,16 +26,209 @@ __email__ = "pieter.de.vis@npl.co.uk"
 __status__ = "Development"
 
 class MCPropagation:
-    def __init__(self,steps,parallel_cores=0):
+    def __init__(self,steps,parallel_cores=0,batch_size=None,tile_shape=None,persistent_pool=False,parallel_mode="steps",chunks_per_core=1,parallel_backend="processes",seed=None,dtype=np.float64,sampling="random",tolerance=None,coverage_probability=None,max_steps=None,samples_dir=None,corr_format="dense",corr_rank=None,corr_dir=None,corr_tile_size=2048,corr_upper=False,stats=None,result_cache=None):
         """
         Initialise MC Propagator
 
         :param steps: number of MC iterations
         :type steps: int
+        :param parallel_cores: number of CPU cores used to run the measurement function. Defaults to 0, for which the measurement function is evaluated vectorised over all MC iterations at once.
+        :type parallel_cores: int, optional
+        :param batch_size: number of MC iterations that are generated, run through the measurement function and reduced at once. Peak memory is then set by the batch size rather than by the number of MC iterations. Defaults to None, for which all MC iterations are processed in a single batch.
+        :type batch_size: int, optional
+        :param tile_shape: shape of the spatial tiles along the leading axes of the input quantities. Setting a tile shape declares the measurement function to be element-wise, so that the samples are generated, run through the measurement function and reduced one tile at a time (in parallel if parallel_cores>1). Only the uncertainties on the measurand can be calculated in this mode. Defaults to None, for which no tiling is done.
+        :type tile_shape: tuple[int], optional
+        :param persistent_pool: set to True to keep the pool of worker processes (used when parallel_cores>1) alive between calls, so that the workers are only started once. The measurement function is sent to the workers once, when the pool is started, and the pool is restarted if a different measurement function is used. The pool needs to be closed using close(), or by using the propagator as a context manager. Defaults to False, for which a new pool is started for every call.
+        :type persistent_pool: bool, optional
+        :param parallel_mode: how the MC iterations are split between the parallel_cores worker processes. With "steps", the measurement function is called once for each MC iteration. With "chunks", the MC iterations are split into contiguous blocks (chunks_per_core for each core) and the measurement function is evaluated vectorised over each block, as when parallel_cores=0. Defaults to "steps".
+        :type parallel_mode: str, optional
+        :param chunks_per_core: number of blocks of MC iterations per core when parallel_mode="chunks". Using more than one block per core helps balancing the load when the measurement function takes different times for different samples. Defaults to 1.
+        :type chunks_per_core: int, optional
+        :param parallel_backend: when parallel_cores>1, run the measurement function on a pool of worker processes ("processes") or on a pool of threads ("threads"). Threads share the samples without any copying or pickling, and give a speed-up for measurement functions that release the GIL (e.g. functions mostly consisting of numpy operations). Defaults to "processes".
+        :type parallel_backend: str, optional
+        :param seed: seed for the random number generation, as an integer, a numpy SeedSequence or a numpy Generator (from which a seed is drawn). Independent random streams are derived from it for each propagation call, each input quantity and each block of MC iterations, so that the results are reproducible and do not depend on parallel_cores or batch_size (with the exception of batched runs with corr_between, since the samples are then standardised per batch in correlate_samples_corr). Defaults to None, for which fresh entropy is used.
+        :type seed: int or numpy.random.SeedSequence or numpy.random.Generator, optional
+        :param dtype: floating point data type of the MC samples of the input quantities and the measurand. Using np.float32 halves the memory needed for the samples. The uncertainties and correlation matrices are always accumulated in float64. Defaults to np.float64.
+        :type dtype: numpy.dtype, optional
+        :param sampling: sampling method used to draw the normal numbers from which the MC samples are generated (for all generate_samples methods, including correlated samples). With "random", pseudo-random numbers are used. With "sobol", a scrambled Sobol sequence (using separate dimensions for each input quantity) is transformed to normal numbers, which converges faster than pseudo-random sampling for smooth measurement functions (use a power of 2 for the number of MC iterations). Sobol sampling is most effective when the number of random numbers per MC iteration is moderate (up to a few dozen); for large arrays of input quantities, Latin hypercube sampling is more robust. With "lhs", Latin hypercube samples are used. The "sobol" and "lhs" methods require scipy. Defaults to "random".
+        :type sampling: str, optional
+        :param tolerance: numerical tolerance (in the units of the measurand) for the adaptive Monte Carlo procedure of GUM Supplement 1 (section 7.9). If set, the MC iterations are run in batches of batch_size (defaulting to steps) MC iterations, until twice the standard deviation of the mean of the uncertainties of the batches (and of the coverage interval endpoints if coverage_probability is set) is below the tolerance for all elements of the measurand, or until max_steps MC iterations have been used. The number of MC iterations used is stored in MCsteps_used. Defaults to None, for which steps MC iterations are always used.
+        :type tolerance: float or array, optional
+        :param coverage_probability: coverage probability (e.g. 0.95) of the probabilistically symmetric coverage interval of which the endpoints also need to be stable within the tolerance in the adaptive procedure. The coverage interval (averaged over the batches) is stored in coverage_interval. Defaults to None, for which only the uncertainties are used.
+        :type coverage_probability: float, optional
+        :param max_steps: maximum number of MC iterations in the adaptive procedure. Defaults to None, for which at most 100 times steps MC iterations are used.
+        :type max_steps: int, optional
+        :param samples_dir: directory in which the MC samples are stored when return_samples is set. The samples of the measurand and the input quantities are then written into memory-mapped .npy files (MC_y.npy, MC_x0.npy, ...) one batch of MC iterations at a time, and returned as read-only memory-mapped arrays, so that they are not kept in memory during the propagation (use batch_size to limit the memory of each batch). The files are overwritten by every propagation call. Defaults to None, for which the samples are returned as arrays in memory.
+        :type samples_dir: str, optional
+        :param corr_format: format of the correlation matrix of the measurand when it is calculated over all elements (corr_axis=-99). With "dense", the full (n,n) matrix is returned. With "lowrank", a LowRankCorrelation is returned, which stores the centred and normalised samples of the measurand as an (n,k) factor of the correlation matrix and provides matrix-vector products, blocks and single entries without forming the dense matrix. With "memmap", the full matrix is calculated out-of-core one tile at a time (see punpy.mc.blocked_correlation), written into a .npy file in corr_dir and returned as a read-only memory-mapped array. Correlation matrices along a corr_axis are always dense. Defaults to "dense".
+        :type corr_format: str, optional
+        :param corr_rank: rank k to which the factor of the low-rank correlation matrix is truncated (using its leading singular vectors), defaults to None, for which the factor has one column per MC iteration
+        :type corr_rank: int, optional
+        :param corr_dir: directory in which the correlation matrices are written when corr_format="memmap" (corr_y.npy, or corr_y0.npy, corr_y1.npy, ... for multiple output parameters). When batch_size (or tolerance) is used with corr_format="memmap" or "lowrank", the samples of the measurand are also streamed into MC_y.npy in corr_dir one batch at a time (unless return_samples is set), so that they are not kept in memory. The files are overwritten by every propagation call. Defaults to None.
+        :type corr_dir: str, optional
+        :param corr_tile_size: number of rows and columns of the tiles in which the correlation matrix is calculated when corr_format="memmap". The tiles are calculated on parallel_cores threads if parallel_cores>1. Defaults to 2048.
+        :type corr_tile_size: int, optional
+        :param corr_upper: set to True to only calculate the upper triangle of the correlation matrix when corr_format="memmap", leaving the lower triangle zero. Defaults to False.
+        :type corr_upper: bool, optional
+        :param stats: instrumentation of the stages of each propagation call (generation and correlation of the samples, evaluation of the measurement function, standard deviation, correlation matrix, storing the samples), which records the wall time, the memory allocated and the shapes and memory of the arrays produced by each stage. Set to True to record them in a new StageStats, to a StageStats (e.g. with a callback) to record them there, or to None for no instrumentation. The records are available in the stats attribute of the propagator. Defaults to None.
+        :type stats: bool or StageStats, optional
+        :param result_cache: persistent on-disk cache of the results of the propagate_* methods (see punpy.mc.result_cache), given as a directory or a ResultCache (e.g. with a different size cap). Results are keyed by the propagate method, the identity of the measurement function (its code, or its __version__ attribute if set), a hash of the input quantities and their uncertainties, corr_between, the requested outputs, the number of MC iterations, the settings of the propagator and the state of the seed (i.e. the seed and the number of earlier propagation calls of the propagator). The results are therefore found in the cache when the same sequence of calls is repeated by a new propagator with the same seed (e.g. when a pipeline is rerun), rather than when a call is repeated with the same propagator (which draws new random numbers for each call). A seed needs to be given. Results that are returned as memory-mapped files (return_samples with samples_dir, or corr_format="memmap") are not cached. Defaults to None, for which no results are cached.
+        :type result_cache: str or ResultCache, optional
         """
 
         self.MCsteps = steps
         self.parallel_cores = parallel_cores
+        if batch_size is not None and batch_size < 1:
+            raise ValueError("The batch_size needs to be a positive integer (or None).")
+        self.batch_size = batch_size
+        if isinstance(tile_shape,int):
+            tile_shape = (tile_shape,)
+        self.tile_shape = tile_shape
+        self.persistent_pool = persistent_pool
+        if parallel_mode not in ("steps","chunks"):
+            raise ValueError('The parallel_mode is not understood. Use "steps" or "chunks".')
+        self.parallel_mode = parallel_mode
+        self.chunks_per_core = chunks_per_core
+        if parallel_backend not in ("processes","threads"):
+            raise ValueError('The parallel_backend is not understood. Use "processes" or "threads".')
+        self.parallel_backend = parallel_backend
+        if isinstance(seed,np.random.Generator):
+            seed = seed.integers(0,2**63,size=4)
+        if isinstance(seed,np.random.SeedSequence):
+            self.seed_sequence = seed
+        else:
+            self.seed_sequence = np.random.SeedSequence(seed)
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32,np.float64):
+            raise ValueError("The dtype needs to be np.float32 or np.float64.")
+        if sampling not in SAMPLING_METHODS:
+            raise ValueError('The sampling method is not understood. Use "random", "sobol" or "lhs".')
+        if sampling != "random" and qmc is None:
+            raise ImportError('scipy is required for sampling="%s".'%sampling)
+        self.sampling = sampling
+        self.tolerance = tolerance
+        if coverage_probability is not None and not 0 < coverage_probability < 1:
+            raise ValueError("The coverage_probability needs to be between 0 and 1.")
+        self.coverage_probability = coverage_probability
+        if max_steps is None:
+            max_steps = 100*steps
+        self.max_steps = max_steps
+        self.samples_dir = samples_dir
+        if corr_format not in ("dense","lowrank","memmap"):
+            raise ValueError('The corr_format is not understood. Use "dense", "lowrank" or "memmap".')
+        if corr_format=="memmap" and corr_dir is None:
+            raise ValueError('A corr_dir needs to be given when corr_format="memmap".')
+        self.corr_format = corr_format
+        if corr_rank is not None and corr_rank < 1:
+            raise ValueError("The corr_rank needs to be a positive integer (or None).")
+        self.corr_rank = corr_rank
+        self.corr_dir = corr_dir
+        self.corr_tile_size = corr_tile_size
+        self.corr_upper = corr_upper
+        if stats is True:
+            stats = StageStats()
+        elif stats is None or stats is False:
+            stats = NullStats()
+        self.stats = stats
+        if result_cache is not None and seed is None:
+            raise ValueError("A seed needs to be given to use the result_cache, as the results are otherwise not reproducible.")
+        if isinstance(result_cache,str):
+            result_cache = ResultCache(result_cache)
+        self.result_cache = result_cache
+        self.MCsteps_used = None
+        self.coverage_interval = None
+        self._pool = None
+        self._pool_func = None
+
+    def __enter__(self):
+        self._persistent_pool_outside = self.persistent_pool
+        self.persistent_pool = True
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        self.close()
+        self.persistent_pool = self._persistent_pool_outside
+
+    def __getstate__(self):
+        # the pool of worker processes cannot be sent to other processes, and stages run in worker processes are not recorded
+        state = self.__dict__.copy()
+        state["_pool"] = None
+        state["_pool_func"] = None
+        state["stats"] = NullStats()
+        return state
+
+    def get_pool(self,func):
+        """
+        Return the persistent pool of worker processes for the given measurement function, starting it if needed.
+
+        :param func: measurement function
+        :type func: function
+        :return: pool of worker processes
+        :rtype: multiprocessing.Pool
+        """
+        # bound methods are compared by their instance and function, as a new method object is created on each attribute access
+        if self._pool is None or self._pool_func != func:
+            self.close()
+            self._pool = Pool(self.parallel_cores,initializer=init_worker,initargs=(func,))
+            self._pool_func = func
+        return self._pool
+
+    def run_pool(self,func,worker,tasks):
+        """
+        Run tasks on the pool of worker processes, using the persistent pool if required or a new pool otherwise.
+
+        :param func: measurement function, which is sent to the workers when the pool is started
+        :type func: function
+        :param worker: module-level worker function
+        :type worker: function
+        :param tasks: arguments for each call of the worker function
+        :type tasks: list[tuple]
+        :return: results of each task
+        :rtype: list
+        """
+        if self.persistent_pool:
+            return self.get_pool(func).starmap(worker,tasks)
+        with Pool(self.parallel_cores,initializer=init_worker,initargs=(func,)) as p:
+            return p.starmap(worker,tasks)
+
+    def close(self):
+        """
+        Close the persistent pool of worker processes (if any).
+
+        :return: None
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+            self._pool_func = None
+
+    def spawn_streams(self,n_streams):
+        """
+        Spawn independent random streams, e.g. one for each input quantity of a propagation call.
+
+        :param n_streams: number of random streams
+        :type n_streams: int
+        :return: random streams
+        :rtype: list[RandomStream]
+        """
+        # the streams share the dimensions of a single Sobol sequence when sampling="sobol"
+        sobol_dimensions = SobolDimensions()
+        return [RandomStream(seed_sequence,self.sampling,self.MCsteps,sobol_dimensions)
+                for seed_sequence in self.seed_sequence.spawn(n_streams)]
+
+    def as_dtype(self,param):
+        """
+        Convert (an array of) values to the data type of the MC samples.
+
+        :param param: values
+        :type param: float or array
+        :return: values in the data type of the MC samples
+        :rtype: float or array
+        """
+        if hasattr(param,"__len__"):
+            return np.asarray(param,dtype=self.dtype)
+        return self.dtype.type(param)
 
     def propagate_random(self,func,x,u_x,corr_between=None,return_corr=False,return_samples=False,corr_axis=-99,output_vars=1):
         """
@@ -46,18 +254,14 @@ class MCPropagation:
         :return: uncertainties on measurand
         :rtype: array
         """
-        MC_data = np.empty(len(x),dtype=np.ndarray)
+        self.stats.start_call("propagate_random")
+        generators = []
         for i in range(len(x)):
             if u_x[i] is None:
                 u_x[i]=np.zeros_like(x[i])
-            print(x[i].shape,u_x[i].shape)
-            MC_data[i] = self.generate_samples_random(x[i],u_x[i])
-            print(MC_data[i].nbytes)
+            generators.append((self.generate_samples_random,(x[i],u_x[i])))
 
-        if corr_between is not None:
-            MC_data = self.correlate_samples_corr(MC_data,corr_between)
-
-        return self.process_samples(func,MC_data,return_corr,return_samples,corr_axis,output_vars)
+        return self.run_cached(func,generators,corr_between,return_corr,return_samples,corr_axis,output_vars)
 
     def propagate_systematic(self,func,x,u_x,corr_between=None,return_corr=False,return_samples=False,corr_axis=-99,output_vars=1):
         """
@@ -83,17 +287,15 @@ class MCPropagation:
         :return: uncertainties on measurand
         :rtype: array
         """
-        MC_data = np.empty(len(x),dtype=np.ndarray)
+        self.stats.start_call("propagate_systematic")
+        generators = []
         for i in range(len(x)):
             if u_x[i] is None:
                 u_x[i] = np.zeros_like(x[i])
 
-            MC_data[i] = self.generate_samples_systematic(x[i],u_x[i])
-
-        if corr_between is not None:
-            MC_data = self.correlate_samples_corr(MC_data,corr_between)
+            generators.append((self.generate_samples_systematic,(x[i],u_x[i])))
 
-        return self.process_samples(func,MC_data,return_corr,return_samples,corr_axis,output_vars)
+        return self.run_cached(func,generators,corr_between,return_corr,return_samples,corr_axis,output_vars)
 
     def propagate_both(self,func,x,u_x_rand,u_x_syst,corr_between=None,return_corr=True,return_samples=False,corr_axis=-99,output_vars=1):
         """
@@ -121,19 +323,17 @@ class MCPropagation:
         :return: uncertainties on measurand
         :rtype: array
         """
-        MC_data = np.empty(len(x),dtype=np.ndarray)
+        self.stats.start_call("propagate_both")
+        generators = []
         for i in range(len(x)):
             if u_x_rand[i] is None:
                 u_x_rand[i] = np.zeros_like(x[i])
             if u_x_syst[i] is None:
                 u_x_syst[i] = np.zeros_like(x[i])
 
-            MC_data[i] = self.generate_samples_both(x[i],u_x_rand[i],u_x_syst[i])
+            generators.append((self.generate_samples_both,(x[i],u_x_rand[i],u_x_syst[i])))
 
-        if corr_between is not None:
-            MC_data = self.correlate_samples_corr(MC_data,corr_between)
-
-        return self.process_samples(func,MC_data,return_corr,return_samples,corr_axis,output_vars)
+        return self.run_cached(func,generators,corr_between,return_corr,return_samples,corr_axis,output_vars)
 
     def propagate_type(self,func,x,u_x,u_type,corr_between=None,return_corr=True,return_samples=False,corr_axis=-99,output_vars=1):
         """
@@ -161,22 +361,20 @@ class MCPropagation:
         :return: uncertainties on measurand
         :rtype: array
         """
-        MC_data = np.empty(len(x),dtype=np.ndarray)
+        self.stats.start_call("propagate_type")
+        generators = []
         for i in range(len(x)):
             if u_x[i] is None:
                 u_x[i] = np.zeros_like(x[i])
             if u_type[i].lower() == 'rand' or u_type[i].lower() == 'random' or u_type[i].lower() == 'r':
-                MC_data[i] = self.generate_samples_random(x[i],u_x[i])
+                generators.append((self.generate_samples_random,(x[i],u_x[i])))
             elif u_type[i].lower() == 'syst' or u_type[i].lower() == 'systematic' or u_type[i].lower() == 's':
-                MC_data[i] = self.generate_samples_systematic(x[i],u_x[i])
+                generators.append((self.generate_samples_systematic,(x[i],u_x[i])))
             else:
                 raise ValueError(
                     'Uncertainty type not understood. Use random ("random", "rand" or "r") or systematic ("systematic", "syst" or "s").')
 
-        if corr_between is not None:
-            MC_data = self.correlate_samples_corr(MC_data,corr_between)
-
-        return self.process_samples(func,MC_data,return_corr,return_samples,corr_axis,output_vars)
+        return self.run_cached(func,generators,corr_between,return_corr,return_samples,corr_axis,output_vars)
 
     def propagate_cov(self,func,x,cov_x,corr_between=None,return_corr=True,return_samples=False,corr_axis=-99,output_vars=1):
         """
@@ -187,8 +385,8 @@ class MCPropagation:
         :type func: function
         :param x: list of input quantities (usually numpy arrays)
         :type x: list[array]
-        :param cov_x: list of covariance matrices on input quantities (usually numpy arrays). In case the input quantity is an array of shape (m,o), the covariance matrix needs to be given as an array of shape (m*o,m*o).
-        :type cov_x: list[array]
+        :param cov_x: list of covariance matrices on input quantities (usually numpy arrays). In case the input quantity is an array of shape (m,o), the covariance matrix needs to be given as an array of shape (m*o,m*o). For input quantities that are floats, the standard uncertainty is given (rather than the variance). For large input quantities, structured covariance matrices (see punpy.mc.structured_covariance) can be given instead, which are never formed as dense matrices.
+        :type cov_x: list[array or StructuredCovariance]
         :param corr_between: covariance matrix (n,n) between input quantities, defaults to None
         :type corr_between: array, optional
         :param return_corr: set to True to return correlation matrix of measurand, defaults to True
@@ -202,18 +400,381 @@ class MCPropagation:
         :return: uncertainties on measurand
         :rtype: array
         """
-        MC_data = np.empty(len(x),dtype=np.ndarray)
+        self.stats.start_call("propagate_cov")
+        generators = []
         for i in range(len(x)):
-            if not hasattr(x[i],"__len__"):
-                MC_data[i] = self.generate_samples_systematic(x[i],cov_x[i])
+            if isinstance(cov_x[i],StructuredCovariance):
+                generators.append((self.generate_samples_cov,(x[i],cov_x[i])))
+            elif not hasattr(x[i],"__len__"):
+                generators.append((self.generate_samples_systematic,(x[i],cov_x[i])))
             elif (all((cov_x[i]==0).flatten())): #This is the case if one of the variables has no uncertainty
-                MC_data[i] = np.tile(x[i].flatten(),(self.MCsteps,1)).T
+                generators.append((self.generate_samples_constant,(x[i],)))
+            else:
+                generators.append((self.generate_samples_cov,(x[i],cov_x[i])))
+
+        return self.run_cached(func,generators,corr_between,return_corr,return_samples,corr_axis,output_vars)
+
+    def run_cached(self,func,generators,corr_between,return_corr,return_samples,corr_axis=-99,output_vars=1):
+        """
+        Return the results of a propagation call from the result cache if available, otherwise run the propagation
+        (see run_samples) and add its results to the cache. The key includes the state of the seed, which advances with every
+        call, so that results are found when a new propagator with the same seed repeats the same calls (e.g. in a later run),
+        and not when the same propagator repeats a call. On a cache hit, the same number of random streams is spawned
+        as in the propagation, so that the results of later calls do not depend on whether this call was cached.
+
+        :param func: measurement function
+        :type func: function
+        :param generators: for each input quantity, a tuple of the sample generator method and the arguments passed to it
+        :type generators: list[tuple]
+        :param corr_between: covariance matrix (n,n) between input quantities
+        :type corr_between: array
+        :param return_corr: set to True to return correlation matrix of measurand
+        :type return_corr: bool
+        :param return_samples: set to True to return generated samples
+        :type return_samples: bool
+        :param corr_axis: set to positive integer to select the axis used in the correlation matrix. The correlation matrix will then be averaged over other dimensions. Defaults to -99, for which the input array will be flattened and the full correlation matrix calculated.
+        :type corr_axis: integer, optional
+        :param output_vars: number of output parameters in the measurement function. Defaults to 1.
+        :type output_vars: integer, optional
+        :return: uncertainties on measurand
+        :rtype: array
+        """
+        if (self.result_cache is None or (return_samples and self.samples_dir is not None)
+                or (return_corr and self.corr_format=="memmap")):
+            return self.run_samples(func,generators,corr_between,return_corr,return_samples,corr_axis,output_vars)
+        # measurement functions bound to an instance of which the state cannot be hashed are not cached
+        identity = function_identity(func)
+        if identity is None:
+            return self.run_samples(func,generators,corr_between,return_corr,return_samples,corr_axis,output_vars)
+
+        with self.stats.stage("result_cache"):
+            seed_state = (self.seed_sequence.entropy,self.seed_sequence.spawn_key,self.seed_sequence.pool_size,
+                          self.seed_sequence.n_children_spawned)
+            settings = (self.MCsteps,self.dtype,self.sampling,self.batch_size,self.tile_shape,self.tolerance,
+                        self.coverage_probability,self.max_steps,self.corr_format,self.corr_rank)
+            key = self.result_cache.key(identity,[(generate.__name__,args) for generate,args in generators],
+                                        corr_between,return_corr,return_samples,corr_axis,output_vars,settings,seed_state)
+            entry = self.result_cache.get(key)
+        if entry is not None:
+            self.seed_sequence.spawn(entry["spawned"])
+            self.MCsteps_used = entry["MCsteps_used"]
+            self.coverage_interval = entry["coverage_interval"]
+            return entry["output"]
+
+        output = self.run_samples(func,generators,corr_between,return_corr,return_samples,corr_axis,output_vars)
+        with self.stats.stage("result_cache"):
+            self.result_cache.put(key,{"output":output,"MCsteps_used":self.MCsteps_used,"coverage_interval":self.coverage_interval,
+                                       "spawned":self.seed_sequence.n_children_spawned-seed_state[-1]})
+        return output
+
+    def run_samples(self,func,generators,corr_between,return_corr,return_samples,corr_axis=-99,output_vars=1,streams=None):
+        """
+        Generate the MC samples of the input quantities, run them through the measurement function and calculate
+        the uncertainties (and correlation matrix if required). If batch_size was set, this is done one batch of MC
+        iterations at a time, otherwise all MC iterations are processed at once. In batches, the correlation matrix is
+        accumulated from the co-moments of each batch, so that the full set of MC samples of the measurand is only kept
+        in memory when return_samples is set.
+
+        :param func: measurement function
+        :type func: function
+        :param generators: for each input quantity, a tuple of the sample generator method and the arguments passed to it
+        :type generators: list[tuple]
+        :param corr_between: covariance matrix (n,n) between input quantities
+        :type corr_between: array
+        :param return_corr: set to True to return correlation matrix of measurand
+        :type return_corr: bool
+        :param return_samples: set to True to return generated samples
+        :type return_samples: bool
+        :param corr_axis: set to positive integer to select the axis used in the correlation matrix. The correlation matrix will then be averaged over other dimensions. Defaults to -99, for which the input array will be flattened and the full correlation matrix calculated.
+        :type corr_axis: integer, optional
+        :param output_vars: number of output parameters in the measurement function. Defaults to 1.
+        :type output_vars: integer, optional
+        :param streams: random streams for each input quantity, defaults to None, for which new streams are spawned
+        :type streams: list[RandomStream], optional
+        :return: uncertainties on measurand
+        :rtype: array
+        """
+        if self.tile_shape is not None:
+            return self.run_tiles(func,generators,corr_between,return_corr,return_samples,output_vars)
+
+        if streams is None:
+            streams = self.spawn_streams(len(generators))
+
+        adaptive = self.tolerance is not None
+        if not adaptive and (self.batch_size is None or self.batch_size >= self.MCsteps):
+            self.MCsteps_used = self.MCsteps
+            MC_data = self.generate_MC_data(generators,corr_between,self.MCsteps,streams)
+            return self.process_samples(func,MC_data,return_corr,return_samples,corr_axis,output_vars)
+
+        if adaptive:
+            batch_size = self.batch_size if self.batch_size is not None else self.MCsteps
+            max_steps = self.max_steps
+            # statistics of the results of each batch (the "runs" of GUM S1), with the batches along the last axis
+            run_stats = RunningStatistics()
+            coverage_stats = RunningStatistics()
+        else:
+            batch_size = self.batch_size
+            max_steps = self.MCsteps
+
+        stats = RunningStatistics()
+        # the low-rank and out-of-core correlation matrices need all samples, which are therefore kept rather than reduced per batch
+        corr_samples = return_corr and self.corr_format!="dense"
+        if output_vars==1:
+            corr_stats = [RunningCorrelation(corr_axis)]
+        else:
+            corr_stats = [RunningCorrelation(corr_axis) for i in range(output_vars)]
+            corr_out_stats = RunningCovariance()
+        MC_y_batches = []
+        MC_y_all = None
+        MC_data_batches = []
+        store = None
+        if return_samples and self.samples_dir is not None:
+            store = SampleStore(self.samples_dir,max_steps)
+        elif corr_samples and not return_samples and self.corr_dir is not None:
+            # the samples of the measurand are streamed to disk, from which the correlation matrix is calculated
+            store = SampleStore(self.corr_dir,max_steps)
+        start = 0
+        while start < max_steps:
+            steps = min(batch_size,max_steps-start)
+            MC_data = self.generate_MC_data(generators,corr_between,steps,streams,start)
+            with self.stats.stage("evaluate_func") as stage:
+                MC_y = self.evaluate_func(func,MC_data,steps)
+                stage.output(MC_y)
+            if MC_y.dtype == object:
+                raise ValueError("Output parameters with different shapes are only supported when all MC iterations are processed at once (without batch_size or tolerance).")
+            if store is not None:
+                with self.stats.stage("store_samples"):
+                    if return_samples:
+                        store.write_MC(MC_y,MC_data,start)
+                    else:
+                        store.write("MC_y",MC_y,start)
+            elif return_samples or corr_samples:
+                # Only the reduced statistics are kept, unless the samples themselves are needed afterwards. Without the
+                # adaptive procedure, the number of MC iterations is known, so that the batches are written into a single
+                # array rather than concatenated afterwards (which would need memory for the samples twice).
+                if adaptive:
+                    MC_y_batches.append(MC_y)
+                else:
+                    if MC_y_all is None:
+                        MC_y_all = np.empty(MC_y.shape[:-1]+(max_steps,),dtype=MC_y.dtype)
+                    MC_y_all[...,start:start+steps] = MC_y
+            start += steps
+            with self.stats.stage("std"):
+                stats.update(MC_y)
+            if return_corr and not corr_samples:
+                with self.stats.stage("calculate_corr"):
+                    if output_vars==1:
+                        corr_stats[0].update(MC_y)
+                    else:
+                        for i in range(output_vars):
+                            corr_stats[i].update(MC_y[i])
+                        corr_out_stats.update(MC_y.reshape((output_vars,-1)))
+            if return_samples and store is None:
+                MC_data_batches.append(MC_data)
+            if adaptive:
+                run_stats.update(np.std(MC_y,axis=-1,dtype=np.float64)[...,None])
+                if self.coverage_probability is not None:
+                    coverage_stats.update(self.calculate_coverage_interval(MC_y)[...,None])
+                if self.check_tolerance(run_stats) and self.check_tolerance(coverage_stats):
+                    break
+
+        self.MCsteps_used = start
+        if adaptive and self.coverage_probability is not None:
+            self.coverage_interval = coverage_stats.mean
+        with self.stats.stage("std") as stage:
+            u_func = stats.std()
+            stage.output(u_func)
+        corr_y = None
+        corr_out = None
+        if return_corr and not corr_samples:
+            with self.stats.stage("calculate_corr") as stage:
+                if output_vars==1:
+                    corr_y = corr_stats[0].correlation()
+                else:
+                    corr_y = np.empty(output_vars,dtype=object)
+                    for i in range(output_vars):
+                        corr_y[i] = corr_stats[i].correlation()
+                    corr_out = corr_out_stats.correlation()
+                stage.output(corr_y,corr_out)
+
+        if store is not None and return_samples:
+            MC_y,MC_data = store.read_MC(len(generators),start)
+        elif store is not None:
+            MC_y = store.read("MC_y",start)
+            MC_data = None
+        elif MC_y_all is not None:
+            MC_y = MC_y_all
+            MC_data = None
+        elif return_samples or corr_samples:
+            MC_y = np.concatenate(MC_y_batches,axis=-1)
+            del MC_y_batches[:]
+            MC_data = None
+        else:
+            MC_y = None
+            MC_data = None
+        if return_samples and store is None:
+            MC_data = np.empty(len(generators),dtype=np.ndarray)
+            for i in range(len(generators)):
+                MC_data[i] = concatenate_samples([batch[i] for batch in MC_data_batches])
+        return self.process_output(u_func,MC_y,MC_data,return_corr,return_samples,corr_axis,output_vars,corr_y,corr_out)
+
+    def check_tolerance(self,run_stats):
+        """
+        Check whether the results of the batches of MC iterations in the adaptive procedure are stable within the tolerance,
+        i.e. whether twice the standard deviation of their mean is below the tolerance.
+
+        :param run_stats: running statistics of the results of each batch, with the batches along the last axis
+        :type run_stats: RunningStatistics
+        :return: True if the results are stable within the tolerance (or if there are no results to check)
+        :rtype: bool
+        """
+        if run_stats.count == 0:
+            return True
+        if run_stats.count < 2:
+            return False
+        return bool(np.all(2*run_stats.std(ddof=1)/np.sqrt(run_stats.count) <= self.tolerance))
+
+    def calculate_coverage_interval(self,MC_y):
+        """
+        Calculate the endpoints of the probabilistically symmetric coverage interval from MC-generated samples of the measurand.
+
+        :param MC_y: MC-generated samples of the measurand, with the MC iterations along the last axis
+        :type MC_y: array
+        :return: lower and upper endpoints of the coverage interval, stacked along the first axis
+        :rtype: array
+        """
+        return np.quantile(MC_y,[(1-self.coverage_probability)/2,(1+self.coverage_probability)/2],axis=-1)
+
+    def run_tiles(self,func,generators,corr_between,return_corr,return_samples,output_vars=1):
+        """
+        Propagate the uncertainties through an element-wise measurement function one spatial tile at a time.
+        Each tile is propagated separately (generating its own samples), and the resulting uncertainties are written
+        into a preallocated array for the full measurand.
+
+        :param func: element-wise measurement function
+        :type func: function
+        :param generators: for each input quantity, a tuple of the sample generator method and the arguments passed to it
+        :type generators: list[tuple]
+        :param corr_between: covariance matrix (n,n) between input quantities
+        :type corr_between: array
+        :param return_corr: set to True to return correlation matrix of measurand (not supported when tiling)
+        :type return_corr: bool
+        :param return_samples: set to True to return generated samples (not supported when tiling)
+        :type return_samples: bool
+        :param output_vars: number of output parameters in the measurement function. Defaults to 1.
+        :type output_vars: integer, optional
+        :return: uncertainties on measurand
+        :rtype: array
+        """
+        if return_corr or return_samples:
+            raise ValueError("When using tile_shape, only the uncertainties on the measurand can be returned (set return_corr=False and return_samples=False), as the correlation between tiles is not sampled.")
+
+        shape = np.broadcast(*[args[0] for generate,args in generators]).shape
+        if len(self.tile_shape) > len(shape):
+            raise ValueError("The tile_shape has more dimensions than the input quantities.")
+        if self.tolerance is not None:
+            raise ValueError("The adaptive procedure (tolerance) cannot be combined with tile_shape.")
+        self.MCsteps_used = self.MCsteps
+
+        tiles = []
+        for starts in itertools.product(*[range(0,shape[i],self.tile_shape[i]) for i in range(len(self.tile_shape))]):
+            tiles.append(tuple(slice(starts[i],starts[i]+self.tile_shape[i]) for i in range(len(starts))))
+
+        # Each tile is propagated by a copy of the propagator without tiling. When the tiles are run in parallel,
+        # the measurement function is evaluated vectorised within each tile.
+        tile_prop = copy.copy(self)
+        tile_prop.tile_shape = None
+        tile_generators = [[self.slice_generator(generator,shape,tile) for generator in generators] for tile in tiles]
+        # the random streams of each tile are spawned here, so that they do not depend on the process running the tile
+        tile_streams = [self.spawn_streams(len(generators)) for tile in tiles]
+        if self.parallel_cores > 1:
+            # the measurement function is sent to the workers when the pool is started
+            tile_prop.parallel_cores = 0
+            if self.parallel_backend=="threads":
+                with ThreadPoolExecutor(self.parallel_cores) as executor:
+                    u_tiles = list(executor.map(_propagate_tile,itertools.repeat(tile_prop),itertools.repeat(func),
+                                                tile_generators,itertools.repeat(corr_between),itertools.repeat(output_vars),
+                                                tile_streams))
             else:
-                MC_data[i] = self.generate_samples_cov(x[i].flatten(),cov_x[i]).reshape(x[i].shape+(self.MCsteps,))
+                tile_args = [(tile_prop,None,tile_generators[i],corr_between,output_vars,tile_streams[i]) for i in range(len(tiles))]
+                u_tiles = self.run_pool(func,_propagate_tile,tile_args)
+        else:
+            u_tiles = [_propagate_tile(tile_prop,func,tile_generators[i],corr_between,output_vars,tile_streams[i]) for i in range(len(tiles))]
+
+        if output_vars==1:
+            u_func = np.empty(shape)
+        else:
+            u_func = np.empty((output_vars,)+shape)
+        for tile,u_tile in zip(tiles,u_tiles):
+            if output_vars==1:
+                u_func[tile] = u_tile
+            else:
+                u_func[(slice(None),)+tile] = u_tile
+        return u_func
+
+    def slice_generator(self,generator,shape,tile):
+        """
+        Restrict the arguments of a sample generator to a spatial tile of the input quantities.
+
+        :param generator: tuple of the sample generator method and the arguments passed to it
+        :type generator: tuple
+        :param shape: shape of the input quantities
+        :type shape: tuple
+        :param tile: slices along the leading axes of the input quantities that define the tile
+        :type tile: tuple[slice]
+        :return: tuple of the sample generator method and the arguments for the tile
+        :rtype: tuple
+        """
+        generate,args = generator
+        if generate == self.generate_samples_cov:
+            param,cov_param = args
+            # select the rows and columns of the covariance matrix that belong to the flattened tile
+            index = np.arange(param.size).reshape(param.shape)[tile].flatten()
+            if isinstance(cov_param,StructuredCovariance):
+                return generate,(param[tile],cov_param.subset(index))
+            return generate,(param[tile],cov_param[np.ix_(index,index)])
+
+        tile_args = []
+        for arg in args:
+            if np.ndim(arg) > 0:
+                tile_args.append(np.broadcast_to(arg,shape)[tile])
+            else:
+                tile_args.append(arg)
+        return generate,tuple(tile_args)
+
+    def generate_MC_data(self,generators,corr_between,MCsteps,streams=None,start=0):
+        """
+        Generate MC samples of all input quantities and correlate them if required.
+
+        :param generators: for each input quantity, a tuple of the sample generator method and the arguments passed to it
+        :type generators: list[tuple]
+        :param corr_between: covariance matrix (n,n) between input quantities
+        :type corr_between: array
+        :param MCsteps: number of MC iterations to generate
+        :type MCsteps: int
+        :param streams: random streams for each input quantity, defaults to None, for which new streams are spawned
+        :type streams: list[RandomStream], optional
+        :param start: index of the first MC iteration to generate, defaults to 0
+        :type start: int, optional
+        :return: MC-generated samples of input quantities
+        :rtype: array[array]
+        """
+        if streams is None:
+            streams = self.spawn_streams(len(generators))
+
+        with self.stats.stage("generate_samples") as stage:
+            MC_data = np.empty(len(generators),dtype=np.ndarray)
+            for i in range(len(generators)):
+                generate,args = generators[i]
+                MC_data[i] = generate(*args,MCsteps=MCsteps,stream=streams[i],start=start)
+            stage.output(MC_data)
+
         if corr_between is not None:
-            MC_data = self.correlate_samples_corr(MC_data,corr_between)
+            with self.stats.stage("correlate_samples") as stage:
+                MC_data = self.correlate_samples_corr(MC_data,corr_between)
+                stage.output(MC_data)
 
-        return self.process_samples(func,MC_data,return_corr,return_samples,corr_axis,output_vars)
+        return MC_data
 
     def process_samples(self,func,data,return_corr,return_samples,corr_axis=-99,output_vars=1):
         """
@@ -235,28 +796,272 @@ class MCPropagation:
         :return: uncertainties on measurand
         :rtype: array
         """
+        with self.stats.stage("evaluate_func") as stage:
+            MC_y = self.evaluate_func(func,data,self.MCsteps)
+            stage.output(MC_y)
+        with self.stats.stage("std") as stage:
+            if MC_y.dtype == object:
+                # output parameters with different shapes
+                u_func = np.empty(len(MC_y),dtype=object)
+                for i in range(len(MC_y)):
+                    u_func[i] = np.std(MC_y[i],axis=-1,dtype=np.float64)
+            else:
+                u_func = np.std(MC_y,axis=-1,dtype=np.float64)
+            stage.output(u_func)
+        if return_samples and self.samples_dir is not None:
+            with self.stats.stage("store_samples"):
+                store = SampleStore(self.samples_dir,self.MCsteps)
+                store.write_MC(MC_y,data)
+                MC_y,data = store.read_MC(len(data))
+        return self.process_output(u_func,MC_y,data,return_corr,return_samples,corr_axis,output_vars)
+
+    def evaluate_func(self,func,data,MCsteps):
+        """
+        Run the MC-generated samples of input quantities through the measurement function.
+
+        :param func: measurement function
+        :type func: function
+        :param data: MC-generated samples of input quantities
+        :type data: array[array]
+        :param MCsteps: number of MC iterations in the samples
+        :type MCsteps: int
+        :return: MC-generated samples of the measurand
+        :rtype: array
+        """
         if self.parallel_cores==0:
-            MC_y = np.array(func(*data))
+            # samples stored in factored form are expanded here, and only for as long as the function runs
+            MC_y = self.stack_outputs(func(*[np.asarray(dat) for dat in data]))
 
         elif self.parallel_cores==1:
-            # In order to Process the MC iterations separately, the array with the input quantities has to be reordered
-            # so that it has the same length (i.e. the first dimension) as the number of MCsteps.
-            # First we move the axis with the same length as self.MCsteps from the last dimension to the fist dimension
-            data2 = [np.moveaxis(dat,-1,0) for dat in data]
-            # The function can then be applied to each of these MCsteps
-            MC_y2 = list(map(func,*data2))
+            # The function is applied to each of the MCsteps separately, by selecting each MC iteration along the last dimension.
+            MC_y2 = [func(*[dat[...,i] for dat in data]) for i in range(MCsteps)]
             # We then reorder to bring it back to the original shape
-            MC_y = np.moveaxis(MC_y2,0,-1)
+            MC_y = self.combine_outputs(MC_y2)
 
-        else:
+        elif self.parallel_backend=="threads":
+            MC_y = self.evaluate_func_threads(func,data,MCsteps)
+
+        elif shared_memory is None and self.parallel_mode=="chunks":
+            # Each worker evaluates the measurement function vectorised over a block of MC iterations,
+            # after which the blocks are concatenated.
+            data2=[[data[j][...,start:stop] for j in range(len(data))] for start,stop in self.split_steps(0,MCsteps)]
+            MC_y = self.combine_outputs(self.run_pool(func,run_worker_func,data2),blocks=True)
+
+        elif shared_memory is None:
             # We again need to reorder the input quantities samples in order to be able to pass them to p.starmap
             # We here use lists to iterate over and order them slightly different as the case above.
-            data2=[[data[j][...,i] for j in range(len(data))] for i in range(self.MCsteps)]
-            with Pool(self.parallel_cores) as p:
-                MC_y2=np.array(p.starmap(func,data2))
-            MC_y = np.moveaxis(MC_y2,0,-1)
+            data2=[[data[j][...,i] for j in range(len(data))] for i in range(MCsteps)]
+            MC_y = self.combine_outputs(self.run_pool(func,run_worker_func,data2))
+
+        else:
+            MC_y = self.evaluate_func_shared(func,data,MCsteps)
 
-        u_func = np.std(MC_y,axis=-1)
+        if MC_y.dtype == object:
+            return MC_y
+        if np.issubdtype(MC_y.dtype,np.floating) and MC_y.dtype != self.dtype:
+            MC_y = MC_y.astype(self.dtype)
+        return MC_y
+
+    def stack_outputs(self,output):
+        """
+        Combine the MC-generated samples of the output parameters of the measurement function into a single array.
+        If the output parameters have different shapes, they are kept as separate arrays in an object array.
+
+        :param output: output of the measurement function
+        :type output: array or tuple[array]
+        :return: MC-generated samples of the measurand
+        :rtype: array or array[array]
+        """
+        if isinstance(output,(tuple,list)) and len(set(np.shape(MC_y) for MC_y in output)) > 1:
+            MC_y = np.empty(len(output),dtype=object)
+            for i in range(len(output)):
+                MC_y[i] = np.asarray(output[i])
+                if np.issubdtype(MC_y[i].dtype,np.floating) and MC_y[i].dtype != self.dtype:
+                    MC_y[i] = MC_y[i].astype(self.dtype)
+            return MC_y
+        return np.array(output)
+
+    def combine_outputs(self,outputs,blocks=False):
+        """
+        Combine the outputs of the measurement function for separate MC iterations (stacked along a new last axis) or for
+        blocks of MC iterations (concatenated along the last axis). Output parameters with different shapes are combined
+        separately and kept in an object array (see stack_outputs).
+
+        :param outputs: output of the measurement function for each MC iteration or block of MC iterations
+        :type outputs: list
+        :param blocks: set to True if the outputs are for blocks of MC iterations, defaults to False
+        :type blocks: bool, optional
+        :return: MC-generated samples of the measurand
+        :rtype: array or array[array]
+        """
+        outputs = [self.stack_outputs(output) for output in outputs]
+        if outputs[0].dtype == object:
+            return self.stack_outputs([self.combine_outputs([output[i] for output in outputs],blocks) for i in range(len(outputs[0]))])
+        if blocks:
+            return np.concatenate(outputs,axis=-1)
+        return np.moveaxis(np.array(outputs),0,-1)
+
+    def first_outputs(self,func,data):
+        """
+        Run the first MC iteration through the measurement function, to find the shapes and data types of the output buffers.
+
+        :param func: measurement function
+        :type func: function
+        :param data: MC-generated samples of input quantities
+        :type data: array[array]
+        :return: output of the first MC iteration for each output buffer, and whether the output parameters have different shapes (with a buffer for each)
+        :rtype: tuple
+        """
+        if self.parallel_mode=="chunks":
+            MC_y0 = self.stack_outputs(func(*[np.asarray(data[j][...,:1]) for j in range(len(data))]))
+        else:
+            MC_y0 = self.stack_outputs(func(*[np.asarray(data[j][...,0]) for j in range(len(data))]))
+        separate = MC_y0.dtype == object
+        outputs0 = list(MC_y0) if separate else [MC_y0]
+        if self.parallel_mode=="chunks":
+            outputs0 = [output0[...,0] for output0 in outputs0]
+        return outputs0,separate
+
+    def evaluate_func_shared(self,func,data,MCsteps):
+        """
+        Run the MC-generated samples of input quantities through the measurement function on parallel_cores worker
+        processes, either one MC iteration at a time or vectorised over blocks of MC iterations (depending on parallel_mode).
+        The samples and the output buffer are placed in shared memory, so that only the ranges of MC iterations are sent
+        to the workers, which write the measurand in place.
+
+        :param func: measurement function
+        :type func: function
+        :param data: MC-generated samples of input quantities
+        :type data: array[array]
+        :param MCsteps: number of MC iterations in the samples
+        :type MCsteps: int
+        :return: MC-generated samples of the measurand
+        :rtype: array
+        """
+        # The first MC iteration is run here to find the shape of the output buffer(s)
+        outputs0,separate = self.first_outputs(func,data)
+        # the first MC iteration is written into the output buffer, so that the blocks start at the second MC iteration
+        if self.parallel_mode=="chunks":
+            worker = run_worker_chunk
+            steps = self.split_steps(1,MCsteps)
+        else:
+            worker = run_worker_steps
+            steps = self.split_steps(1,MCsteps,4)
+
+        blocks = []
+        arrays = []
+        try:
+            input_specs = []
+            for j in range(len(data)):
+                shm,array,spec = create_shared_array(np.shape(data[j]),np.result_type(data[j].dtype))
+                blocks.append(shm)
+                arrays.append(array)
+                array[...] = data[j]
+                input_specs.append(spec)
+            output_specs = []
+            for output0 in outputs0:
+                shm,array,spec = create_shared_array(output0.shape+(MCsteps,),output0.dtype)
+                blocks.append(shm)
+                arrays.append(array)
+                array[...,0] = output0
+                output_specs.append(spec)
+            del array
+
+            output_spec = output_specs if separate else output_specs[0]
+            self.run_pool(func,worker,[(input_specs,output_spec,start,stop) for start,stop in steps])
+
+            if separate:
+                MC_y = self.stack_outputs([array.copy() for array in arrays[len(data):]])
+            else:
+                MC_y = arrays[-1].copy()
+        finally:
+            # the arrays need to be released before the shared memory blocks can be closed
+            del arrays[:]
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+        return MC_y
+
+    def evaluate_func_threads(self,func,data,MCsteps):
+        """
+        Run the MC-generated samples of input quantities through the measurement function on parallel_cores threads,
+        either one MC iteration at a time or vectorised over blocks of MC iterations (depending on parallel_mode).
+        The threads read the samples directly and write the measurand into a preallocated output array.
+
+        :param func: measurement function
+        :type func: function
+        :param data: MC-generated samples of input quantities
+        :type data: array[array]
+        :param MCsteps: number of MC iterations in the samples
+        :type MCsteps: int
+        :return: MC-generated samples of the measurand
+        :rtype: array
+        """
+        # The first MC iteration is run here to find the shape of the output array(s)
+        outputs0,separate = self.first_outputs(func,data)
+        # the first MC iteration is written into the output array, so that the blocks start at the second MC iteration
+        if self.parallel_mode=="chunks":
+            run = run_chunk
+            steps = self.split_steps(1,MCsteps)
+        else:
+            run = run_steps
+            steps = self.split_steps(1,MCsteps,4)
+
+        outputs = []
+        for output0 in outputs0:
+            outputs.append(np.empty(output0.shape+(MCsteps,),dtype=output0.dtype))
+            outputs[-1][...,0] = output0
+        with ThreadPoolExecutor(self.parallel_cores) as executor:
+            futures = [executor.submit(run,func,list(data),outputs if separate else outputs[0],start,stop) for start,stop in steps]
+            for future in futures:
+                future.result()
+        if separate:
+            return self.stack_outputs(outputs)
+        return outputs[0]
+
+    def split_steps(self,start,stop,chunks_per_core=None):
+        """
+        Split a range of MC iterations into contiguous blocks, with chunks_per_core blocks for each core.
+
+        :param start: first MC iteration
+        :type start: int
+        :param stop: end of the range of MC iterations (exclusive)
+        :type stop: int
+        :param chunks_per_core: number of blocks per core, defaults to None, for which the chunks_per_core of the propagator is used
+        :type chunks_per_core: int, optional
+        :return: (start, stop) of each block
+        :rtype: list[tuple]
+        """
+        if chunks_per_core is None:
+            chunks_per_core = self.chunks_per_core
+        bounds = np.linspace(start,stop,self.parallel_cores*chunks_per_core+1).astype(int)
+        return [(int(bounds[i]),int(bounds[i+1])) for i in range(len(bounds)-1) if bounds[i+1]>bounds[i]]
+
+    def process_output(self,u_func,MC_y,data,return_corr,return_samples,corr_axis=-99,output_vars=1,corr_y=None,corr_out=None):
+        """
+        Calculate the correlation matrix if required and assemble the requested outputs.
+
+        :param u_func: uncertainties on measurand
+        :type u_func: array
+        :param MC_y: MC-generated samples of the measurand
+        :type MC_y: array
+        :param data: MC-generated samples of input quantities
+        :type data: array[array]
+        :param return_corr: set to True to return correlation matrix of measurand
+        :type return_corr: bool
+        :param return_samples: set to True to return generated samples
+        :type return_samples: bool
+        :param corr_axis: set to positive integer to select the axis used in the correlation matrix. The correlation matrix will then be averaged over other dimensions. Defaults to -99, for which the input array will be flattened and the full correlation matrix calculated.
+        :type corr_axis: integer, optional
+        :param output_vars: number of output parameters in the measurement function. Defaults to 1.
+        :type output_vars: integer, optional
+        :param corr_y: correlation matrix (or matrices for each output parameter) of measurand if already calculated, defaults to None, for which it is calculated from MC_y
+        :type corr_y: array, optional
+        :param corr_out: correlation matrix between the output parameters if already calculated, defaults to None, for which it is calculated from MC_y
+        :type corr_out: array, optional
+        :return: uncertainties on measurand
+        :rtype: array
+        """
         if not return_corr:
             if return_samples:
                 return u_func,MC_y,data
@@ -264,92 +1069,225 @@ class MCPropagation:
                 return u_func
         else:
             if output_vars==1:
-                corr_y = self.calculate_corr(MC_y,corr_axis)
+                if corr_y is None:
+                    with self.stats.stage("calculate_corr") as stage:
+                        corr_y = self.calculate_corr(MC_y,corr_axis)
+                        stage.output(corr_y)
                 if return_samples:
                     return u_func,corr_y,MC_y,data
                 else:
                     return u_func,corr_y
 
             else:
-                #create an empty arrays and then populate it with the correlation matrix for each output parameter individually
-                corr_ys=np.empty(output_vars,dtype=object)
-                for i in range(output_vars):
-                    corr_ys[i] = self.calculate_corr(MC_y[i],corr_axis)
-
-                #calculate correlation matrix between the different outputs produced by the measurement function.
-                corr_out=np.corrcoef(MC_y.reshape((output_vars,-1)))
+                if corr_y is None:
+                    #calculate the correlation matrix for each output parameter and the correlation matrix between the different outputs produced by the measurement function in one pass.
+                    with self.stats.stage("calculate_corr") as stage:
+                        corr_ys,corr_out = self.calculate_corr_outputs(MC_y,corr_axis)
+                        stage.output(corr_ys,corr_out)
+                else:
+                    corr_ys = corr_y
 
                 if return_samples:
                     return u_func,corr_ys,corr_out,MC_y,data
                 else:
                     return u_func,corr_ys,corr_out
 
-    def calculate_corr(self,MC_y,corr_axis=-99):
+    def calculate_corr(self,MC_y,corr_axis=-99,name="corr_y"):
         """
         Calculate the correlation matrix between the MC-generated samples of output quantities.
         If corr_axis is specified, this axis will be the one used to calculate the correlation matrix (e.g. if corr_axis=0 and x.shape[0]=n, the correlation matrix will have shape (n,n)).
         This will be done for each combination of parameters in the other dimensions and the resulting correlation matrices are averaged.
+        The samples are centred along the MC axis, after which the correlation matrices of all combinations are calculated with a single stacked matrix product, for any number of dimensions.
 
         :param MC_y: MC-generated samples of the output quantities (measurands)
         :type MC_y: array
         :param corr_axis: set to positive integer to select the axis used in the correlation matrix. The correlation matrix will then be averaged over other dimensions. Defaults to -99, for which the input array will be flattened and the full correlation matrix calculated.
         :type corr_axis: integer, optional
-        :return: correlation matrix
-        :rtype: array
+        :param name: name of the .npy file in corr_dir in which the full correlation matrix is written if corr_format="memmap", defaults to "corr_y"
+        :type name: str, optional
+        :return: correlation matrix (a LowRankCorrelation or a memory-mapped array for the full correlation matrix if corr_format="lowrank" or "memmap")
+        :rtype: array or LowRankCorrelation or numpy.memmap
         """
-        #print("the shape is:",MC_y.shape)
+        if isinstance(MC_y,SystematicSamples):
+            # the correlation of systematic samples only depends on the signs of the uncertainties,
+            # so that two MC iterations with z=-1 and z=1 give the same correlation matrix
+            MC_y = np.multiply.outer(np.broadcast_to(MC_y.u_param,MC_y.element_shape),[-1.,1.])
+        MC_y = np.asarray(MC_y)
+        if self.corr_format!="dense" and not self.is_stacked(MC_y,corr_axis):
+            MC_y = MC_y.reshape((-1,MC_y.shape[-1]))
+            if self.corr_format=="lowrank":
+                return LowRankCorrelation.from_samples(MC_y,self.corr_rank)
+            blocked = BlockedCorrelation(os.path.join(self.corr_dir,name+".npy"),self.corr_tile_size,self.corr_upper,self.parallel_cores)
+            return blocked.compute(MC_y)
+
+        corr_y = self.calculate_corr_stacks([self.stack_samples(MC_y,corr_axis)])[0][0]
+        if corr_y.shape == (1,1):
+            return corr_y[0,0]
+        return corr_y
 
-        if len(MC_y.shape) <3:
-                corr_y = np.corrcoef(MC_y)
+    @staticmethod
+    def is_stacked(MC_y,corr_axis):
+        """
+        Check whether the correlation matrix is calculated along corr_axis for a stack of combinations of parameters in the
+        other dimensions, rather than over all elements.
 
-        elif len(MC_y.shape) == 3:
-            if corr_axis==0:
-                corr_ys = np.empty(len(MC_y[0]),dtype=object)
-                for i in range(len(MC_y[0])):
-                    corr_ys[i] = np.corrcoef(MC_y[:,i])
-                corr_y = np.mean(corr_ys,axis=0)
+        :param MC_y: MC-generated samples of the output quantity
+        :type MC_y: array
+        :param corr_axis: axis used in the correlation matrix
+        :type corr_axis: integer
+        :return: True if the correlation matrix is calculated along corr_axis
+        :rtype: bool
+        """
+        return MC_y.ndim >= 3 and 0 <= corr_axis < MC_y.ndim-1
 
-            elif corr_axis==1:
-                corr_ys = np.empty(len(MC_y),dtype=object)
-                for i in range(len(MC_y)):
-                    corr_ys[i] = np.corrcoef(MC_y[i])
-                corr_y = np.mean(corr_ys,axis=0)
+    def stack_samples(self,MC_y,corr_axis=-99):
+        """
+        Arrange the MC-generated samples of an output quantity as a stack of shape (...,m,MCsteps), with the m elements along
+        corr_axis in the second to last dimension (or all elements, with a stack of length 1, if the full correlation matrix is calculated).
 
-            else:
-                MC_y = MC_y.reshape((MC_y.shape[0]*MC_y.shape[1],self.MCsteps))
-                corr_y = np.corrcoef(MC_y)
-
-        elif len(MC_y.shape) == 4:
-            if corr_axis == 0:
-                corr_ys = np.empty(len(MC_y[0])*len(MC_y[0,0]),dtype=object)
-                for i in range(len(MC_y[0])):
-                    for j in range(len(MC_y[0,0])):
-                        corr_ys[i+j*len(MC_y[0])] = np.corrcoef(MC_y[:,i,j])
-                corr_y = np.mean(corr_ys,axis=0)
-
-            elif corr_axis == 1:
-                corr_ys = np.empty(len(MC_y)*len(MC_y[0,0]),dtype=object)
-                for i in range(len(MC_y)):
-                    for j in range(len(MC_y[0,0])):
-                        corr_ys[i+j*len(MC_y)] = np.corrcoef(MC_y[i,:,j])
-                corr_y = np.mean(corr_ys,axis=0)
+        :param MC_y: MC-generated samples of the output quantity
+        :type MC_y: array
+        :param corr_axis: axis used in the correlation matrix, defaults to -99
+        :type corr_axis: integer, optional
+        :return: stack of samples
+        :rtype: array
+        """
+        if self.is_stacked(MC_y,corr_axis):
+            # stack of the samples along corr_axis, for each combination of parameters in the other dimensions
+            return np.moveaxis(MC_y,corr_axis,-2)
+        return MC_y.reshape((1,-1,MC_y.shape[-1]))
 
-            elif corr_axis == 2:
-                corr_ys = np.empty(len(MC_y)*len(MC_y[0]),dtype=object)
-                for i in range(len(MC_y)):
-                    for j in range(len(MC_y[0])):
-                        corr_ys[i+j*len(MC_y)] = np.corrcoef(MC_y[i,j])
-                corr_y = np.mean(corr_ys,axis=0)
-            else:
-                MC_y = MC_y.reshape((MC_y.shape[0]*MC_y.shape[1]*MC_y.shape[2],self.MCsteps))
-                corr_y = np.corrcoef(MC_y)
+    def calculate_corr_stacks(self,stacks,corr=True):
+        """
+        Calculate the correlation matrices averaged over each stack of samples, and the co-moments between the stacks, in a
+        single pass over the centred samples. The stacks are processed together in chunks of about 2**18 values per stack,
+        so that the temporary arrays stay small. When only the co-moments are calculated, the chunks are taken over all
+        elements of the stacks (rather than over the stack dimensions), so that memory-mapped samples are read from disk in
+        chunks rather than loaded in memory at once.
+
+        :param stacks: stacks of samples of the same shape (...,m,MCsteps)
+        :type stacks: list[array]
+        :param corr: set to False to only calculate the co-moments between the stacks, defaults to True
+        :type corr: bool, optional
+        :return: correlation matrix of each stack (None if corr is False), co-moments (summed over all elements and MC iterations) between the stacks (None for a single stack), and mean of each element of each stack
+        :rtype: tuple
+        """
+        n_stack = int(np.prod(stacks[0].shape[:-2]))
+        if corr:
+            chunk_size = max(1,2**18//int(np.prod(stacks[0].shape[1:])))
+            chunks = (slice(start,start+chunk_size) for start in range(0,len(stacks[0]),chunk_size))
         else:
-            print("MC_y has too high dimensions. Reduce the dimensionality of the input data")
-            exit()
+            element_shape = stacks[0].shape[:-1]
+            n_elements = int(np.prod(element_shape))
+            chunk_size = max(1,2**18//stacks[0].shape[-1])
+            chunks = (np.unravel_index(np.arange(start,min(start+chunk_size,n_elements)),element_shape) for start in range(0,n_elements,chunk_size))
+        corr_ys = [None]*len(stacks)
+        comoments = None
+        means = []
+        for chunk in chunks:
+            z = np.array([stack[chunk] for stack in stacks],dtype=np.float64,order="C")
+            mean = np.mean(z,axis=-1,keepdims=True)
+            z -= mean
+            means.append(mean.reshape((len(stacks),-1)))
+            if len(stacks) > 1:
+                z_flat = z.reshape((len(stacks),-1))
+                comoments = np.dot(z_flat,z_flat.T) if comoments is None else comoments+np.dot(z_flat,z_flat.T)
+            if not corr:
+                continue
+            for i in range(len(stacks)):
+                zi = z[i].reshape((-1,)+stacks[i].shape[-2:])
+                cov = np.matmul(zi,np.swapaxes(zi,-1,-2))
+                std = np.sqrt(np.diagonal(cov,axis1=-2,axis2=-1))
+                with np.errstate(divide="ignore",invalid="ignore"):
+                    cov /= std[:,:,None]
+                    cov /= std[:,None,:]
+                cov = cov[0] if len(cov) == 1 else np.sum(cov,axis=0)
+                corr_ys[i] = cov if corr_ys[i] is None else corr_ys[i]+cov
+        if corr:
+            for corr_y in corr_ys:
+                corr_y /= n_stack
+                np.clip(corr_y,-1,1,out=corr_y)
+        else:
+            corr_ys = None
+        return corr_ys,comoments,np.concatenate(means,axis=1)
 
-        return corr_y
+    def calculate_corr_outputs(self,MC_y,corr_axis=-99):
+        """
+        Calculate the correlation matrix of each output parameter of the measurement function, and the correlation matrix
+        between the output parameters (the same as np.corrcoef of the flattened samples of each output parameter).
+        When the output parameters have the same shape, this is done in a single pass over the centred samples, which are
+        shared by both calculations. Output parameters with different shapes get their own correlation matrices, and the
+        correlation between them is calculated after broadcasting them to a common shape (or is None if their shapes do not broadcast).
+
+        :param MC_y: MC-generated samples of each output parameter
+        :type MC_y: array or array[array]
+        :param corr_axis: set to positive integer to select the axis used in the correlation matrices. Defaults to -99, for which the full correlation matrices are calculated.
+        :type corr_axis: integer, optional
+        :return: correlation matrix of each output parameter, and correlation matrix between the output parameters
+        :rtype: tuple
+        """
+        outputs = [np.asarray(MC_y[i]) for i in range(len(MC_y))]
+        output_vars = len(outputs)
+        MCsteps = outputs[0].shape[-1]
+        corr_ys = np.empty(output_vars,dtype=object)
+        same_shape = all(output.shape == outputs[0].shape for output in outputs)
+        if same_shape and (self.corr_format=="dense" or self.is_stacked(outputs[0],corr_axis)):
+            corr_list,comoments,means = self.calculate_corr_stacks([self.stack_samples(output,corr_axis) for output in outputs])
+            for i in range(output_vars):
+                corr_ys[i] = corr_list[i][0,0] if corr_list[i].shape == (1,1) else corr_list[i]
+        else:
+            for i in range(output_vars):
+                corr_ys[i] = self.calculate_corr(outputs[i],corr_axis,"corr_y%s"%i)
+            try:
+                shape = np.broadcast(*outputs).shape
+            except ValueError:
+                return corr_ys,None
+            stacks = [np.broadcast_to(output,shape)[(None,)*max(3-len(shape),0)] for output in outputs]
+            corr_list,comoments,means = self.calculate_corr_stacks(stacks,corr=False)
+
+        # the co-moments of the samples around the overall mean of each output parameter are the co-moments around the mean
+        # of each element, plus those of the means of the elements
+        means -= np.mean(means,axis=1,keepdims=True)
+        comoments = comoments+MCsteps*np.dot(means,means.T)
+        std = np.sqrt(np.diag(comoments))
+        with np.errstate(divide="ignore",invalid="ignore"):
+            corr_out = comoments/std[:,None]/std[None,:]
+        return corr_ys,np.clip(corr_out,-1,1)
+
+    def fill_samples(self,param,deviations,MCsteps):
+        """
+        Write the MC samples param+u_1*z_1+u_2*z_2+... of an input quantity of any shape into a single preallocated array.
+        The values and uncertainties are broadcast along the MC axis. The random numbers either have the shape of the samples
+        (for random uncertainties), or have shape (MCsteps,) and are shared by all elements (for systematic uncertainties).
 
-    def generate_samples_random(self,param,u_param):
+        :param param: values of input quantity (mean of distribution)
+        :type param: float or array
+        :param deviations: for each error component, a tuple of the uncertainties on the input quantity and the standard normal random numbers
+        :type deviations: list[tuple]
+        :param MCsteps: number of MC iterations
+        :type MCsteps: int
+        :return: generated samples
+        :rtype: array
+        """
+        param = self.as_dtype(param)
+        samples = np.empty(np.shape(param)+(MCsteps,),dtype=self.dtype)
+        u_param,z = deviations[0]
+        np.multiply(np.expand_dims(self.as_dtype(u_param),-1),z,out=samples)
+
+        # further components are added in chunks of elements, so that the temporary arrays stay small
+        samples_flat = samples.reshape((-1,MCsteps))
+        chunk_size = max(1,2**16//max(MCsteps,1))
+        for u_param,z in deviations[1:]:
+            u_flat = np.broadcast_to(self.as_dtype(u_param),np.shape(param)).reshape((-1,1))
+            z_flat = z.reshape((-1,MCsteps))
+            for start in range(0,len(samples_flat),chunk_size):
+                stop = start+chunk_size
+                samples_flat[start:stop] += u_flat[start:stop]*(z_flat if len(z_flat) == 1 else z_flat[start:stop])
+
+        samples += np.expand_dims(param,-1)
+        return samples
+
+    def generate_samples_random(self,param,u_param,MCsteps=None,stream=None,start=0):
         """
         Generate MC samples of input quantity with random (Gaussian) uncertainties.
 
@@ -357,46 +1295,53 @@ class MCPropagation:
         :type param: float or array
         :param u_param: uncertainties on input quantity (std of distribution)
         :type u_param: float or array
+        :param MCsteps: number of MC iterations to generate, defaults to None, for which the number of MC iterations of the propagator is used
+        :type MCsteps: int, optional
+        :param stream: random stream used to generate the samples, defaults to None, for which a new stream is spawned
+        :type stream: RandomStream, optional
+        :param start: index of the first MC iteration to generate within the random stream, defaults to 0
+        :type start: int, optional
         :return: generated samples
         :rtype: array
         """
-        if not hasattr(param,"__len__"):
-            return np.random.normal(size=self.MCsteps)*u_param+param
-        elif len(param.shape) == 1:
-            return np.random.normal(size=(len(param),self.MCsteps))*u_param[:,None]+param[:,None]
-        elif len(param.shape) == 2:
-            return np.random.normal(size=param.shape+(self.MCsteps,))*u_param[:,:,None]+param[:,:,None]
-        elif len(param.shape) == 3:
-            return np.random.normal(size=param.shape+(self.MCsteps,))*u_param[:,:,:,None]+param[:,:,:,None]
-        else:
-            print("parameter shape not supported")
-            exit()
-
-
-    def generate_samples_systematic(self,param,u_param):
+        if MCsteps is None:
+            MCsteps = self.MCsteps
+        if stream is None:
+            stream = self.spawn_streams(1)[0]
+        param = self.as_dtype(param)
+        u_param = self.as_dtype(u_param)
+        z = stream.standard_normal(np.shape(param),start,start+MCsteps,dtype=self.dtype)
+        return self.fill_samples(param,[(u_param,z)],MCsteps)
+
+    def generate_samples_systematic(self,param,u_param,MCsteps=None,stream=None,start=0):
         """
         Generate correlated MC samples of input quantity with systematic (Gaussian) uncertainties.
+        The samples are returned in factored form (values, uncertainties and one random number per MC iteration),
+        and are only expanded to an array of shape param.shape+(MCsteps,) when needed (see punpy.mc.factored_samples).
 
         :param param: values of input quantity (mean of distribution)
         :type param: float or array
         :param u_param: uncertainties on input quantity (std of distribution)
         :type u_param: float or array
+        :param MCsteps: number of MC iterations to generate, defaults to None, for which the number of MC iterations of the propagator is used
+        :type MCsteps: int, optional
+        :param stream: random stream used to generate the samples, defaults to None, for which a new stream is spawned
+        :type stream: RandomStream, optional
+        :param start: index of the first MC iteration to generate within the random stream, defaults to 0
+        :type start: int, optional
         :return: generated samples
-        :rtype: array
+        :rtype: SystematicSamples
         """
-        if not hasattr(param,"__len__"):
-            return np.random.normal(size=self.MCsteps)*u_param+param
-        elif len(param.shape) == 1:
-            return np.dot(u_param[:,None],np.random.normal(size=self.MCsteps)[None,:])+param[:,None]
-        elif len(param.shape) == 2:
-            return np.dot(u_param[:,:,None],np.random.normal(size=self.MCsteps)[:,None,None])[:,:,:,0]+param[:,:,None]
-        elif len(param.shape) == 3:
-            return np.dot(u_param[:,:,:,None],np.random.normal(size=self.MCsteps)[:,None,None,None])[:,:,:,:,0,0]+param[:,:,:,None]
-        else:
-            print("parameter shape not supported")
-            exit()
-
-    def generate_samples_both(self,param,u_param_rand,u_param_syst):
+        if MCsteps is None:
+            MCsteps = self.MCsteps
+        if stream is None:
+            stream = self.spawn_streams(1)[0]
+        param = self.as_dtype(param)
+        u_param = self.as_dtype(u_param)
+        z = stream.standard_normal((),start,start+MCsteps,dtype=self.dtype)
+        return SystematicSamples(param,u_param,z)
+
+    def generate_samples_both(self,param,u_param_rand,u_param_syst,MCsteps=None,stream=None,start=0):
         """
         Generate correlated MC samples of the input quantity with random and systematic (Gaussian) uncertainties.
 
@@ -406,42 +1351,84 @@ class MCPropagation:
         :type u_param_rand: float or array
         :param u_param_syst: systematic uncertainties on input quantity (std of distribution)
         :type u_param_syst: float or array
+        :param MCsteps: number of MC iterations to generate, defaults to None, for which the number of MC iterations of the propagator is used
+        :type MCsteps: int, optional
+        :param stream: random stream used to generate the samples, defaults to None, for which a new stream is spawned
+        :type stream: RandomStream, optional
+        :param start: index of the first MC iteration to generate within the random stream, defaults to 0
+        :type start: int, optional
         :return: generated samples
         :rtype: array
         """
-        if not hasattr(param,"__len__"):
-            return np.random.normal(size=self.MCsteps)*u_param_rand+np.random.normal(
-                size=self.MCsteps)*u_param_syst+param
-        elif len(param.shape) == 1:
-            return np.random.normal(size=(len(param),self.MCsteps))*u_param_rand[:,None]+np.dot(u_param_syst[:,None],
-                np.random.normal(size=self.MCsteps)[None,:])+param[:,None]
-        elif len(param.shape) == 2:
-            return np.random.normal(size=param.shape+(self.MCsteps,))*u_param_rand[:,:,None]+np.dot(
-                u_param_syst[:,:,None],np.random.normal(size=self.MCsteps)[:,None,None])[:,:,:,0]+param[:,:,None]
-        elif len(param.shape) == 3:
-            return np.random.normal(size=param.shape+(self.MCsteps,))*u_param_rand[:,:,:,None]+np.dot(u_param_syst[:,:,:,None],np.random.normal(size=self.MCsteps)[:,None,None,None])[:,:,:,:,0,0]+param[:,:,:,None]
-        else:
-            print("parameter shape not supported")
-            exit()
-
-    def generate_samples_cov(self,param,cov_param):
+        if MCsteps is None:
+            MCsteps = self.MCsteps
+        if stream is None:
+            stream = self.spawn_streams(1)[0]
+        param = self.as_dtype(param)
+        u_param_rand = self.as_dtype(u_param_rand)
+        u_param_syst = self.as_dtype(u_param_syst)
+        # the random and systematic components are drawn from independent substreams
+        z_rand = stream.standard_normal(np.shape(param),start,start+MCsteps,substream=0,dtype=self.dtype)
+        z_syst = stream.standard_normal((),start,start+MCsteps,substream=1,dtype=self.dtype)
+        return self.fill_samples(param,[(u_param_rand,z_rand),(u_param_syst,z_syst)],MCsteps)
+
+    def generate_samples_cov(self,param,cov_param,MCsteps=None,stream=None,start=0):
         """
         Generate correlated MC samples of input quantity with a given covariance matrix.
         Samples are generated independent and then correlated using Cholesky decomposition.
 
-        :param param: values of input quantity (mean of distribution)
+        :param param: values of input quantity (mean of distribution). In case the input quantity is an array of shape (m,o), the covariance matrix needs to be given as an array of shape (m*o,m*o).
         :type param: array
-        :param cov_param: covariance matrix for input quantity
-        :type cov_param: array
+        :param cov_param: covariance matrix for input quantity. Structured covariance matrices (see punpy.mc.structured_covariance) are sampled directly from their factors, without forming the dense matrix.
+        :type cov_param: array or StructuredCovariance
+        :param MCsteps: number of MC iterations to generate, defaults to None, for which the number of MC iterations of the propagator is used
+        :type MCsteps: int, optional
+        :param stream: random stream used to generate the samples, defaults to None, for which a new stream is spawned
+        :type stream: RandomStream, optional
+        :param start: index of the first MC iteration to generate within the random stream, defaults to 0
+        :type start: int, optional
         :return: generated samples
         :rtype: array
         """
-        try:
-            L = np.linalg.cholesky(cov_param)
-        except:
-            L = self.nearestPD_cholesky(cov_param)
+        if MCsteps is None:
+            MCsteps = self.MCsteps
+        if stream is None:
+            stream = self.spawn_streams(1)[0]
+        param = self.as_dtype(param)
+
+        if isinstance(cov_param,StructuredCovariance):
+            if cov_param.size != param.size:
+                raise ValueError("The structured covariance matrix does not have the same size as the input quantity.")
+            z = stream.standard_normal((cov_param.n_random,),start,start+MCsteps,dtype=self.dtype)
+            samples = cov_param.correlate(z,lambda A: cholesky_cache.get(A,self.cholesky,self.dtype))
+            samples += param.reshape((-1,1))
+            return samples.reshape(param.shape+(MCsteps,))
+
+        # the factor is cached in the data type of the samples, so that it is not copied on every call
+        L = cholesky_cache.get(cov_param,self.cholesky,self.dtype)
+        z = stream.standard_normal((param.size,),start,start+MCsteps,dtype=self.dtype)
+        samples = np.dot(L,z)
+        samples += param.reshape((-1,1))
+        return samples.reshape(param.shape+(MCsteps,))
+
+    def generate_samples_constant(self,param,MCsteps=None,stream=None,start=0):
+        """
+        Generate MC samples of input quantity without uncertainty (all samples equal to the input quantity).
 
-        return np.dot(L,np.random.normal(size=(len(param),self.MCsteps)))+param[:,None]
+        :param param: values of input quantity
+        :type param: float or array
+        :param MCsteps: number of MC iterations to generate, defaults to None, for which the number of MC iterations of the propagator is used
+        :type MCsteps: int, optional
+        :param stream: not used, as no random numbers are drawn (for consistency with the other sample generators)
+        :type stream: RandomStream, optional
+        :param start: not used, as no random numbers are drawn (for consistency with the other sample generators)
+        :type start: int, optional
+        :return: generated samples
+        :rtype: array
+        """
+        if MCsteps is None:
+            MCsteps = self.MCsteps
+        return np.tile(np.asarray(self.as_dtype(param))[...,None],MCsteps)
 
     def correlate_samples_corr(self,samples,corr):
         """
@@ -457,15 +1444,12 @@ class MCPropagation:
         if np.max(corr) > 1 or len(corr) != len(samples):
             raise ValueError("The correlation matrix between variables is not the right shape or has elements >1.")
         else:
-            try:
-                L = np.array(np.linalg.cholesky(corr))
-            except:
-                L = self.nearestPD_cholesky(corr)
+            L = cholesky_cache.get(corr,self.cholesky,self.dtype)
 
             #Cholesky needs to be applied to Gaussian distributions with mean=0 and std=1,
             #We first calculate the mean and std for each input quantity
-            means = np.array([np.mean(samples[i]) for i in range(len(samples))])
-            stds = np.array([np.std(samples[i]) for i in range(len(samples))])
+            means = np.array([np.mean(samples[i],dtype=np.float64) for i in range(len(samples))]).astype(self.dtype)
+            stds = np.array([np.std(samples[i],dtype=np.float64) for i in range(len(samples))]).astype(self.dtype)
 
             #We normalise the samples with the mean and std, then apply Cholesky, and finally reapply the mean and std.
             if all(stds!=0):
@@ -473,59 +1457,73 @@ class MCPropagation:
 
             #If any of the variables has no uncertainty, the normalisation will fail. Instead we leave the parameters without uncertainty unchanged.
             else:
+                #The sub-matrix of the correlation matrix is factorised itself, as the factor of the full matrix is not necessarily triangular (see nearestPD_cholesky).
                 samples_out=samples[:]
-                id_nonzero=np.where(stds!=0)
-                samples_out[id_nonzero]=np.dot(L[id_nonzero][:,id_nonzero],(samples[id_nonzero]-means[id_nonzero])/stds[id_nonzero])[:,0]*stds[id_nonzero]+means[id_nonzero]
+                id_nonzero=np.where(stds!=0)[0]
+                L_nonzero=cholesky_cache.get(np.asarray(corr)[np.ix_(id_nonzero,id_nonzero)],self.cholesky,self.dtype)
+                samples_out[id_nonzero]=np.dot(L_nonzero,(samples[id_nonzero]-means[id_nonzero])/stds[id_nonzero])*stds[id_nonzero]+means[id_nonzero]
                 return samples_out
 
     @staticmethod
-    def nearestPD_cholesky(A):
+    def cholesky(A):
         """
-        Find the nearest positive-definite matrix
+        Return the Cholesky factor of a covariance or correlation matrix, using the nearest positive-definite matrix if it is not positive-definite.
+        The Cholesky factors used by the propagator are cached (see punpy.mc.cholesky_cache), so that each distinct matrix is only factorised once.
+        Factors larger than cholesky_cache.max_bytes (256 MB by default, i.e. matrices with more than about 5800 rows in float64) are not cached,
+        so that the limit needs to be raised for large covariance matrices to be factorised only once.
 
         :param A: correlation matrix or covariance matrix
         :type A: array
-        :return: nearest positive-definite matrix
+        :return: Cholesky factor
         :rtype: array
-
-        Copied and adapted from [1] under BSD license.
-        A Python/Numpy port of John D'Errico's `nearestSPD` MATLAB code [2], which
-        credits [3].
-        [1] https://gist.github.com/fasiha/fdb5cec2054e6f1c6ae35476045a0bbd
-        [2] https://www.mathworks.com/matlabcentral/fileexchange/42885-nearestspd
-        [3] N.J. Higham, "Computing a nearest symmetric positive semidefinite
-        matrix" (1988): https://doi.org/10.1016/0024-3795(88)90223-6
         """
-
-        B = (A+A.T)/2
-        _,s,V = np.linalg.svd(B)
-
-        H = np.dot(V.T,np.dot(np.diag(s),V))
-
-        A2 = (B+H)/2
-
-        A3 = (A2+A2.T)/2
-
         try:
-            return np.linalg.cholesky(A3)
+            return np.linalg.cholesky(A)
         except:
+            return MCPropagation.nearestPD_cholesky(A)
 
-            spacing = np.spacing(np.linalg.norm(A))
+    @staticmethod
+    def nearestPD_cholesky(A,return_correction=False):
+        """
+        Find a square-root factor L (with L.L^T the nearest positive semi-definite matrix) of a covariance or
+        correlation matrix that is not positive-definite, e.g. because it is rank-deficient or affected by rounding errors.
+        The nearest positive semi-definite matrix (in the Frobenius norm) is found from a single symmetric
+        eigendecomposition, by setting the negative eigenvalues to zero [1]. The factor V.sqrt(w) is not triangular,
+        but can be used in the same way as a Cholesky factor to generate correlated samples.
 
-            I = np.eye(A.shape[0])
-            k = 1
-            while not MCPropagation.isPD(A3):
-                mineig = np.min(np.real(np.linalg.eigvals(A3)))
-                A3 += I*(-mineig*k**2+spacing)
-                k += 1
+        :param A: correlation matrix or covariance matrix
+        :type A: array
+        :param return_correction: set to True to also return the size of the correction that was applied, as the largest absolute change of any element A_ij relative to sqrt(A_ii*A_jj) (i.e. the largest change of the corresponding correlation coefficient). Defaults to False.
+        :type return_correction: bool, optional
+        :return: square-root factor of the nearest positive semi-definite matrix (and size of the correction)
+        :rtype: array (or tuple(array, float))
 
-            if np.any(abs(A-A3)/A > 0.0001):
-                raise ValueError(
-                    "One of the provided covariance matrix is not postive definite. Covariance matrices need to be at least positive semi-definite. Please check your covariance matrix.")
-            else:
-                print(
-                    "One of the provided covariance matrix is not positive definite. It has been slightly changed (less than 0.01% in any element) to accomodate our method.")
-                return np.linalg.cholesky(A3)
+        [1] N.J. Higham, "Computing a nearest symmetric positive semidefinite
+        matrix" (1988): https://doi.org/10.1016/0024-3795(88)90223-6
+        """
+        A = np.asarray(A,dtype=np.float64)
+        w,V = np.linalg.eigh((A+A.T)/2)
+        L = V*np.sqrt(np.clip(w,0,None))
+
+        # the changes are normalised elementwise, so that large changes to elements with small variances are not hidden by large
+        # variances elsewhere (elements of quantities without variance are normalised by the largest variance instead)
+        change = np.abs(A-np.dot(L,L.T))
+        variance = np.abs(np.diag(A))
+        scale = np.sqrt(np.outer(variance,variance))
+        scale = np.where(scale > 0,scale,np.max(variance,initial=0.))
+        with np.errstate(divide="ignore",invalid="ignore"):
+            correction = np.max(np.where(scale > 0,change/scale,0.),initial=0.)
+        if correction > 0.0001:
+            raise ValueError(
+                "One of the provided covariance matrix is not postive definite. Covariance matrices need to be at least positive semi-definite. Please check your covariance matrix.")
+        elif correction > 1e-10:
+            # corrections at the level of rounding errors (e.g. for rank-deficient matrices) are not reported
+            print(
+                "One of the provided covariance matrix is not positive definite. It has been slightly changed (less than 0.01% in any element) to accomodate our method.")
+
+        if return_correction:
+            return L,correction
+        return L
 
     @staticmethod
     def isPD(B):
@@ -569,4 +1567,27 @@ class MCPropagation:
         :return: correlation matrix
         :rtype: array
         """
-        return 1/u.flatten()*cov/u.flatten().T
\ No newline at end of file
+        return 1/u.flatten()*cov/u.flatten().T
+
+def _propagate_tile(prop,func,generators,corr_between,output_vars,streams):
+    """
+    Propagate the uncertainties for a single spatial tile (module-level so that it can be sent to worker processes).
+
+    :param prop: propagator without tiling
+    :type prop: MCPropagation
+    :param func: element-wise measurement function. If None, the measurement function of the worker process is used.
+    :type func: function
+    :param generators: for each input quantity, a tuple of the sample generator method and the arguments for the tile
+    :type generators: list[tuple]
+    :param corr_between: covariance matrix (n,n) between input quantities
+    :type corr_between: array
+    :param output_vars: number of output parameters in the measurement function
+    :type output_vars: integer
+    :param streams: random streams for each input quantity of the tile
+    :type streams: list[RandomStream]
+    :return: uncertainties on measurand for the tile
+    :rtype: array
+    """
+    if func is None:
+        func = get_worker_func()
+    return prop.run_samples(func,generators,corr_between,False,False,-99,output_vars,streams)
@@ -0,0 +1,199 @@
+"""Worker-side functions for running the measurement function in parallel processes or threads"""
+
+import numpy as np
+try:
+    from multiprocessing import shared_memory
+except ImportError: # Python < 3.8
+    shared_memory = None
+
+'''___Authorship___'''
+__author__ = "Pieter De Vis"
+__created__ = "18/10/2026"
+__maintainer__ = "Pieter De Vis"
+__email__ = "pieter.de.vis@npl.co.uk"
+__status__ = "Development"
+
+# measurement function of the worker process, set once when the worker is started
+_worker_func = None
+# shared memory blocks the worker process is currently attached to
+_attached_blocks = {}
+
+def init_worker(func):
+    """
+    Initialise a worker process by storing the measurement function, so that it is only sent
+    to each worker once rather than with every task.
+
+    :param func: measurement function
+    :type func: function
+    :return: None
+    """
+    global _worker_func
+    _worker_func = func
+
+def get_worker_func():
+    """
+    Return the measurement function of the worker process.
+
+    :return: measurement function
+    :rtype: function
+    """
+    return _worker_func
+
+def run_worker_func(*args):
+    """
+    Run the measurement function of the worker process on a single MC iteration of the input quantities.
+
+    :param args: MC sample of each of the input quantities
+    :type args: array
+    :return: measurand for this MC iteration
+    :rtype: array
+    """
+    return _worker_func(*[np.asarray(arg) for arg in args])
+
+def create_shared_array(shape,dtype):
+    """
+    Create an array in a new shared memory block, which worker processes can attach to by name.
+
+    :param shape: shape of the array
+    :type shape: tuple
+    :param dtype: data type of the array
+    :type dtype: numpy.dtype
+    :return: shared memory block, array using the shared memory block as buffer, and the (name, shape, dtype) specification of the array that is sent to the workers
+    :rtype: tuple
+    """
+    dtype = np.dtype(dtype)
+    shm = shared_memory.SharedMemory(create=True,size=max(int(np.prod(shape))*dtype.itemsize,1))
+    array = np.ndarray(shape,dtype=dtype,buffer=shm.buf)
+    return shm,array,(shm.name,tuple(shape),dtype.str)
+
+def attach_shared_arrays(specs):
+    """
+    Attach the worker process to the shared memory blocks of the given arrays. Attachments are kept between tasks,
+    and only the blocks that are no longer used are released.
+
+    :param specs: (name, shape, dtype) specifications of the shared arrays
+    :type specs: list[tuple]
+    :return: arrays using the shared memory blocks as buffer
+    :rtype: list[array]
+    """
+    names = [spec[0] for spec in specs]
+    for name in list(_attached_blocks.keys()):
+        if name not in names:
+            _attached_blocks.pop(name).close()
+
+    arrays = []
+    for name,shape,dtype in specs:
+        if name not in _attached_blocks:
+            _attached_blocks[name] = shared_memory.SharedMemory(name=name)
+        arrays.append(np.ndarray(shape,dtype=np.dtype(dtype),buffer=_attached_blocks[name].buf))
+    return arrays
+
+def write_output(MC_y,output,index):
+    """
+    Write the output of the measurement function for an MC iteration or a block of MC iterations into the output buffer,
+    or into the buffer of each output parameter if the output parameters have different shapes.
+
+    :param MC_y: output buffer, or list of output buffers for each output parameter
+    :type MC_y: array or list[array]
+    :param output: output of the measurement function
+    :type output: array or tuple[array]
+    :param index: index or slice of the MC iterations along the last axis
+    :type index: int or slice
+    :return: None
+    """
+    if isinstance(MC_y,list):
+        for i in range(len(MC_y)):
+            MC_y[i][...,index] = np.asarray(output[i])
+    else:
+        MC_y[...,index] = np.array(output)
+
+def attach_outputs(input_specs,output_spec):
+    """
+    Attach the worker process to the shared arrays of the input quantities and the output buffer(s).
+
+    :param input_specs: (name, shape, dtype) specifications of the shared arrays with the samples of the input quantities
+    :type input_specs: list[tuple]
+    :param output_spec: (name, shape, dtype) specification of the shared output buffer, or a list of specifications for each output parameter
+    :type output_spec: tuple or list[tuple]
+    :return: samples of the input quantities and output buffer(s)
+    :rtype: tuple
+    """
+    output_specs = output_spec if isinstance(output_spec,list) else [output_spec]
+    arrays = attach_shared_arrays(list(input_specs)+output_specs)
+    outputs = arrays[len(input_specs):]
+    return arrays[:len(input_specs)],outputs if isinstance(output_spec,list) else outputs[0]
+
+def run_worker_steps(input_specs,output_spec,start,stop):
+    """
+    Run the measurement function of the worker process on a range of MC iterations, reading the samples
+    of the input quantities from shared memory and writing the measurand into a shared output buffer in place.
+
+    :param input_specs: (name, shape, dtype) specifications of the shared arrays with the samples of the input quantities
+    :type input_specs: list[tuple]
+    :param output_spec: (name, shape, dtype) specification of the shared output buffer, or a list of specifications for each output parameter
+    :type output_spec: tuple or list[tuple]
+    :param start: first MC iteration of the range
+    :type start: int
+    :param stop: end of the range of MC iterations (exclusive)
+    :type stop: int
+    :return: None
+    """
+    inputs,MC_y = attach_outputs(input_specs,output_spec)
+    run_steps(_worker_func,inputs,MC_y,start,stop)
+    del inputs,MC_y
+
+def run_worker_chunk(input_specs,output_spec,start,stop):
+    """
+    Run the measurement function of the worker process vectorised over a block of MC iterations, reading the samples
+    of the input quantities from shared memory and writing the measurand into a shared output buffer in place.
+
+    :param input_specs: (name, shape, dtype) specifications of the shared arrays with the samples of the input quantities
+    :type input_specs: list[tuple]
+    :param output_spec: (name, shape, dtype) specification of the shared output buffer, or a list of specifications for each output parameter
+    :type output_spec: tuple or list[tuple]
+    :param start: first MC iteration of the block
+    :type start: int
+    :param stop: end of the block of MC iterations (exclusive)
+    :type stop: int
+    :return: None
+    """
+    inputs,MC_y = attach_outputs(input_specs,output_spec)
+    run_chunk(_worker_func,inputs,MC_y,start,stop)
+    del inputs,MC_y
+
+def run_steps(func,inputs,MC_y,start,stop):
+    """
+    Run the measurement function on a range of MC iterations, one MC iteration at a time, and write the measurand in place.
+
+    :param func: measurement function
+    :type func: function
+    :param inputs: MC-generated samples of input quantities
+    :type inputs: list[array]
+    :param MC_y: output buffer for the MC-generated samples of the measurand, or list of output buffers for each output parameter
+    :type MC_y: array or list[array]
+    :param start: first MC iteration of the range
+    :type start: int
+    :param stop: end of the range of MC iterations (exclusive)
+    :type stop: int
+    :return: None
+    """
+    for i in range(start,stop):
+        write_output(MC_y,func(*[input[...,i] for input in inputs]),i)
+
+def run_chunk(func,inputs,MC_y,start,stop):
+    """
+    Run the measurement function vectorised over a block of MC iterations and write the measurand in place.
+
+    :param func: measurement function
+    :type func: function
+    :param inputs: MC-generated samples of input quantities
+    :type inputs: list[array]
+    :param MC_y: output buffer for the MC-generated samples of the measurand, or list of output buffers for each output parameter
+    :type MC_y: array or list[array]
+    :param start: first MC iteration of the block
+    :type start: int
+    :param stop: end of the block of MC iterations (exclusive)
+    :type stop: int
+    :return: None
+    """
+    write_output(MC_y,func(*[np.asarray(input[...,start:stop]) for input in inputs]),slice(start,stop))
@@ -0,0 +1,258 @@
+"""Reproducible streams of random numbers for generating MC samples"""
+
+import warnings
+import numpy as np
+try:
+    from scipy.stats import qmc
+    from scipy.special import ndtri
+except ImportError: # scipy is only needed for quasi-Monte Carlo and Latin hypercube sampling
+    qmc = None
+
+'''___Authorship___'''
+__author__ = "Pieter De Vis"
+__created__ = "18/10/2026"
+__maintainer__ = "Pieter De Vis"
+__email__ = "pieter.de.vis@npl.co.uk"
+__status__ = "Development"
+
+SAMPLING_METHODS = ("random","sobol","lhs")
+
+class SobolDimensions:
+    def __init__(self):
+        """
+        Initialise the allocation of the dimensions of a scrambled Sobol sequence to the random streams of one
+        propagation call. Each stream (and substream) gets its own set of dimensions of the same sequence, so that the
+        samples of all input quantities are jointly of low discrepancy, rather than only the samples of each input quantity.
+        """
+        self.offsets = {}
+        self.n_dims = 0
+
+    def offset(self,key,n_dims):
+        """
+        Return the first dimension of the Sobol sequence used by a stream, allocating the dimensions on first use.
+
+        :param key: identifier of the stream and substream
+        :type key: tuple
+        :param n_dims: number of dimensions used by the stream
+        :type n_dims: int
+        :return: index of the first dimension
+        :rtype: int
+        """
+        if key not in self.offsets:
+            self.offsets[key] = self.n_dims
+            self.n_dims += n_dims
+        return self.offsets[key]
+
+class RandomStream:
+    def __init__(self,seed_sequence,sampling="random",steps=None,sobol_dimensions=None):
+        """
+        Initialise stream of random numbers for one input quantity.
+        The MC iterations are divided in blocks, and each block is drawn from its own generator, which is seeded
+        from the seed sequence of the stream and the index of the block. The random numbers for any range of MC
+        iterations are therefore the same, regardless of how the MC iterations are split into batches or between cores.
+
+        :param seed_sequence: seed sequence of the stream
+        :type seed_sequence: numpy.random.SeedSequence
+        :param sampling: sampling method. With "random", pseudo-random normal numbers are drawn. With "sobol", a scrambled Sobol sequence is transformed to normal numbers using the inverse normal cumulative distribution function. With "lhs", a Latin hypercube sample is drawn for each block of MC iterations and transformed in the same way. Defaults to "random".
+        :type sampling: str, optional
+        :param steps: total number of MC iterations, used to limit the length of the Latin hypercube blocks so that short runs, and the last block of longer runs, are fully stratified. Defaults to None.
+        :type steps: int, optional
+        :param sobol_dimensions: allocation of the dimensions of the Sobol sequence shared by all streams of a propagation call, defaults to None, for which the stream uses its own allocation
+        :type sobol_dimensions: SobolDimensions, optional
+        """
+        if sampling not in SAMPLING_METHODS:
+            raise ValueError('The sampling method is not understood. Use "random", "sobol" or "lhs".')
+        if sampling != "random" and qmc is None:
+            raise ImportError('scipy is required for sampling="%s".'%sampling)
+        self.seed_sequence = seed_sequence
+        self.sampling = sampling
+        self.steps = steps
+        if sobol_dimensions is None:
+            sobol_dimensions = SobolDimensions()
+        self.sobol_dimensions = sobol_dimensions
+
+    @staticmethod
+    def block_size(shape):
+        """
+        Number of MC iterations in each block, which only depends on the shape of the samples for a single MC iteration
+        (so that a block is at most a few MB in memory, while small input quantities use long blocks).
+
+        :param shape: shape of the samples for a single MC iteration
+        :type shape: tuple
+        :return: number of MC iterations in each block
+        :rtype: int
+        """
+        return int(min(4096,max(16,2**18//max(int(np.prod(shape)),1))))
+
+    def generator(self,block,substream=0):
+        """
+        Return the random number generator for one block of MC iterations.
+
+        :param block: index of the block
+        :type block: int
+        :param substream: index of the independent substream (e.g. for random and systematic components of the same input quantity), defaults to 0
+        :type substream: int, optional
+        :return: random number generator
+        :rtype: numpy.random.Generator
+        """
+        seed_sequence = np.random.SeedSequence(self.seed_sequence.entropy,
+                                               spawn_key=self.seed_sequence.spawn_key+(substream,block))
+        return np.random.Generator(np.random.PCG64(seed_sequence))
+
+    def standard_normal(self,shape,start,stop,substream=0,dtype=np.float64):
+        """
+        Draw standard normal random numbers for a range of MC iterations.
+
+        :param shape: shape of the samples for a single MC iteration
+        :type shape: tuple
+        :param start: first MC iteration
+        :type start: int
+        :param stop: end of the range of MC iterations (exclusive)
+        :type stop: int
+        :param substream: index of the independent substream, defaults to 0
+        :type substream: int, optional
+        :param dtype: data type of the random numbers (float32 or float64), defaults to float64
+        :type dtype: numpy.dtype, optional
+        :return: random numbers of shape shape+(stop-start,)
+        :rtype: array
+        """
+        shape = tuple(shape)
+        if stop <= start:
+            return np.empty(shape+(0,),dtype=dtype)
+        if self.sampling == "sobol":
+            return self.sobol_normal(shape,start,stop,substream).astype(dtype)
+
+        block_size = self.block_size(shape)
+        if self.sampling == "lhs" and self.steps is not None:
+            block_size = min(block_size,self.steps)
+        blocks = []
+        for block,block_start,length in self.blocks(start,stop,block_size):
+            if self.sampling == "lhs":
+                z = self.lhs_normal(shape,length,block,substream).astype(dtype)
+            else:
+                z = self.generator(block,substream).standard_normal(size=shape+(length,),dtype=dtype)
+            blocks.append(z[...,max(start-block_start,0):min(stop-block_start,length)])
+
+        if len(blocks) == 1:
+            return blocks[0]
+        return np.concatenate(blocks,axis=-1)
+
+    def blocks(self,start,stop,block_size):
+        """
+        Return the blocks of MC iterations that overlap a range of MC iterations. The blocks have length block_size,
+        except for sampling="lhs", for which the last block within the total number of MC iterations is shortened, so that
+        each Latin hypercube is stratified over the MC iterations it is used for. Any MC iterations beyond the total number
+        (e.g. in the adaptive procedure) are again divided in blocks of length block_size.
+
+        :param start: first MC iteration
+        :type start: int
+        :param stop: end of the range of MC iterations (exclusive)
+        :type stop: int
+        :param block_size: number of MC iterations in each block
+        :type block_size: int
+        :return: index, first MC iteration and length of each block
+        :rtype: list[tuple]
+        """
+        shortened = self.sampling == "lhs" and self.steps is not None
+        blocks = []
+        while start < stop:
+            if shortened and start >= self.steps:
+                n_blocks = -(-self.steps//block_size)
+                block = n_blocks+(start-self.steps)//block_size
+                block_start = self.steps+(block-n_blocks)*block_size
+                length = block_size
+            else:
+                block = start//block_size
+                block_start = block*block_size
+                length = min(block_size,self.steps-block_start) if shortened else block_size
+            blocks.append((block,block_start,length))
+            start = block_start+length
+        return blocks
+
+    @staticmethod
+    def uniform_to_normal(u,shape):
+        """
+        Transform points in the unit hypercube to standard normal numbers using the inverse normal cumulative
+        distribution function.
+
+        :param u: points of shape (number of MC iterations, number of dimensions)
+        :type u: array
+        :param shape: shape of the samples for a single MC iteration
+        :type shape: tuple
+        :return: standard normal numbers of shape shape+(number of MC iterations,)
+        :rtype: array
+        """
+        # avoid infinities for points on the edge of the unit hypercube
+        eps = np.finfo(np.float64).eps
+        z = ndtri(np.clip(u,eps,1-eps))
+        return z.T.reshape(shape+(len(u),))
+
+    def sobol_normal(self,shape,start,stop,substream=0):
+        """
+        Draw standard normal numbers for a range of MC iterations from the scrambled Sobol sequence.
+        The sequence is fast-forwarded to the first MC iteration, so that any range of MC iterations gives the same numbers,
+        regardless of how the MC iterations are split into batches or between cores. The balance properties of
+        the Sobol sequence are best when the total number of MC iterations is a power of 2.
+
+        :param shape: shape of the samples for a single MC iteration
+        :type shape: tuple
+        :param start: first MC iteration
+        :type start: int
+        :param stop: end of the range of MC iterations (exclusive)
+        :type stop: int
+        :param substream: index of the independent substream, defaults to 0
+        :type substream: int, optional
+        :return: standard normal numbers of shape shape+(stop-start,)
+        :rtype: array
+        """
+        n_dims = max(int(np.prod(shape)),1)
+        offset = self.sobol_dimensions.offset(self.seed_sequence.spawn_key+(substream,),n_dims)
+        if offset+n_dims > qmc.Sobol.MAXDIM:
+            raise ValueError('sampling="sobol" supports at most %s random numbers per MC iteration (for all input quantities together). Use sampling="lhs" instead.'%qmc.Sobol.MAXDIM)
+        # the dimensions before the offset belong to other streams, and are only generated to keep the sequence joint
+        engine = self.qmc_engine(qmc.Sobol,offset+n_dims,self.generator(0,substream))
+        if start > 0:
+            engine.fast_forward(start)
+        with warnings.catch_warnings():
+            # the number of points is only a power of 2 when the MC iterations are not split up
+            warnings.simplefilter("ignore",UserWarning)
+            u = engine.random(stop-start)[:,offset:]
+        return self.uniform_to_normal(u,shape)
+
+    def lhs_normal(self,shape,block_size,block,substream=0):
+        """
+        Draw standard normal numbers for one block of MC iterations from a Latin hypercube sample.
+
+        :param shape: shape of the samples for a single MC iteration
+        :type shape: tuple
+        :param block_size: number of MC iterations in each block
+        :type block_size: int
+        :param block: index of the block
+        :type block: int
+        :param substream: index of the independent substream, defaults to 0
+        :type substream: int, optional
+        :return: standard normal numbers of shape shape+(block_size,)
+        :rtype: array
+        """
+        n_dims = max(int(np.prod(shape)),1)
+        engine = self.qmc_engine(qmc.LatinHypercube,n_dims,self.generator(block,substream))
+        return self.uniform_to_normal(engine.random(block_size),shape)
+
+    @staticmethod
+    def qmc_engine(engine,n_dims,generator):
+        """
+        Initialise a scipy.stats.qmc engine seeded from a random number generator.
+
+        :param engine: class of the engine
+        :type engine: type
+        :param n_dims: number of dimensions
+        :type n_dims: int
+        :param generator: random number generator
+        :type generator: numpy.random.Generator
+        :return: engine
+        :rtype: scipy.stats.qmc.QMCEngine
+        """
+        try:
+            return engine(n_dims,rng=generator)
+        except TypeError: # scipy < 1.15
+            return engine(n_dims,seed=generator)
@@ -0,0 +1,287 @@
+"""Persistent on-disk cache of the results of propagation calls"""
+
+import os
+import time
+import types
+import pickle
+import hashlib
+import functools
+import numpy as np
+
+'''___Authorship___'''
+__author__ = "Pieter De Vis"
+__created__ = "18/10/2026"
+__maintainer__ = "Pieter De Vis"
+__email__ = "pieter.de.vis@npl.co.uk"
+__status__ = "Development"
+
+def hash_object(digest,obj):
+    """
+    Update a hash with the contents of an object: arrays (by their shape, data type and data), numbers, strings,
+    sequences, dicts and other objects (by their class and attributes, e.g. structured covariance matrices).
+
+    :param digest: hash to update
+    :type digest: hashlib hash
+    :param obj: object to hash
+    :type obj: object
+    :return: None
+    """
+    if obj is None or isinstance(obj,(bool,int,float,complex,str,bytes,np.generic,np.dtype)):
+        digest.update(repr((type(obj).__name__,obj)).encode())
+    elif isinstance(obj,np.ndarray) and obj.dtype == object:
+        digest.update(repr(("object array",obj.shape)).encode())
+        for element in obj.flat:
+            hash_object(digest,element)
+    elif isinstance(obj,np.ndarray):
+        obj = np.ascontiguousarray(obj)
+        digest.update(repr(("array",obj.shape,obj.dtype.str)).encode())
+        digest.update(obj.data)
+    elif isinstance(obj,(list,tuple)):
+        digest.update(repr((type(obj).__name__,len(obj))).encode())
+        for element in obj:
+            hash_object(digest,element)
+    elif isinstance(obj,dict):
+        digest.update(repr(("dict",sorted(obj))).encode())
+        for name in sorted(obj):
+            hash_object(digest,obj[name])
+    elif isinstance(obj,types.CodeType):
+        digest.update(obj.co_code)
+        digest.update(repr(obj.co_names).encode())
+        for const in obj.co_consts:
+            hash_object(digest,const)
+    elif isinstance(obj,(types.FunctionType,types.MethodType,functools.partial)):
+        # functions without a stable identity are hashed by their repr, which contains their memory address
+        digest.update(str(function_identity(obj) or repr(obj)).encode())
+    elif hasattr(obj,"__dict__") and not callable(obj):
+        digest.update(repr(("object",type(obj).__module__,type(obj).__qualname__)).encode())
+        hash_object(digest,vars(obj))
+    else:
+        array = np.asarray(obj)
+        if array.dtype == object:
+            # no stable representation (e.g. the repr contains a memory address), so that the result is not found in the cache
+            digest.update(repr(obj).encode())
+        else:
+            hash_object(digest,array)
+
+def hash_instance(digest,obj):
+    """
+    Update a hash with the state of the instance a measurement function is bound to (or of a callable instance):
+    classes by their name, instances by their attributes, and other objects by their pickled state.
+
+    :param digest: hash to update
+    :type digest: hashlib hash
+    :param obj: instance
+    :type obj: object
+    :return: True if the state of the instance could be hashed
+    :rtype: bool
+    """
+    if isinstance(obj,type):
+        digest.update(repr(("class",obj.__module__,obj.__qualname__)).encode())
+    elif isinstance(obj,types.ModuleType):
+        digest.update(repr(("module",obj.__name__)).encode())
+    elif hasattr(obj,"__dict__"):
+        digest.update(repr(("instance",type(obj).__module__,type(obj).__qualname__)).encode())
+        hash_object(digest,vars(obj))
+    else:
+        try:
+            digest.update(pickle.dumps(obj,protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            return False
+    return True
+
+def function_identity(func):
+    """
+    Return the identity of a measurement function, used in the keys of the result cache. Functions with a __version__
+    attribute are identified by their module, name and version. Other functions are identified by their module, name,
+    a hash of their bytecode and constants, and the values of the variables of their closure, so that changes to the code
+    of the function give a new identity. Changes to global variables or other functions called by the measurement function
+    are not detected; set func.__version__ (or clear the cache) when these change. For bound methods and callable instances,
+    the state of the instance is included as well.
+
+    :param func: measurement function
+    :type func: function
+    :return: identity of the function, or None if the state of the instance it is bound to cannot be hashed (in which case its results cannot be cached)
+    :rtype: str
+    """
+    if isinstance(func,functools.partial):
+        identity = function_identity(func.func)
+        if identity is None:
+            return None
+        digest = hashlib.sha1(identity.encode())
+        hash_object(digest,(func.args,func.keywords))
+        return "partial:"+digest.hexdigest()
+    instance = None
+    if isinstance(func,types.MethodType):
+        instance = func.__self__
+        func = func.__func__
+    elif not isinstance(func,types.FunctionType) and getattr(func,"__code__",None) is None:
+        # callable instance (or builtin function), of which the result depends on its state
+        instance = func
+    name = "%s.%s"%(getattr(func,"__module__",None),getattr(func,"__qualname__",type(func).__qualname__))
+    if hasattr(func,"__version__"):
+        identity = "%s:%s"%(name,func.__version__)
+    else:
+        code = getattr(func,"__code__",None)
+        if code is None:
+            code = getattr(getattr(type(func),"__call__",None),"__code__",None)
+        digest = hashlib.sha1()
+        hash_object(digest,code)
+        for cell in getattr(func,"__closure__",None) or ():
+            hash_object(digest,cell.cell_contents)
+        identity = "%s:%s"%(name,digest.hexdigest())
+    if instance is not None:
+        digest = hashlib.sha1(identity.encode())
+        if not hash_instance(digest,instance):
+            return None
+        identity += ":"+digest.hexdigest()
+    return identity
+
+class ResultCache:
+    def __init__(self,directory,max_bytes=1024**3):
+        """
+        Initialise a persistent cache of the results of propagation calls, stored as one pickle file per result in a directory,
+        so that repeated calls with identical inputs return immediately (also in later runs). When the files take more than
+        max_bytes of disk space, the least recently used results are removed (using the modification time of the files,
+        which is updated when a result is read). The files are unpickled when read, so only use directories written by
+        trusted processes.
+
+        :param directory: directory in which the results are stored (created if it does not exist)
+        :type directory: str
+        :param max_bytes: maximum disk space taken by the cached results in bytes. Defaults to 1 GB.
+        :type max_bytes: int, optional
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory,exist_ok=True)
+
+    @staticmethod
+    def key(*parts):
+        """
+        Return the key of a result in the cache, which is a hash of the contents of all parts (see hash_object).
+
+        :param parts: everything the result depends on
+        :type parts: object
+        :return: key
+        :rtype: str
+        """
+        digest = hashlib.sha1()
+        hash_object(digest,parts)
+        return digest.hexdigest()
+
+    def path(self,key):
+        """
+        Return the path of the file of a result.
+
+        :param key: key of the result
+        :type key: str
+        :return: path of the file
+        :rtype: str
+        """
+        return os.path.join(self.directory,key+".pkl")
+
+    def get(self,key):
+        """
+        Return a result from the cache, marking it as most recently used.
+
+        :param key: key of the result
+        :type key: str
+        :return: result, or None if it is not in the cache
+        :rtype: object
+        """
+        path = self.path(key)
+        try:
+            with open(path,"rb") as f:
+                result = pickle.load(f)
+            now = time.time_ns()
+            os.utime(path,ns=(now,now))
+        except (OSError,EOFError,pickle.UnpicklingError):
+            # not cached, or removed by another process in the meantime
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def put(self,key,result):
+        """
+        Add a result to the cache, and remove the least recently used results if the cache takes more than max_bytes.
+        The file is written under a temporary name and then renamed, so that other processes never read partial results.
+
+        :param key: key of the result
+        :type key: str
+        :param result: result
+        :type result: object
+        :return: None
+        """
+        data = pickle.dumps(result,protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            return None
+        path_tmp = "%s.%s.tmp"%(self.path(key),os.getpid())
+        with open(path_tmp,"wb") as f:
+            f.write(data)
+        os.replace(path_tmp,self.path(key))
+        self.evict()
+
+    def entries(self):
+        """
+        Return the files of the cached results.
+
+        :return: for each result, the time it was last used in ns, its size in bytes and its path, from least to most recently used
+        :rtype: list[tuple]
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".pkl"):
+                path = os.path.join(self.directory,name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns,stat.st_size,path))
+        return sorted(entries)
+
+    def evict(self):
+        """
+        Remove the least recently used results until the cache takes at most max_bytes.
+
+        :return: None
+        """
+        entries = self.entries()
+        nbytes = sum(size for mtime,size,path in entries)
+        for mtime,size,path in entries:
+            if nbytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except OSError:
+                pass
+            nbytes -= size
+
+    def clear(self):
+        """
+        Remove all results from the cache and reset the statistics.
+
+        :return: None
+        """
+        for mtime,size,path in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        """
+        Return the statistics of the cache.
+
+        :return: number of hits, misses and evictions (in this process), number of cached results and disk space taken by them in bytes
+        :rtype: dict
+        """
+        entries = self.entries()
+        return {"hits":self.hits,"misses":self.misses,"evictions":self.evictions,
+                "size":len(entries),"nbytes":sum(size for mtime,size,path in entries)}
@@ -0,0 +1,178 @@
+"""Running statistics of MC samples that are accumulated one batch of MC iterations at a time"""
+
+import numpy as np
+
+'''___Authorship___'''
+__author__ = "Pieter De Vis"
+__created__ = "18/10/2026"
+__maintainer__ = "Pieter De Vis"
+__email__ = "pieter.de.vis@npl.co.uk"
+__status__ = "Development"
+
+class RunningStatistics:
+    def __init__(self):
+        """
+        Initialise running mean and variance along the last (MC) axis of the samples.
+        Each batch is reduced to its mean and sum of squared deviations, which are then merged
+        with the statistics of the previous batches (batched form of Welford's algorithm, Chan et al. 1979).
+        The accumulators are kept in float64, whatever the precision of the samples.
+        """
+        self.count = 0
+        self.mean = None
+        self.M2 = None
+
+    def update(self,samples):
+        """
+        Add a batch of samples to the running statistics.
+
+        :param samples: samples, with the MC iterations along the last axis
+        :type samples: array
+        :return: None
+        """
+        samples = np.asarray(samples)
+        count_batch = samples.shape[-1]
+        if count_batch == 0:
+            return
+        mean_batch = np.mean(samples,axis=-1,dtype=np.float64)
+        M2_batch = np.sum((samples-mean_batch[...,None])**2,axis=-1,dtype=np.float64)
+
+        if self.count == 0:
+            self.mean = mean_batch
+            self.M2 = M2_batch
+            self.count = count_batch
+        else:
+            count = self.count+count_batch
+            delta = mean_batch-self.mean
+            self.mean = self.mean+delta*(count_batch/count)
+            self.M2 = self.M2+M2_batch+delta**2*(self.count*count_batch/count)
+            self.count = count
+
+    def variance(self,ddof=0):
+        """
+        Return the variance of all samples added so far.
+
+        :param ddof: delta degrees of freedom, defaults to 0 (same as np.var)
+        :type ddof: int, optional
+        :return: variance
+        :rtype: array
+        """
+        return self.M2/(self.count-ddof)
+
+    def std(self,ddof=0):
+        """
+        Return the standard deviation of all samples added so far.
+
+        :param ddof: delta degrees of freedom, defaults to 0 (same as np.std)
+        :type ddof: int, optional
+        :return: standard deviation
+        :rtype: array
+        """
+        return np.sqrt(self.variance(ddof))
+
+class RunningCovariance:
+    def __init__(self):
+        """
+        Initialise running covariance between variables, with the observations along the last axis.
+        Samples of shape (...,m,k) hold k observations of m variables, and result in (stacked) covariance
+        matrices of shape (...,m,m). The co-moment matrices of each batch are merged pairwise (Chan et al. 1979),
+        so that the memory needed is set by the size of the covariance matrix rather than by the number of observations.
+        """
+        self.count = 0
+        self.mean = None
+        self.comoment = None
+
+    def update(self,samples):
+        """
+        Add a batch of observations to the running covariance.
+
+        :param samples: observations of the variables, of shape (...,m,k)
+        :type samples: array
+        :return: None
+        """
+        samples = np.asarray(samples)
+        count_batch = samples.shape[-1]
+        if count_batch == 0:
+            return
+        mean_batch = np.mean(samples,axis=-1,dtype=np.float64)
+        deviations = samples-mean_batch[...,None]
+        comoment_batch = np.matmul(deviations,np.swapaxes(deviations,-1,-2))
+
+        if self.count == 0:
+            self.mean = mean_batch
+            self.comoment = comoment_batch
+            self.count = count_batch
+        else:
+            count = self.count+count_batch
+            delta = mean_batch-self.mean
+            self.mean = self.mean+delta*(count_batch/count)
+            self.comoment = self.comoment+comoment_batch+delta[...,:,None]*delta[...,None,:]*(self.count*count_batch/count)
+            self.count = count
+
+    def covariance(self,ddof=0):
+        """
+        Return the covariance matrix of all observations added so far.
+
+        :param ddof: delta degrees of freedom, defaults to 0
+        :type ddof: int, optional
+        :return: covariance matrix
+        :rtype: array
+        """
+        return self.comoment/(self.count-ddof)
+
+    def correlation(self):
+        """
+        Return the correlation matrix of all observations added so far (same as np.corrcoef).
+
+        :return: correlation matrix
+        :rtype: array
+        """
+        std = np.sqrt(np.diagonal(self.comoment,axis1=-2,axis2=-1))
+        corr = self.comoment/std[...,:,None]/std[...,None,:]
+        return np.clip(corr,-1,1)
+
+class RunningCorrelation:
+    def __init__(self,corr_axis=-99):
+        """
+        Initialise running correlation matrix of MC-generated samples of the measurand, following the
+        conventions of MCPropagation.calculate_corr.
+
+        :param corr_axis: set to positive integer to select the axis used in the correlation matrix. The correlation matrix will then be averaged over other dimensions. Defaults to -99, for which the input array will be flattened and the full correlation matrix calculated.
+        :type corr_axis: integer, optional
+        """
+        self.corr_axis = corr_axis
+        self.ndim = None
+        self.covariance = RunningCovariance()
+
+    def update(self,MC_y):
+        """
+        Add a batch of MC-generated samples to the running correlation matrix.
+
+        :param MC_y: MC-generated samples of the measurand, with the MC iterations along the last axis
+        :type MC_y: array
+        :return: None
+        """
+        MC_y = np.asarray(MC_y)
+        self.ndim = MC_y.ndim
+        if MC_y.ndim < 3:
+            self.covariance.update(MC_y.reshape((-1,MC_y.shape[-1])))
+        elif 0 <= self.corr_axis < MC_y.ndim-1:
+            # correlation matrices along corr_axis are accumulated separately for each index along the other axes
+            MC_y = np.moveaxis(MC_y,self.corr_axis,-2)
+            self.covariance.update(MC_y.reshape((-1,)+MC_y.shape[-2:]))
+        else:
+            self.covariance.update(MC_y.reshape((-1,MC_y.shape[-1])))
+
+    def correlation(self):
+        """
+        Return the correlation matrix of all MC-generated samples added so far.
+
+        :return: correlation matrix
+        :rtype: array
+        """
+        corr = self.covariance.correlation()
+        if self.ndim == 1:
+            return corr[0,0]
+        elif corr.ndim == 3:
+            return np.mean(corr,axis=0)
+        else:
+            return corr
@@ -0,0 +1,124 @@
+"""On-disk store for the MC samples of the input quantities and the measurand"""
+
+import os
+import numpy as np
+
+'''___Authorship___'''
+__author__ = "Pieter De Vis"
+__created__ = "18/10/2026"
+__maintainer__ = "Pieter De Vis"
+__email__ = "pieter.de.vis@npl.co.uk"
+__status__ = "Development"
+
+class SampleStore:
+    def __init__(self,directory,MCsteps):
+        """
+        Initialise a store that writes MC samples into memory-mapped .npy files in a directory, one batch of MC iterations at a time,
+        so that the samples do not need to be kept in memory during the propagation. The measurand is stored in MC_y.npy and
+        the input quantities in MC_x0.npy, MC_x1.npy, etc. (output parameters of the measurand with different shapes are
+        stored in MC_y0.npy, MC_y1.npy, etc.). Existing files with these names are overwritten.
+
+        :param directory: directory in which the .npy files are written (created if it does not exist)
+        :type directory: str
+        :param MCsteps: (maximum) number of MC iterations to store, which sets the length of the last axis of the files
+        :type MCsteps: int
+        """
+        self.directory = directory
+        self.MCsteps = MCsteps
+        self.arrays = {}
+        os.makedirs(directory,exist_ok=True)
+
+    def path(self,name):
+        """
+        Return the path of the .npy file of a set of samples.
+
+        :param name: name of the samples
+        :type name: str
+        :return: path of the file
+        :rtype: str
+        """
+        return os.path.join(self.directory,name+".npy")
+
+    def write(self,name,samples,start=0):
+        """
+        Write samples for a range of MC iterations, creating the file when the first samples are written.
+        The samples are copied in blocks of MC iterations, so that samples in factored form are only expanded one block at a time.
+
+        :param name: name of the samples
+        :type name: str
+        :param samples: samples with the MC iterations along the last axis
+        :type samples: array or SystematicSamples
+        :param start: index of the first MC iteration of the samples, defaults to 0
+        :type start: int, optional
+        :return: None
+        """
+        shape = np.shape(samples)
+        if name not in self.arrays:
+            self.arrays[name] = np.lib.format.open_memmap(self.path(name),mode="w+",dtype=samples.dtype,
+                                                         shape=shape[:-1]+(self.MCsteps,))
+        array = self.arrays[name]
+        block_size = max(1,2**18//max(int(np.prod(shape[:-1])),1))
+        for i in range(0,shape[-1],block_size):
+            array[...,start+i:start+min(i+block_size,shape[-1])] = np.asarray(samples[...,i:i+block_size])
+
+    def write_MC(self,MC_y,MC_data,start=0):
+        """
+        Write the samples of the measurand and the input quantities for a range of MC iterations.
+
+        :param MC_y: MC-generated samples of the measurand
+        :type MC_y: array
+        :param MC_data: MC-generated samples of input quantities
+        :type MC_data: array[array]
+        :param start: index of the first MC iteration of the samples, defaults to 0
+        :type start: int, optional
+        :return: None
+        """
+        if MC_y.dtype == object:
+            # output parameters with different shapes are stored in separate files
+            for i in range(len(MC_y)):
+                self.write("MC_y%s"%i,MC_y[i],start)
+        else:
+            self.write("MC_y",MC_y,start)
+        for i in range(len(MC_data)):
+            self.write("MC_x%s"%i,MC_data[i],start)
+
+    def read(self,name,stop=None):
+        """
+        Flush the written samples to disk and return them as a read-only memory-mapped array.
+
+        :param name: name of the samples
+        :type name: str
+        :param stop: number of MC iterations that were written, defaults to None, for which all MC iterations are returned
+        :type stop: int, optional
+        :return: memory-mapped samples
+        :rtype: numpy.memmap
+        """
+        if name in self.arrays:
+            self.arrays.pop(name).flush()
+        samples = np.load(self.path(name),mmap_mode="r")
+        if stop is not None and stop < samples.shape[-1]:
+            samples = samples[...,:stop]
+        return samples
+
+    def read_MC(self,n_inputs,stop=None):
+        """
+        Return the samples of the measurand and the input quantities as read-only memory-mapped arrays.
+
+        :param n_inputs: number of input quantities
+        :type n_inputs: int
+        :param stop: number of MC iterations that were written, defaults to None, for which all MC iterations are returned
+        :type stop: int, optional
+        :return: MC-generated samples of the measurand and of the input quantities
+        :rtype: tuple
+        """
+        if "MC_y" in self.arrays:
+            MC_y = self.read("MC_y",stop)
+        else:
+            n_outputs = len([name for name in self.arrays if name.startswith("MC_y")])
+            MC_y = np.empty(n_outputs,dtype=object)
+            for i in range(n_outputs):
+                MC_y[i] = self.read("MC_y%s"%i,stop)
+        MC_data = np.empty(n_inputs,dtype=np.ndarray)
+        for i in range(n_inputs):
+            MC_data[i] = self.read("MC_x%s"%i,stop)
+        return MC_y,MC_data
@@ -0,0 +1,179 @@
+"""Covariance matrices with a structure that allows generating correlated samples without forming the dense matrix"""
+
+import numpy as np
+
+'''___Authorship___'''
+__author__ = "Pieter De Vis"
+__created__ = "18/10/2026"
+__maintainer__ = "Pieter De Vis"
+__email__ = "pieter.de.vis@npl.co.uk"
+__status__ = "Development"
+
+class StructuredCovariance:
+    """
+    Base class for structured covariance matrices of a flattened input quantity with size elements. Correlated samples
+    are generated from n_random independent standard normal numbers per MC iteration using the factors of the structure.
+    """
+    size = 0
+    n_random = 0
+
+    def correlate(self,z,factorise=np.linalg.cholesky):
+        """
+        Turn independent standard normal numbers into correlated deviations with this covariance matrix.
+
+        :param z: independent standard normal numbers, of shape (n_random,MCsteps)
+        :type z: array
+        :param factorise: function returning the Cholesky factor of a dense (sub-)matrix, defaults to np.linalg.cholesky
+        :type factorise: function, optional
+        :return: correlated deviations, of shape (size,MCsteps)
+        :rtype: array
+        """
+        raise NotImplementedError
+
+    def factor(self,factorise=np.linalg.cholesky):
+        """
+        Return a dense factor B of the covariance matrix (B.B^T), of shape (size,n_random).
+
+        :param factorise: function returning the Cholesky factor of a dense (sub-)matrix, defaults to np.linalg.cholesky
+        :type factorise: function, optional
+        :return: factor of the covariance matrix
+        :rtype: array
+        """
+        raise NotImplementedError
+
+    def diagonal(self):
+        """
+        Return the variances (diagonal of the covariance matrix).
+
+        :return: variances
+        :rtype: array
+        """
+        raise NotImplementedError
+
+    def to_dense(self):
+        """
+        Return the dense covariance matrix (only feasible for small input quantities).
+
+        :return: covariance matrix
+        :rtype: array
+        """
+        B = self.factor()
+        return np.dot(B,B.T)
+
+    def subset(self,index):
+        """
+        Return the covariance matrix of a subset of the elements (e.g. a spatial tile), keeping the structure where possible.
+
+        :param index: indices of the elements, in increasing order
+        :type index: array
+        :return: covariance matrix of the subset
+        :rtype: StructuredCovariance or array
+        """
+        return self.to_dense()[np.ix_(index,index)]
+
+class LowRankCovariance(StructuredCovariance):
+    def __init__(self,diag,factor):
+        """
+        Initialise covariance matrix of the form diag(diag)+factor.factor^T, e.g. independent noise plus a few
+        correlated error effects.
+
+        :param diag: variances of the independent component, of shape (size,)
+        :type diag: array
+        :param factor: low-rank factor, of shape (size,k)
+        :type factor: array
+        """
+        self.diag = np.asarray(diag,dtype=np.float64).flatten()
+        self.factor_lowrank = np.asarray(factor,dtype=np.float64).reshape((len(self.diag),-1))
+        self.size = len(self.diag)
+        self.n_random = self.size+self.factor_lowrank.shape[1]
+
+    def correlate(self,z,factorise=np.linalg.cholesky):
+        return np.sqrt(self.diag).astype(z.dtype)[:,None]*z[:self.size]+np.dot(self.factor_lowrank.astype(z.dtype,copy=False),z[self.size:])
+
+    def factor(self,factorise=np.linalg.cholesky):
+        return np.concatenate([np.diag(np.sqrt(self.diag)),self.factor_lowrank],axis=1)
+
+    def diagonal(self):
+        return self.diag+np.sum(self.factor_lowrank**2,axis=1)
+
+    def subset(self,index):
+        return LowRankCovariance(self.diag[index],self.factor_lowrank[index])
+
+class BlockDiagonalCovariance(StructuredCovariance):
+    def __init__(self,blocks):
+        """
+        Initialise block-diagonal covariance matrix, e.g. for errors that are only correlated within each row of an image.
+        Each block is factorised separately.
+
+        :param blocks: covariance matrices of the blocks along the diagonal
+        :type blocks: list[array]
+        """
+        self.blocks = [np.asarray(block,dtype=np.float64) for block in blocks]
+        self.offsets = np.cumsum([0]+[len(block) for block in self.blocks])
+        self.size = int(self.offsets[-1])
+        self.n_random = self.size
+
+    def correlate(self,z,factorise=np.linalg.cholesky):
+        out = np.empty(z.shape,dtype=z.dtype)
+        for i in range(len(self.blocks)):
+            L = factorise(self.blocks[i]).astype(z.dtype,copy=False)
+            out[self.offsets[i]:self.offsets[i+1]] = np.dot(L,z[self.offsets[i]:self.offsets[i+1]])
+        return out
+
+    def factor(self,factorise=np.linalg.cholesky):
+        B = np.zeros((self.size,self.size))
+        for i in range(len(self.blocks)):
+            B[self.offsets[i]:self.offsets[i+1],self.offsets[i]:self.offsets[i+1]] = factorise(self.blocks[i])
+        return B
+
+    def diagonal(self):
+        return np.concatenate([np.diag(block) for block in self.blocks])
+
+    def subset(self,index):
+        blocks = []
+        for i in range(len(self.blocks)):
+            index_block = index[(index >= self.offsets[i])&(index < self.offsets[i+1])]-self.offsets[i]
+            if len(index_block) > 0:
+                blocks.append(self.blocks[i][np.ix_(index_block,index_block)])
+        return BlockDiagonalCovariance(blocks)
+
+class KroneckerCovariance(StructuredCovariance):
+    def __init__(self,matrices):
+        """
+        Initialise covariance matrix that is the Kronecker product of covariance matrices along each axis of the input
+        quantity (e.g. a spectral and a spatial correlation matrix for an image), so that element (i,j) of an input quantity of
+        shape (m,o) has index i*o+j in the flattened covariance matrix. Only the matrices of each axis are factorised.
+
+        :param matrices: covariance (or correlation) matrices along each axis of the input quantity, in order
+        :type matrices: list[array]
+        """
+        self.matrices = [np.asarray(matrix,dtype=np.float64) for matrix in matrices]
+        self.shape = tuple(len(matrix) for matrix in self.matrices)
+        self.size = int(np.prod(self.shape))
+        self.n_random = self.size
+
+    def correlate(self,z,factorise=np.linalg.cholesky):
+        z = z.reshape(self.shape+(z.shape[-1],))
+        for axis in range(len(self.matrices)):
+            L = factorise(self.matrices[axis]).astype(z.dtype,copy=False)
+            z = np.moveaxis(np.tensordot(L,z,axes=([1],[axis])),0,axis)
+        return z.reshape((self.size,z.shape[-1]))
+
+    def factor(self,factorise=np.linalg.cholesky):
+        B = np.ones((1,1))
+        for matrix in self.matrices:
+            B = np.kron(B,factorise(matrix))
+        return B
+
+    def diagonal(self):
+        diag = np.ones(1)
+        for matrix in self.matrices:
+            diag = np.kron(diag,np.diag(matrix))
+        return diag
+
+    def subset(self,index):
+        # a rectangular tile is the product of subsets along each axis, for which the structure is kept
+        index_axes = [np.unique(index_axis) for index_axis in np.unravel_index(index,self.shape)]
+        if np.prod([len(index_axis) for index_axis in index_axes]) != len(index):
+            return super().subset(index)
+        return KroneckerCovariance([self.matrices[i][np.ix_(index_axes[i],index_axes[i])] for i in range(len(self.matrices))])
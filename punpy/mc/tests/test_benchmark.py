@@ -0,0 +1,58 @@
+"""
+Tests for benchmark suite
+"""
+
+import os
+import json
+import tempfile
+import unittest
+import tracemalloc
+import numpy as np
+from punpy.version import __version__
+from punpy.mc.benchmark import Benchmark,PROPAGATE_METHODS,main
+
+'''___Authorship___'''
+__author__ = "Pieter De Vis"
+__created__ = "18/10/2026"
+__version__ = __version__
+__maintainer__ = "Pieter De Vis"
+__email__ = "pieter.de.vis@npl.co.uk"
+__status__ = "Development"
+
+class TestBenchmark(unittest.TestCase):
+    """
+    Class for unit tests
+    """
+    def test_cases(self):
+        benchmark = Benchmark(ndims=(0,2),MCsteps=(50,),corr_axes=(-99,1,2),parallel_cores=(0,2))
+        cases = benchmark.cases()
+        # corr_axis=2 is not used for 2D input quantities, and only -99 for scalars
+        self.assertEqual(len(cases),(len(PROPAGATE_METHODS)*2+1)*3+2)
+        self.assertEqual(set(case["corr_axis"] for case in cases),{-99,1,None})
+
+    def test_measure(self):
+        tracing = []
+        def run(n):
+            tracing.append(tracemalloc.is_tracing())
+            return np.ones(n)
+        result = Benchmark(repeat=3).measure(run,10**6)
+        # the timed runs are not traced, and the peak memory is measured in a separate run
+        self.assertEqual(tracing,[False,False,False,True])
+        self.assertGreater(result["time"],0)
+        self.assertGreaterEqual(result["peak_memory"],8*10**6)
+
+    def test_main(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory,"benchmark.json")
+            main(["--ndims","0","2","--MCsteps","50","--size","3","--output",path])
+            with open(path) as f:
+                results = json.load(f)
+        self.assertEqual(results["punpy_version"],__version__)
+        methods = set(result["method"] for result in results["results"])
+        self.assertEqual(methods,set(PROPAGATE_METHODS)|{"calculate_corr","generate_samples_cov"})
+        for result in results["results"]:
+            self.assertGreater(result["time"],0)
+            self.assertGreater(result["peak_memory"],0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+"""
+Tests for blocked correlation class
+"""
+
+import os
+import tempfile
+import unittest
+import numpy as np
+import numpy.testing as npt
+from punpy.version import __version__
+from punpy.mc.blocked_correlation import BlockedCorrelation
+
+'''___Authorship___'''
+__author__ = "Pieter De Vis"
+__created__ = "18/10/2026"
+__version__ = __version__
+__maintainer__ = "Pieter De Vis"
+__email__ = "pieter.de.vis@npl.co.uk"
+__status__ = "Development"
+
+rng = np.random.default_rng(12345)
+MC_y = rng.standard_normal((1,300))+rng.standard_normal((50,300))
+corr = np.corrcoef(MC_y)
+
+class TestBlockedCorrelation(unittest.TestCase):
+    """
+    Class for unit tests
+    """
+    def test_compute(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory,"corr.npy")
+            for threads in [0,3]:
+                corr_blocked = BlockedCorrelation(path,tile_size=16,threads=threads).compute(MC_y)
+                self.assertIsInstance(corr_blocked,np.memmap)
+                npt.assert_allclose(corr_blocked,corr,atol=1e-12)
+            self.assertEqual(os.listdir(directory),["corr.npy"])
+
+            corr_upper = BlockedCorrelation(path,tile_size=16,upper=True).compute(MC_y)
+            npt.assert_allclose(corr_upper,np.triu(corr),atol=1e-12)
+            self.assertEqual(len(BlockedCorrelation(path,tile_size=16,upper=True).tiles(50)),10)
+            del corr_blocked,corr_upper
+
+        self.assertRaises(ValueError,BlockedCorrelation,"corr.npy",tile_size=0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+"""
+Tests for cholesky cache
+"""
+
+import unittest
+import numpy as np
+import numpy.testing as npt
+from punpy.version import __version__
+from punpy.mc.cholesky_cache import CholeskyCache,cholesky_cache
+from punpy.mc.mc_propagation import MCPropagation
+
+'''___Authorship___'''
+__author__ = "Pieter De Vis"
+__created__ = "18/10/2026"
+__version__ = __version__
+__maintainer__ = "Pieter De Vis"
+__email__ = "pieter.de.vis@npl.co.uk"
+__status__ = "Development"
+
+class TestCholeskyCache(unittest.TestCase):
+    """
+    Class for unit tests
+    """
+    def test_get(self):
+        cache = CholeskyCache()
+        A = np.array([[4.,2.],[2.,3.]])
+        L = cache.get(A,np.linalg.cholesky)
+        npt.assert_allclose(np.dot(L,L.T),A)
+        self.assertFalse(L.flags.writeable)
+        self.assertIs(cache.get(A.copy(),np.linalg.cholesky),L)
+        self.assertIsNot(cache.get(A.astype(np.float32),np.linalg.cholesky),L)
+        self.assertEqual(cache.stats(),{"hits":1,"misses":2,"evictions":0,"size":2,"nbytes":48})
+
+        # factors cached in another data type are returned without conversion
+        L32 = cache.get(A,np.linalg.cholesky,np.float32)
+        self.assertEqual(L32.dtype,np.float32)
+        self.assertIs(cache.get(A,np.linalg.cholesky,np.float32),L32)
+        self.assertEqual(cache.stats()["size"],3)
+
+        cache.clear()
+        self.assertEqual(cache.stats()["size"],0)
+        self.assertEqual(cache.stats()["misses"],0)
+
+    def test_eviction(self):
+        cache = CholeskyCache(max_bytes=3*8*10**2)
+        matrices = [np.eye(10)*(i+1) for i in range(4)]
+        for A in matrices:
+            cache.get(A,np.linalg.cholesky)
+        self.assertEqual(cache.stats()["evictions"],1)
+        self.assertEqual(cache.stats()["nbytes"],3*8*10**2)
+        # the least recently used matrix was evicted
+        cache.get(matrices[0],np.linalg.cholesky)
+        self.assertEqual(cache.stats()["misses"],5)
+        cache.get(matrices[3],np.linalg.cholesky)
+        self.assertEqual(cache.stats()["hits"],1)
+
+        cache = CholeskyCache(max_bytes=0)
+        cache.get(matrices[0],np.linalg.cholesky)
+        cache.get(matrices[0],np.linalg.cholesky)
+        self.assertEqual(cache.stats()["misses"],2)
+        self.assertEqual(cache.stats()["size"],0)
+
+    def test_propagate_cov(self):
+        cholesky_cache.clear()
+        prop = MCPropagation(1000,seed=12345)
+        cov = np.ones((20,20))+np.eye(20)
+        for i in range(3):
+            prop.propagate_cov(lambda x1,x2: x1+x2,[np.ones(20),np.ones(20)],[cov,cov],return_corr=False)
+        self.assertEqual(cholesky_cache.stats()["misses"],1)
+        self.assertEqual(cholesky_cache.stats()["hits"],5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+Tests for factored samples
+"""
+
+import pickle
+import unittest
+import numpy as np
+import numpy.testing as npt
+from punpy.version import __version__
+from punpy.mc.factored_samples import SystematicSamples,concatenate_samples
+from punpy.mc.mc_propagation import MCPropagation
+
+'''___Authorship___'''
+__author__ = "Pieter De Vis"
+__created__ = "18/10/2026"
+__version__ = __version__
+__maintainer__ = "Pieter De Vis"
+__email__ = "pieter.de.vis@npl.co.uk"
+__status__ = "Development"
+
+param = np.arange(12.).reshape((4,3))
+u_param = 0.1*np.arange(1,4)
+z = np.random.default_rng(12345).standard_normal(500)
+dense = param[...,None]+u_param[:,None]*z
+
+class TestSystematicSamples(unittest.TestCase):
+    """
+    Class for unit tests
+    """
+    def test_expand(self):
+        samples = SystematicSamples(param,u_param,z)
+        self.assertEqual(samples.shape,(4,3,500))
+        self.assertEqual(samples.nbytes,param.nbytes+u_param.nbytes+z.nbytes)
+        npt.assert_allclose(np.asarray(samples),dense,rtol=1e-15)
+        npt.assert_allclose(samples+1,dense+1,rtol=1e-15)
+        npt.assert_allclose(samples.reshape((12,-1)),dense.reshape((12,-1)),rtol=1e-15)
+
+        chunk = samples[...,100:200]
+        self.assertIsInstance(chunk,SystematicSamples)
+        npt.assert_allclose(np.asarray(chunk),dense[...,100:200],rtol=1e-15)
+        npt.assert_allclose(samples[...,7],dense[...,7],rtol=1e-15)
+        tile = samples[1:3]
+        self.assertIsInstance(tile,SystematicSamples)
+        npt.assert_allclose(np.asarray(tile),dense[1:3],rtol=1e-15)
+        npt.assert_allclose(samples[0,1,2],dense[0,1,2],rtol=1e-15)
+
+        npt.assert_allclose(np.asarray(pickle.loads(pickle.dumps(chunk))),dense[...,100:200],rtol=1e-15)
+        self.assertIsInstance(concatenate_samples([samples[...,:100],samples[...,100:]]),SystematicSamples)
+        npt.assert_allclose(concatenate_samples([samples[...,:100],dense[...,100:]]),dense,rtol=1e-15)
+
+    def test_statistics(self):
+        samples = SystematicSamples(param,u_param,z)
+        npt.assert_allclose(np.mean(samples,axis=-1),np.mean(dense,axis=-1),rtol=1e-12)
+        npt.assert_allclose(np.std(samples,axis=-1),np.std(dense,axis=-1),rtol=1e-12)
+        npt.assert_allclose(np.std(samples,axis=-1,ddof=1),np.std(dense,axis=-1,ddof=1),rtol=1e-12)
+        npt.assert_allclose(np.mean(samples),np.mean(dense),rtol=1e-12)
+        npt.assert_allclose(np.std(samples),np.std(dense),rtol=1e-12)
+        npt.assert_allclose(np.std(samples,axis=0),np.std(dense,axis=0),rtol=1e-12)
+
+        prop = MCPropagation(500)
+        u_signs = np.array([0.1,-0.2,0.3])
+        npt.assert_allclose(prop.calculate_corr(SystematicSamples(np.ones(3),u_signs,z)),
+                            prop.calculate_corr(np.ones((3,1))+u_signs[:,None]*z),atol=1e-12)
+        npt.assert_allclose(prop.calculate_corr(samples,corr_axis=0),prop.calculate_corr(dense,corr_axis=0),atol=1e-12)
+
+    def test_generate_samples(self):
+        prop = MCPropagation(500,seed=12345)
+        samples = prop.generate_samples_systematic(param,u_param)
+        self.assertIsInstance(samples,SystematicSamples)
+        self.assertLess(samples.nbytes,np.asarray(samples).nbytes)
+
+        uf,yvalues,xvalues = MCPropagation(500,seed=12345,batch_size=200).propagate_systematic(
+            lambda x1,x2: x1*x2,[param,param],[u_param,u_param],return_samples=True)
+        self.assertIsInstance(xvalues[0],SystematicSamples)
+        npt.assert_allclose(yvalues,np.asarray(xvalues[0])*np.asarray(xvalues[1]),rtol=1e-12)
+
+if __name__ == '__main__':
+    unittest.main()
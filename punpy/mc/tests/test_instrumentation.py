@@ -0,0 +1,63 @@
+"""
+Tests for instrumentation
+"""
+
+import unittest
+import numpy as np
+from punpy.version import __version__
+from punpy.mc.instrumentation import StageStats,NullStats,describe_arrays
+from punpy.mc.factored_samples import SystematicSamples
+
+'''___Authorship___'''
+__author__ = "Pieter De Vis"
+__created__ = "18/10/2026"
+__version__ = __version__
+__maintainer__ = "Pieter De Vis"
+__email__ = "pieter.de.vis@npl.co.uk"
+__status__ = "Development"
+
+class TestInstrumentation(unittest.TestCase):
+    """
+    Class for unit tests
+    """
+    def test_stage_stats(self):
+        records = []
+        stats = StageStats(callback=records.append)
+        stats.start_call("propagate_random")
+        with stats.stage("evaluate_func") as stage:
+            MC_y = np.ones((100,1000))
+            stage.output(MC_y)
+        self.assertEqual(records,stats.records)
+        record = stats.records[0]
+        self.assertEqual((record["call"],record["method"],record["stage"]),(1,"propagate_random","evaluate_func"))
+        self.assertEqual(record["shapes"],[(100,1000)])
+        self.assertEqual(record["nbytes"],MC_y.nbytes)
+        self.assertGreaterEqual(record["bytes"],MC_y.nbytes)
+        self.assertGreater(record["time"],0)
+        self.assertEqual(stats.summary()["evaluate_func"]["count"],1)
+
+        stats = StageStats(trace_memory=False)
+        with stats.stage("std"):
+            pass
+        self.assertIsNone(stats.records[0]["bytes"])
+        stats.clear()
+        self.assertEqual(stats.records,[])
+
+    def test_null_stats(self):
+        stats = NullStats()
+        stats.start_call("propagate_random")
+        with stats.stage("evaluate_func") as stage:
+            stage.output(np.ones(10))
+        self.assertEqual(len(stats.records),0)
+        self.assertEqual(stats.summary(),{})
+
+    def test_describe_arrays(self):
+        data = np.empty(2,dtype=object)
+        data[0] = np.ones((3,4))
+        data[1] = SystematicSamples(np.ones(3),0.1,np.ones(1000))
+        shapes,nbytes = describe_arrays([data,None])
+        self.assertEqual(shapes,[(3,4),(3,1000)])
+        self.assertEqual(nbytes,96+data[1].nbytes)
+
+if __name__ == '__main__':
+    unittest.main()
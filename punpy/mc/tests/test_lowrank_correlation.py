@@ -0,0 +1,53 @@
+"""
+Tests for low-rank correlation class
+"""
+
+import unittest
+import numpy as np
+import numpy.testing as npt
+from punpy.version import __version__
+from punpy.mc.lowrank_correlation import LowRankCorrelation
+
+'''___Authorship___'''
+__author__ = "Pieter De Vis"
+__created__ = "18/10/2026"
+__version__ = __version__
+__maintainer__ = "Pieter De Vis"
+__email__ = "pieter.de.vis@npl.co.uk"
+__status__ = "Development"
+
+rng = np.random.default_rng(12345)
+# 30 elements with a common error and independent noise
+MC_y = rng.standard_normal((1,200))+0.5*rng.standard_normal((30,200))
+corr = np.corrcoef(MC_y)
+
+class TestLowRankCorrelation(unittest.TestCase):
+    """
+    Class for unit tests
+    """
+    def test_from_samples(self):
+        lowrank = LowRankCorrelation.from_samples(MC_y)
+        self.assertEqual(lowrank.shape,(30,30))
+        self.assertEqual(lowrank.rank,200)
+        npt.assert_allclose(lowrank.to_dense(),corr,atol=1e-12)
+        npt.assert_allclose(np.asarray(lowrank),corr,atol=1e-12)
+        npt.assert_allclose(lowrank.diagonal(),np.ones(30),rtol=1e-12)
+
+        v = rng.standard_normal((30,2))
+        npt.assert_allclose(lowrank.matvec(v),np.dot(corr,v),atol=1e-12)
+        npt.assert_allclose(lowrank.block(slice(5,10)),corr[5:10,5:10],atol=1e-12)
+        npt.assert_allclose(lowrank.block([1,3],[2,4,6]),corr[np.ix_([1,3],[2,4,6])],atol=1e-12)
+        self.assertAlmostEqual(lowrank.entry(3,7),corr[3,7],places=12)
+
+    def test_truncate(self):
+        lowrank = LowRankCorrelation.from_samples(MC_y,rank=1)
+        self.assertEqual(lowrank.factor.shape,(30,1))
+        # the common error explains most of the correlation
+        offdiag = ~np.eye(30,dtype=bool)
+        npt.assert_allclose(lowrank.to_dense()[offdiag],corr[offdiag],atol=0.1)
+
+        lowrank = LowRankCorrelation.from_samples(MC_y,rank=30)
+        npt.assert_allclose(lowrank.to_dense(),corr,atol=1e-10)
+
+if __name__ == '__main__':
+    unittest.main()
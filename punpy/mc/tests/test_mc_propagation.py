@@ -2,11 +2,17 @@
 Tests for mc propagation class
 """
 
+import os
+import tempfile
+import tracemalloc
 import unittest
 import numpy as np
 import numpy.testing as npt
 from punpy.version import __version__
 from punpy.mc.mc_propagation import MCPropagation
+from punpy.mc.random_streams import qmc
+from punpy.mc.lowrank_correlation import LowRankCorrelation
+from punpy.mc.instrumentation import StageStats
 
 '''___Authorship___'''
 __author__ = "Pieter De Vis"
@@ -65,6 +71,16 @@ yerr_corrc=1024**0.5*np.ones(200)
 def functiond(x1,x2):
     return 2* x1 - x2, 2*x1+x2
 
+class Model:
+    def __init__(self,scale):
+        self.scale = scale
+
+    def measure(self,x1,x2):
+        return self.scale*(x1**2 - 10*x2)
+
+def function_shapes(x1,x2):
+    return x1-x2,np.sum(x1,axis=0)
+
 x1d=np.ones((20,3,4))*50
 x2d=np.ones((20,3,4))*30
 x1errd=np.ones((20,3,4))
@@ -83,7 +99,7 @@ class TestMCPropagation(unittest.TestCase):
     Class for unit tests
     """
     def test_propagate_random(self):
-        prop = MCPropagation(40000)
+        prop = MCPropagation(40000,seed=12345)
 
         uf,ucorr = prop.propagate_random(function,xs,xerrs,return_corr=True)
         npt.assert_allclose(ucorr,np.eye(len(ucorr)),atol=0.05)
@@ -140,7 +156,7 @@ class TestMCPropagation(unittest.TestCase):
         npt.assert_allclose(ufd,yerr_corrd,atol=0.05)
 
     def test_propagate_systematic(self):
-        prop = MCPropagation(30000,parallel_cores=3)
+        prop = MCPropagation(30000,seed=12345,parallel_cores=3)
 
         uf,ucorr = prop.propagate_systematic(function,xs,xerrs,return_corr=True)
         npt.assert_allclose(ucorr,np.ones_like(ucorr),atol=0.05)
@@ -186,7 +202,7 @@ class TestMCPropagation(unittest.TestCase):
 
 
     def test_propagate_both(self):
-        prop = MCPropagation(20000,parallel_cores=1)
+        prop = MCPropagation(20000,seed=12345,parallel_cores=1)
 
         uf,ucorr = prop.propagate_both(function,xs,xerrs,
                                        [np.zeros_like(x1err),np.zeros_like(x2err)],return_corr=True)
@@ -232,7 +248,7 @@ class TestMCPropagation(unittest.TestCase):
         npt.assert_allclose(ufc,yerr_corrc,rtol=0.05)
 
     def test_propagate_type(self):
-        prop = MCPropagation(20000)
+        prop = MCPropagation(20000,seed=12345)
         uf,ucorr = prop.propagate_type(function,xs,xerrs,['rand','rand'],return_corr=True)
         npt.assert_allclose(ucorr,np.eye(len(ucorr)),atol=0.05)
         npt.assert_allclose(uf,yerr_uncorr,rtol=0.05)
@@ -272,7 +288,7 @@ class TestMCPropagation(unittest.TestCase):
         npt.assert_allclose(ufc,yerr_corrc,rtol=0.05)
 
     def test_propagate_cov(self):
-        prop = MCPropagation(20000)
+        prop = MCPropagation(20000,seed=12345)
 
         cov = [MCPropagation.convert_corr_to_cov(np.eye(len(xerr.flatten())),xerr) for xerr in xerrs]
         uf,ucorr = prop.propagate_cov(function,xs,cov,return_corr=True)
@@ -320,5 +336,450 @@ class TestMCPropagation(unittest.TestCase):
         npt.assert_allclose(ucorrc,np.eye(len(ucorrc)),atol=0.05)
         npt.assert_allclose(ufc,yerr_corrc,rtol=0.05)
 
+    def test_propagate_batches(self):
+        prop = MCPropagation(20000,seed=12345,batch_size=3000)
+
+        uf = prop.propagate_random(function,xs,xerrs)
+        npt.assert_allclose(uf,yerr_uncorr,rtol=0.05)
+
+        uf,ucorr = prop.propagate_systematic(function,xs,xerrs,return_corr=True)
+        npt.assert_allclose(ucorr,np.ones_like(ucorr),atol=0.05)
+        npt.assert_allclose(uf,yerr_uncorr,rtol=0.05)
+
+        #the measurand is chi-squared distributed here, so its std converges slowly
+        uf,yvalues,xvalues = prop.propagate_random(function,xs,xerrs,corr_between=np.ones((2,2)),return_samples=True)
+        npt.assert_allclose(uf,yerr_corr,rtol=0.1)
+        self.assertEqual(yvalues.shape,(200,20000))
+        npt.assert_allclose(uf,np.std(yvalues,axis=-1),rtol=1e-10)
+
+        ufb,ucorrb = prop.propagate_both(functionb,xsb,xerrsb,[np.zeros_like(x1errb),np.zeros_like(x2errb)],
+                                         return_corr=True,corr_axis=0)
+        npt.assert_allclose(ufb,yerr_uncorrb,rtol=0.05)
+        npt.assert_allclose(ucorrb,np.eye(len(ucorrb)),atol=0.05)
+
+        covc = [MCPropagation.convert_corr_to_cov(np.eye(len(xerrc.flatten())),xerrc) for xerrc in xerrsc]
+        ufc = prop.propagate_cov(functionc,xsc,covc,return_corr=False)
+        npt.assert_allclose(ufc,yerr_uncorrc,rtol=0.05)
+
+        ufd = prop.propagate_random(functiond,xsd,xerrsd,output_vars=2)
+        npt.assert_allclose(ufd,yerr_uncorrd,rtol=0.05)
+
+        ufd,ucorrd,corr_out = prop.propagate_systematic(functiond,xsd,xerrsd,return_corr=True,corr_axis=1,
+                                                        output_vars=2)
+        npt.assert_allclose(ucorrd[1],np.ones_like(ucorrd[1]),atol=0.05)
+
+        ufd,ucorrd,corr_out,yvalues,xvalues = prop.propagate_random(functiond,xsd,xerrsd,return_corr=True,
+                                                                    output_vars=2,return_samples=True)
+        npt.assert_allclose(ucorrd[0],prop.calculate_corr(yvalues[0]),atol=1e-8)
+        npt.assert_allclose(corr_out,np.corrcoef(yvalues.reshape((2,-1))),atol=1e-8)
+
+    def test_propagate_tiles(self):
+        prop = MCPropagation(20000,seed=12345,tile_shape=(7,2))
+
+        ufb = prop.propagate_random(functionb,xsb,xerrsb)
+        self.assertEqual(ufb.shape,(20,3))
+        npt.assert_allclose(ufb,yerr_uncorrb,rtol=0.05)
+
+        ufb = prop.propagate_both(functionb,xsb,xerrsb,[np.zeros_like(x1errb),np.zeros_like(x2errb)],
+                                  return_corr=False,corr_between=np.ones((2,2)))
+        npt.assert_allclose(ufb,yerr_corrb,atol=0.03)
+
+        covb = [MCPropagation.convert_corr_to_cov(np.eye(len(xerrb.flatten())),xerrb) for xerrb in xerrsb]
+        ufb = prop.propagate_cov(functionb,xsb,covb,return_corr=False)
+        npt.assert_allclose(ufb,yerr_uncorrb,rtol=0.05)
+
+        self.assertRaises(ValueError,prop.propagate_systematic,functionb,xsb,xerrsb,return_corr=True)
+
+        prop = MCPropagation(20000,seed=12345,parallel_cores=2,tile_shape=8)
+        ufd = prop.propagate_type(functiond,xsd,xerrsd,['syst','rand'],return_corr=False,output_vars=2)
+        self.assertEqual(ufd.shape,(2,20,3,4))
+        npt.assert_allclose(ufd[0],yerr_uncorrd[0],rtol=0.05)
+
+    def test_persistent_pool(self):
+        with MCPropagation(2000,seed=12345,parallel_cores=2) as prop:
+            uf = prop.propagate_random(function,xs,xerrs)
+            npt.assert_allclose(uf,yerr_uncorr,rtol=0.1)
+            pool = prop._pool
+            uf = prop.propagate_systematic(function,xs,xerrs)
+            npt.assert_allclose(uf,yerr_uncorr,rtol=0.1)
+            self.assertIs(prop._pool,pool)
+
+            ufb = prop.propagate_random(functionb,xsb,xerrsb)
+            npt.assert_allclose(ufb,yerr_uncorrb,rtol=0.1)
+            self.assertIsNot(prop._pool,pool)
+        self.assertIsNone(prop._pool)
+
+        prop = MCPropagation(2000,seed=12345,parallel_cores=2,persistent_pool=True,tile_shape=(10,))
+        ufb = prop.propagate_random(functionb,xsb,xerrsb)
+        npt.assert_allclose(ufb,yerr_uncorrb,rtol=0.1)
+        self.assertIsNotNone(prop._pool)
+        prop.close()
+        self.assertIsNone(prop._pool)
+
+        model = Model(1.)
+        with MCPropagation(2000,seed=12345,parallel_cores=2) as prop:
+            uf = prop.propagate_random(model.measure,xs,xerrs)
+            npt.assert_allclose(uf,yerr_uncorr,rtol=0.1)
+            pool = prop._pool
+            uf = prop.propagate_systematic(model.measure,xs,xerrs)
+            npt.assert_allclose(uf,yerr_uncorr,rtol=0.1)
+            self.assertIs(prop._pool,pool)
+
+            uf = prop.propagate_random(Model(2.).measure,xs,xerrs)
+            npt.assert_allclose(uf,2*yerr_uncorr,rtol=0.1)
+            self.assertIsNot(prop._pool,pool)
+
+    def test_evaluate_func_shared(self):
+        prop = MCPropagation(500,parallel_cores=2)
+        data = np.empty(2,dtype=np.ndarray)
+        data[0] = prop.generate_samples_random(x1d,x1errd)
+        data[1] = prop.generate_samples_systematic(x2d,x2errd)
+        MC_y = prop.evaluate_func_shared(functiond,data,500)
+        npt.assert_allclose(MC_y,np.array(functiond(*data)))
+
+        data[0] = prop.generate_samples_random(1.,2.)
+        data[1] = prop.generate_samples_random(3.,0.5)
+        MC_y = prop.evaluate_func_shared(function,data,500)
+        npt.assert_allclose(MC_y,function(*data))
+
+        prop = MCPropagation(500,parallel_cores=2,parallel_mode="chunks",chunks_per_core=3)
+        self.assertEqual(prop.split_steps(0,500),[(0,83),(83,166),(166,250),(250,333),(333,416),(416,500)])
+        data[0] = prop.generate_samples_random(x1d,x1errd)
+        data[1] = prop.generate_samples_systematic(x2d,x2errd)
+        MC_y = prop.evaluate_func_shared(functiond,data,500)
+        npt.assert_allclose(MC_y,np.array(functiond(*data)))
+
+    def test_propagate_chunks(self):
+        prop = MCPropagation(20000,seed=12345,parallel_cores=2,parallel_mode="chunks")
+        uf,ucorr = prop.propagate_random(function,xs,xerrs,return_corr=True)
+        npt.assert_allclose(ucorr,np.eye(len(ucorr)),atol=0.05)
+        npt.assert_allclose(uf,yerr_uncorr,rtol=0.05)
+
+        ufd,ucorrd,corr_out = prop.propagate_systematic(functiond,xsd,xerrsd,return_corr=True,corr_axis=0,
+                                                        output_vars=2)
+        npt.assert_allclose(ucorrd[0],np.ones_like(ucorrd[0]),atol=0.05)
+        npt.assert_allclose(ufd,yerr_uncorrd,rtol=0.05)
+
+        self.assertRaises(ValueError,MCPropagation,100,parallel_mode="threads")
+
+    def test_propagate_threads(self):
+        for parallel_mode in ["steps","chunks"]:
+            prop = MCPropagation(10000,seed=12345,parallel_cores=3,parallel_mode=parallel_mode,parallel_backend="threads")
+            uf,ucorr = prop.propagate_random(function,xs,xerrs,return_corr=True)
+            npt.assert_allclose(ucorr,np.eye(len(ucorr)),atol=0.05)
+            npt.assert_allclose(uf,yerr_uncorr,rtol=0.05)
+
+            data = np.empty(2,dtype=np.ndarray)
+            data[0] = prop.generate_samples_random(x1d,x1errd,MCsteps=200)
+            data[1] = prop.generate_samples_systematic(x2d,x2errd,MCsteps=200)
+            npt.assert_allclose(prop.evaluate_func(functiond,data,200),np.array(functiond(*data)))
+
+        # each MC iteration is evaluated once, including the first one, which is used to size the output array
+        evaluated = []
+        def function_counted(x1,x2):
+            evaluated.append(np.shape(x1)[-1])
+            return function(x1,x2)
+        prop = MCPropagation(1000,seed=12345,parallel_cores=2,parallel_mode="chunks",parallel_backend="threads")
+        prop.propagate_random(function_counted,xs,xerrs)
+        self.assertEqual(sum(evaluated),1000)
+        self.assertEqual(len(evaluated),3)
+
+        prop = MCPropagation(10000,seed=12345,parallel_cores=2,parallel_backend="threads",tile_shape=(5,))
+        ufb = prop.propagate_random(functionb,xsb,xerrsb)
+        npt.assert_allclose(ufb,yerr_uncorrb,rtol=0.05)
+
+        self.assertRaises(ValueError,MCPropagation,100,parallel_backend="mpi")
+
+    def test_seed(self):
+        uf,yvalues,xvalues = MCPropagation(3000,seed=1).propagate_both(functionb,xsb,xerrsb,xerrsb,return_corr=False,
+                                                                       return_samples=True)
+        for prop in [MCPropagation(3000,seed=1,batch_size=700),MCPropagation(3000,seed=np.random.SeedSequence(1),parallel_cores=2),
+                     MCPropagation(3000,seed=1,parallel_cores=2,parallel_backend="threads",parallel_mode="chunks")]:
+            uf2,yvalues2,xvalues2 = prop.propagate_both(functionb,xsb,xerrsb,xerrsb,return_corr=False,return_samples=True)
+            npt.assert_array_equal(xvalues2[0],xvalues[0])
+            npt.assert_array_equal(yvalues2,yvalues)
+            npt.assert_allclose(uf2,uf,rtol=1e-12)
+
+        prop = MCPropagation(3000,seed=np.random.default_rng(5))
+        uf1 = prop.propagate_random(function,xs,xerrs)
+        uf2 = prop.propagate_random(function,xs,xerrs)
+        self.assertFalse(np.all(uf1==uf2))
+        npt.assert_array_equal(MCPropagation(3000,seed=np.random.default_rng(5)).propagate_random(function,xs,xerrs),uf1)
+
+    def test_dtype(self):
+        prop = MCPropagation(20000,seed=12345,dtype=np.float32)
+        uf,ucorr,yvalues,xvalues = prop.propagate_random(function,xs,xerrs,return_corr=True,return_samples=True)
+        self.assertEqual(yvalues.dtype,np.float32)
+        self.assertEqual(xvalues[0].dtype,np.float32)
+        self.assertEqual(uf.dtype,np.float64)
+        npt.assert_allclose(uf,yerr_uncorr,rtol=0.05)
+        npt.assert_allclose(ucorr,np.eye(len(ucorr)),atol=0.05)
+
+        ufb,yvaluesb,xvaluesb = prop.propagate_both(functionb,xsb,xerrsb,xerrsb,return_corr=False,
+                                                    corr_between=np.ones((2,2)),return_samples=True)
+        self.assertEqual(xvaluesb[1].dtype,np.float32)
+        npt.assert_allclose(ufb,yerr_corrb,atol=0.03)
+
+        prop = MCPropagation(20000,seed=12345,dtype=np.float32,batch_size=5000)
+        covc = [MCPropagation.convert_corr_to_cov(np.eye(len(xerrc.flatten())),xerrc) for xerrc in xerrsc]
+        ufc,ucorrc = prop.propagate_cov(functionc,xsc,covc,return_corr=True)
+        npt.assert_allclose(ufc,yerr_uncorrc,rtol=0.05)
+
+        self.assertRaises(ValueError,MCPropagation,100,dtype=np.int32)
+
+    def test_generate_samples(self):
+        prop = MCPropagation(20000,seed=12345)
+        x = np.ones((2,3,2,1,2))
+        u = 0.1*np.arange(1,25).reshape(x.shape)
+        samples = prop.generate_samples_random(x,u)
+        self.assertEqual(samples.shape,x.shape+(20000,))
+        npt.assert_allclose(np.std(samples,axis=-1),u,rtol=0.05)
+        samples = prop.generate_samples_systematic(x,u)
+        npt.assert_allclose(np.corrcoef(samples.reshape((24,-1))),np.ones((24,24)),atol=1e-6)
+        samples = prop.generate_samples_both(x,u,u)
+        npt.assert_allclose(np.std(samples,axis=-1),2**0.5*u,rtol=0.05)
+        npt.assert_allclose(np.mean(samples,axis=-1),x,atol=0.1)
+        # scalar uncertainties are broadcast to the shape of the input quantity
+        npt.assert_allclose(np.std(prop.generate_samples_both(x,0.1,0.2),axis=-1),0.05**0.5,rtol=0.05)
+
+    def test_calculate_corr(self):
+        prop = MCPropagation(100,seed=12345)
+        rng = np.random.default_rng(12345)
+        MC_y = rng.normal(size=(2,3,4,5,100))+rng.normal(size=(1,1,4,1,100))
+        npt.assert_allclose(prop.calculate_corr(MC_y),np.corrcoef(MC_y.reshape((-1,100))),atol=1e-12)
+        for corr_axis in range(4):
+            MC_y_axis = np.moveaxis(MC_y,corr_axis,-2).reshape((-1,MC_y.shape[corr_axis],100))
+            corr = np.mean([np.corrcoef(MC_y_slice) for MC_y_slice in MC_y_axis],axis=0)
+            npt.assert_allclose(prop.calculate_corr(MC_y,corr_axis),corr,atol=1e-12)
+
+        npt.assert_allclose(prop.calculate_corr(MC_y[0,0]),np.corrcoef(MC_y[0,0].reshape((-1,100))),atol=1e-12)
+        self.assertEqual(prop.calculate_corr(MC_y[0,0,0,0]),1.)
+
+    def test_nearestPD_cholesky(self):
+        # rank-deficient matrix (fully systematic)
+        A = np.outer(xerrsb[0,:,0],xerrsb[0,:,0])
+        L,correction = MCPropagation.nearestPD_cholesky(A,return_correction=True)
+        npt.assert_allclose(np.dot(L,L.T),A,atol=1e-10)
+        self.assertLess(correction,1e-10)
+
+        L,correction = MCPropagation.nearestPD_cholesky(corr_c,return_correction=True)
+        npt.assert_allclose(np.dot(L,L.T),corr_c,atol=1e-7)
+        self.assertGreater(correction,0)
+        self.assertLess(correction,1e-4)
+
+        self.assertRaises(ValueError,MCPropagation.nearestPD_cholesky,np.array([[1,2],[2,1]]))
+        # the change of a block with small variances is not hidden by a large variance elsewhere
+        self.assertRaises(ValueError,MCPropagation.nearestPD_cholesky,np.array([[1e6,0,0],[0,1,2],[0,2,1]]))
+
+        # input quantities without uncertainty and a rank-deficient corr_between, of which the factor is not triangular
+        uf = MCPropagation(10000,seed=12345).propagate_random(lambda a,b,c: a+b+c,[1.,2.,3.],[1.,1.,0.],corr_between=np.ones((3,3)))
+        npt.assert_allclose(uf,2.,rtol=0.02)
+
+    def test_adaptive(self):
+        prop = MCPropagation(1000,seed=12345,tolerance=0.5,max_steps=50000)
+        uf,ucorr = prop.propagate_random(function,xs,xerrs,return_corr=True)
+        self.assertGreater(prop.MCsteps_used,1000)
+        self.assertLess(prop.MCsteps_used,50000)
+        self.assertEqual(prop.MCsteps_used%1000,0)
+        npt.assert_allclose(uf,yerr_uncorr,atol=1.5)
+        npt.assert_allclose(ucorr,np.eye(len(ucorr)),atol=0.1)
+
+        # a looser tolerance needs fewer MC iterations
+        steps_tight = prop.MCsteps_used
+        prop = MCPropagation(1000,seed=12345,tolerance=2.)
+        prop.propagate_random(function,xs,xerrs)
+        self.assertLess(prop.MCsteps_used,steps_tight)
+
+        # the maximum number of MC iterations is never exceeded, and the coverage interval is also checked
+        prop = MCPropagation(1000,seed=12345,batch_size=500,tolerance=0.01,coverage_probability=0.95,max_steps=2500)
+        uf,yvalues,xvalues = prop.propagate_random(function,xs,xerrs,return_corr=False,return_samples=True)
+        self.assertEqual(prop.MCsteps_used,2500)
+        self.assertEqual(yvalues.shape,(200,2500))
+        self.assertEqual(prop.coverage_interval.shape,(2,200))
+        npt.assert_allclose(prop.coverage_interval[1]-prop.coverage_interval[0],2*1.96*yerr_uncorr,rtol=0.1)
+
+        prop = MCPropagation(1000,seed=12345)
+        prop.propagate_random(function,xs,xerrs)
+        self.assertEqual(prop.MCsteps_used,1000)
+        self.assertRaises(ValueError,MCPropagation,100,tolerance=0.1,coverage_probability=95)
+
+    @unittest.skipIf(qmc is None,"scipy is not installed")
+    def test_sampling(self):
+        # with 1024 MC iterations, pseudo-random sampling gives uncertainties that are only accurate to about 2%
+        prop = MCPropagation(1024,seed=12345,sampling="sobol")
+        uf = prop.propagate_random(function,xs[:,:5],xerrs[:,:5])
+        npt.assert_allclose(uf,yerr_uncorr[:5],rtol=0.005)
+
+        prop_batches = MCPropagation(1024,seed=12345,sampling="sobol",batch_size=300)
+        npt.assert_allclose(prop_batches.propagate_random(function,xs[:,:5],xerrs[:,:5]),uf)
+
+        ufb = prop.propagate_both(functionb,xsb[:,:2],xerrsb[:,:2],xerrsb[:,:2],return_corr=False,corr_between=np.ones((2,2)))
+        npt.assert_allclose(ufb,yerr_corrb[:2],atol=0.01)
+
+        covc = [MCPropagation.convert_corr_to_cov(np.eye(2),xerrc[:2]) for xerrc in xerrsc]
+        ufc = prop.propagate_cov(functionc,[xc[:2] for xc in xsc],covc,return_corr=False)
+        npt.assert_allclose(ufc,yerr_uncorrc[:2],rtol=0.01)
+
+        prop = MCPropagation(4096,seed=12345,sampling="lhs")
+        uf = prop.propagate_random(function,xs,xerrs)
+        npt.assert_allclose(uf,yerr_uncorr,rtol=0.05)
+
+        self.assertRaises(ValueError,MCPropagation,100,sampling="halton")
+
+    def test_calculate_corr_outputs(self):
+        prop = MCPropagation(300,seed=12345)
+        MC_y = np.random.default_rng(12345).standard_normal((3,4,5,300))+np.arange(20).reshape((4,5,1))
+        MC_y[1] += 2*MC_y[0]
+        for corr_axis in [-99,1]:
+            corr_ys,corr_out = prop.calculate_corr_outputs(MC_y,corr_axis)
+            for i in range(3):
+                npt.assert_allclose(corr_ys[i],prop.calculate_corr(MC_y[i],corr_axis),atol=1e-12)
+            npt.assert_allclose(corr_out,np.corrcoef(MC_y.reshape((3,-1))),atol=1e-12)
+
+        # output parameters with different shapes, which are broadcast for the correlation between them
+        MC_y2 = np.empty(2,dtype=object)
+        MC_y2[0] = MC_y[0]
+        MC_y2[1] = MC_y[1,0]
+        corr_ys,corr_out = prop.calculate_corr_outputs(MC_y2)
+        npt.assert_allclose(corr_ys[1],prop.calculate_corr(MC_y[1,0]),atol=1e-12)
+        npt.assert_allclose(corr_out,np.corrcoef([MC_y[0].flatten(),np.broadcast_to(MC_y[1,0],(4,5,300)).flatten()]),atol=1e-12)
+        MC_y2[1] = MC_y[1,:,:2]
+        self.assertIsNone(prop.calculate_corr_outputs(MC_y2)[1])
+
+    def test_outputs_shapes(self):
+        uf,ucorr,corr_out = MCPropagation(5000,seed=12345).propagate_random(function_shapes,xsb,xerrsb,return_corr=True,output_vars=2)
+        self.assertEqual(uf[0].shape,(20,3))
+        self.assertEqual(uf[1].shape,(3,))
+        npt.assert_allclose(uf[1],20**0.5*np.ones(3),rtol=0.05)
+        self.assertEqual(ucorr[1].shape,(3,3))
+        self.assertEqual(corr_out.shape,(2,2))
+        self.assertRaises(ValueError,MCPropagation(5000,seed=12345,batch_size=1000).propagate_random,function_shapes,xsb,xerrsb,output_vars=2)
+
+        for prop in [MCPropagation(5000,parallel_cores=1,seed=12345),
+                     MCPropagation(5000,parallel_cores=2,seed=12345),
+                     MCPropagation(5000,parallel_cores=2,parallel_mode="chunks",seed=12345),
+                     MCPropagation(5000,parallel_cores=2,parallel_backend="threads",seed=12345),
+                     MCPropagation(5000,parallel_cores=2,parallel_backend="threads",parallel_mode="chunks",seed=12345)]:
+            uf_par,ucorr_par,corr_out_par = prop.propagate_random(function_shapes,xsb,xerrsb,return_corr=True,output_vars=2)
+            npt.assert_allclose(uf_par[0],uf[0])
+            npt.assert_allclose(uf_par[1],uf[1])
+            npt.assert_allclose(corr_out_par,corr_out)
+
+    def test_stats(self):
+        records = []
+        prop = MCPropagation(1000,seed=12345,stats=StageStats(callback=records.append))
+        prop.propagate_random(function,xs,xerrs,corr_between=np.ones((2,2)),return_corr=True)
+        prop.propagate_both(functionb,xsb,xerrsb,xerrsb)
+        self.assertEqual(len(records),9)
+        self.assertEqual([record["stage"] for record in prop.stats.records if record["call"]==1],
+                         ["generate_samples","correlate_samples","evaluate_func","std","calculate_corr"])
+        self.assertEqual(prop.stats.records[-1]["method"],"propagate_both")
+        self.assertEqual(prop.stats.records[-1]["shapes"],[(60,60)])
+
+        prop = MCPropagation(1000,seed=12345,batch_size=400,stats=True)
+        prop.propagate_systematic(function,xs,xerrs,return_corr=True)
+        self.assertEqual(prop.stats.summary()["evaluate_func"]["count"],3)
+        self.assertEqual(len(MCPropagation(1000).stats.records),0)
+
+    def test_corr_lowrank(self):
+        uf,ucorr = MCPropagation(500,seed=12345).propagate_both(functionb,xsb,xerrsb,xerrsb)
+        for prop in [MCPropagation(500,seed=12345,corr_format="lowrank"),
+                     MCPropagation(500,seed=12345,corr_format="lowrank",batch_size=200)]:
+            uf2,ucorr2 = prop.propagate_both(functionb,xsb,xerrsb,xerrsb)
+            self.assertIsInstance(ucorr2,LowRankCorrelation)
+            self.assertEqual(ucorr2.shape,(60,60))
+            npt.assert_allclose(ucorr2.to_dense(),ucorr,atol=1e-8)
+
+        # a random and a systematic component give a correlation matrix of rank 1 plus noise
+        prop = MCPropagation(500,seed=12345,corr_format="lowrank",corr_rank=1)
+        uf,ucorr = prop.propagate_both(functionb,xsb,xerrsb,xerrsb)
+        self.assertEqual(ucorr.factor.shape,(60,1))
+        npt.assert_allclose(ucorr.block(slice(0,5),slice(5,10)),0.5*np.ones((5,5)),atol=0.1)
+
+        # correlation matrices along an axis stay dense
+        ufb,ucorrb = MCPropagation(500,seed=12345,corr_format="lowrank").propagate_systematic(functionb,xsb,xerrsb,return_corr=True,corr_axis=0)
+        npt.assert_allclose(ucorrb,np.ones((20,20)),atol=1e-6)
+        self.assertRaises(ValueError,MCPropagation,100,corr_format="sparse")
+
+    def test_corr_memmap(self):
+        uf,ucorr = MCPropagation(500,seed=12345).propagate_both(functionb,xsb,xerrsb,xerrsb)
+        ufd,ucorrd,corr_out = MCPropagation(500,seed=12345).propagate_random(functiond,xsd,xerrsd,return_corr=True,output_vars=2)
+        with tempfile.TemporaryDirectory() as corr_dir:
+            prop = MCPropagation(500,seed=12345,corr_format="memmap",corr_dir=corr_dir,corr_tile_size=16,batch_size=200)
+            uf2,ucorr2 = prop.propagate_both(functionb,xsb,xerrsb,xerrsb)
+            self.assertIsInstance(ucorr2,np.memmap)
+            npt.assert_allclose(ucorr2,ucorr,atol=1e-8)
+
+            prop = MCPropagation(500,seed=12345,corr_format="memmap",corr_dir=corr_dir,corr_upper=True,
+                                 parallel_cores=2,parallel_backend="threads",parallel_mode="chunks")
+            ufd2,ucorrd2,corr_out2 = prop.propagate_random(functiond,xsd,xerrsd,return_corr=True,output_vars=2)
+            npt.assert_allclose(ucorrd2[1],np.triu(ucorrd[1]),atol=1e-8)
+            npt.assert_allclose(corr_out2,corr_out,atol=1e-8)
+            self.assertTrue(os.path.exists(os.path.join(corr_dir,"corr_y1.npy")))
+            del ucorr2,ucorrd2
+        self.assertRaises(ValueError,MCPropagation,100,corr_format="memmap")
+
+    def test_corr_memmap_batches(self):
+        x = [np.ones(1000),2*np.ones(1000)]
+        u_x = [0.1*np.ones(1000),0.2*np.ones(1000)]
+        nbytes = 1000*4000*8
+        with tempfile.TemporaryDirectory() as corr_dir:
+            prop = MCPropagation(4000,seed=12345,corr_format="memmap",corr_dir=corr_dir,corr_tile_size=100,batch_size=200)
+            tracemalloc.start()
+            try:
+                uf,ucorr = prop.propagate_random(function,x,u_x,return_corr=True)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            # the samples of the measurand are streamed to disk rather than kept in memory
+            self.assertLess(peak,nbytes/2)
+            self.assertEqual(np.load(os.path.join(corr_dir,"MC_y.npy"),mmap_mode="r").shape,(1000,4000))
+            npt.assert_allclose(np.diag(ucorr),1.)
+            del ucorr
+
+            prop = MCPropagation(4000,seed=12345,corr_format="memmap",corr_dir=corr_dir,corr_tile_size=100,batch_size=200)
+            tracemalloc.start()
+            try:
+                uf,ucorr,corr_out = prop.propagate_random(functiond,x,u_x,return_corr=True,output_vars=2)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            # the correlation between the output parameters is calculated from chunks of the stored samples
+            self.assertLess(peak,nbytes/2)
+            uf,ucorr_dense,corr_out_dense = MCPropagation(4000,seed=12345,batch_size=200).propagate_random(functiond,x,u_x,return_corr=True,output_vars=2)
+            npt.assert_allclose(corr_out,corr_out_dense,atol=1e-8)
+            npt.assert_allclose(ucorr[1],ucorr_dense[1],atol=1e-8)
+            del ucorr
+
+        prop = MCPropagation(4000,seed=12345,corr_format="lowrank",batch_size=200)
+        tracemalloc.start()
+        try:
+            uf,ucorr = prop.propagate_random(function,x,u_x,return_corr=True)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        # the batches are written into a single array (which the factor is then calculated from), rather than concatenated
+        self.assertLess(peak,2.5*nbytes)
+        npt.assert_allclose(ucorr.diagonal(),1.)
+
+    def test_samples_dir(self):
+        uf,ucorr,yvalues,xvalues = MCPropagation(2000,seed=12345).propagate_both(functionb,xsb,xerrsb,xerrsb,return_samples=True)
+        with tempfile.TemporaryDirectory() as samples_dir:
+            for prop in [MCPropagation(2000,seed=12345,samples_dir=samples_dir),
+                         MCPropagation(2000,seed=12345,samples_dir=samples_dir,batch_size=700)]:
+                uf2,ucorr2,yvalues2,xvalues2 = prop.propagate_both(functionb,xsb,xerrsb,xerrsb,return_samples=True)
+                self.assertIsInstance(yvalues2,np.memmap)
+                self.assertIsInstance(xvalues2[1],np.memmap)
+                npt.assert_array_equal(yvalues2,yvalues)
+                npt.assert_array_equal(xvalues2[1],xvalues[1])
+                npt.assert_allclose(ucorr2,ucorr,atol=1e-8)
+
+            # in the adaptive procedure, only the MC iterations that were used are returned
+            prop = MCPropagation(1000,seed=12345,batch_size=500,tolerance=10.,max_steps=3000,samples_dir=samples_dir)
+            uf,yvalues,xvalues = prop.propagate_systematic(function,xs,xerrs,return_samples=True)
+            self.assertEqual(yvalues.shape,(200,prop.MCsteps_used))
+            npt.assert_allclose(np.std(yvalues,axis=-1),uf,rtol=1e-6)
+            del yvalues,xvalues,xvalues2,yvalues2
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,83 @@
+"""
+Tests for random streams
+"""
+
+import unittest
+import numpy as np
+import numpy.testing as npt
+from punpy.version import __version__
+from punpy.mc.random_streams import RandomStream,SobolDimensions,qmc
+try:
+    from scipy.special import ndtr
+except ImportError:
+    ndtr = None
+
+'''___Authorship___'''
+__author__ = "Pieter De Vis"
+__created__ = "18/10/2026"
+__version__ = __version__
+__maintainer__ = "Pieter De Vis"
+__email__ = "pieter.de.vis@npl.co.uk"
+__status__ = "Development"
+
+class TestRandomStream(unittest.TestCase):
+    """
+    Class for unit tests
+    """
+    def test_standard_normal(self):
+        stream = RandomStream(np.random.SeedSequence(42))
+        for shape in [(),(200,),(20,3,4)]:
+            z = stream.standard_normal(shape,0,10000)
+            self.assertEqual(z.shape,shape+(10000,))
+            # the numbers for a range of MC iterations do not depend on how the range is split
+            z_split = np.concatenate([stream.standard_normal(shape,start,min(start+777,10000))
+                                      for start in range(0,10000,777)],axis=-1)
+            npt.assert_array_equal(z,z_split)
+            npt.assert_array_equal(z[...,1234:5678],stream.standard_normal(shape,1234,5678))
+
+        npt.assert_allclose(np.std(stream.standard_normal((),0,100000)),1,rtol=0.01)
+        self.assertFalse(np.any(stream.standard_normal((),0,100)==stream.standard_normal((),0,100,substream=1)))
+        self.assertEqual(stream.standard_normal((3,),5,5).shape,(3,0))
+        self.assertEqual(stream.standard_normal((3,),0,5000,dtype=np.float32).dtype,np.float32)
+
+    def test_seed(self):
+        z1 = RandomStream(np.random.SeedSequence(42)).standard_normal((10,),0,100)
+        z2 = RandomStream(np.random.SeedSequence(42)).standard_normal((10,),0,100)
+        z3 = RandomStream(np.random.SeedSequence(43)).standard_normal((10,),0,100)
+        npt.assert_array_equal(z1,z2)
+        self.assertFalse(np.any(z1==z3))
+
+    @unittest.skipIf(qmc is None,"scipy is not installed")
+    def test_sampling(self):
+        for sampling in ["sobol","lhs"]:
+            stream = RandomStream(np.random.SeedSequence(42),sampling,steps=4096)
+            z = stream.standard_normal((20,3),0,4096)
+            self.assertEqual(z.shape,(20,3,4096))
+            npt.assert_allclose(np.mean(z,axis=-1),0,atol=0.01)
+            npt.assert_allclose(np.std(z,axis=-1),1,atol=0.01)
+            z_split = np.concatenate([stream.standard_normal((20,3),start,min(start+1000,4096))
+                                      for start in range(0,4096,1000)],axis=-1)
+            npt.assert_array_equal(z,z_split)
+
+        # the last block (of 214 of the 262 MC iterations in each block) is a Latin hypercube of its own length
+        stream = RandomStream(np.random.SeedSequence(42),"lhs",steps=1000)
+        self.assertEqual(stream.blocks(700,1200,262),[(2,524,262),(3,786,214),(4,1000,262)])
+        z = stream.standard_normal((1000,),0,1000)
+        z_split = np.concatenate([stream.standard_normal((1000,),start,min(start+300,1000)) for start in range(0,1000,300)],axis=-1)
+        npt.assert_array_equal(z,z_split)
+        strata = np.sort(np.floor(ndtr(z[:,786:])*214),axis=-1)
+        npt.assert_array_equal(strata,np.broadcast_to(np.arange(214),(1000,214)))
+        z_random = RandomStream(np.random.SeedSequence(42),steps=1000).standard_normal((1000,),0,1000)
+        self.assertLess(np.sqrt(np.mean(np.mean(z,axis=-1)**2)),0.1*np.sqrt(np.mean(np.mean(z_random,axis=-1)**2)))
+
+        # streams sharing a Sobol sequence use different dimensions of it
+        sobol_dimensions = SobolDimensions()
+        streams = [RandomStream(seed_sequence,"sobol",sobol_dimensions=sobol_dimensions)
+                   for seed_sequence in np.random.SeedSequence(42).spawn(2)]
+        z1 = streams[0].standard_normal((5,),0,1024)
+        z2 = streams[1].standard_normal((),0,1024)
+        self.assertEqual(sobol_dimensions.offsets,{(0,0):0,(1,0):5})
+        self.assertLess(abs(np.corrcoef(z1[0],z2)[0,1]),0.05)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+"""
+Tests for result cache
+"""
+
+import os
+import time
+import tempfile
+import threading
+import functools
+import unittest
+import numpy as np
+import numpy.testing as npt
+from punpy.version import __version__
+from punpy.mc.result_cache import ResultCache,function_identity
+from punpy.mc.structured_covariance import LowRankCovariance
+from punpy.mc.mc_propagation import MCPropagation
+
+'''___Authorship___'''
+__author__ = "Pieter De Vis"
+__created__ = "18/10/2026"
+__version__ = __version__
+__maintainer__ = "Pieter De Vis"
+__email__ = "pieter.de.vis@npl.co.uk"
+__status__ = "Development"
+
+def function(x1,x2):
+    return 2*x1-x2
+
+def function_scaled(x1,x2,scale=1.):
+    return scale*(2*x1-x2)
+
+class Model:
+    def __init__(self,scale):
+        self.scale = scale
+
+    def measure(self,x1,x2):
+        return self.scale*(2*x1-x2)
+
+    def __call__(self,x1,x2):
+        return self.measure(x1,x2)
+
+class LockedModel:
+    __slots__ = ("scale","lock")
+
+    def __init__(self,scale):
+        self.scale = scale
+        self.lock = threading.Lock()
+
+    def __call__(self,x1,x2):
+        return self.scale*(2*x1-x2)
+
+xs = [np.arange(1.,21.),np.ones(20)]
+xerrs = [0.1*np.ones(20),0.2*np.ones(20)]
+
+class TestResultCache(unittest.TestCase):
+    """
+    Class for unit tests
+    """
+    def test_key(self):
+        key = ResultCache.key(xs,None,1000)
+        self.assertEqual(ResultCache.key([x.copy() for x in xs],None,1000),key)
+        self.assertNotEqual(ResultCache.key([xs[0],xs[1]*2],None,1000),key)
+        self.assertNotEqual(ResultCache.key([xs[0],xs[1].astype(np.float32)],None,1000),key)
+        self.assertNotEqual(ResultCache.key(xs,None,2000),key)
+        cov = LowRankCovariance(np.ones(20),np.ones((20,2)))
+        self.assertEqual(ResultCache.key(cov),ResultCache.key(LowRankCovariance(np.ones(20),np.ones((20,2)))))
+        self.assertNotEqual(ResultCache.key(cov),ResultCache.key(LowRankCovariance(np.ones(20),np.zeros((20,2)))))
+
+    def test_function_identity(self):
+        self.assertEqual(function_identity(function),function_identity(function))
+        self.assertNotEqual(function_identity(function),function_identity(lambda x1,x2: 2*x1-x2))
+        self.assertNotEqual(function_identity(functools.partial(function_scaled,scale=2.)),
+                            function_identity(functools.partial(function_scaled,scale=3.)))
+
+        def make_function(scale):
+            return lambda x1,x2: scale*x1
+        self.assertEqual(function_identity(make_function(np.ones(3))),function_identity(make_function(np.ones(3))))
+        self.assertNotEqual(function_identity(make_function(np.ones(3))),function_identity(make_function(np.zeros(3))))
+
+        # the state of the instance of bound methods and callable instances is part of their identity
+        self.assertEqual(function_identity(Model(1.).measure),function_identity(Model(1.).measure))
+        self.assertNotEqual(function_identity(Model(1.).measure),function_identity(Model(100.).measure))
+        self.assertNotEqual(function_identity(Model(1.)),function_identity(Model(100.)))
+        self.assertNotEqual(function_identity(Model(1.)),function_identity(Model(1.).measure))
+        self.assertIsNone(function_identity(LockedModel(1.)))
+
+        function_versioned = make_function(1.)
+        function_versioned.__version__ = "1.0"
+        self.assertTrue(function_identity(function_versioned).endswith(":1.0"))
+
+    def test_eviction(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResultCache(directory)
+            cache.put("a",np.ones(100))
+            nbytes = cache.stats()["nbytes"]
+            cache = ResultCache(directory,max_bytes=3*nbytes)
+            for key in "bc":
+                cache.put(key,np.ones(100))
+            self.assertIsNone(cache.get("d"))
+            npt.assert_equal(cache.get("a"),np.ones(100))
+            # the least recently used result was evicted
+            time.sleep(0.01)
+            cache.put("d",np.ones(100))
+            self.assertEqual(cache.stats(),{"hits":1,"misses":1,"evictions":1,"size":3,"nbytes":3*nbytes})
+            self.assertFalse(os.path.exists(cache.path("b")))
+
+            cache = ResultCache(directory,max_bytes=nbytes-1)
+            cache.put("e",np.ones(100))
+            self.assertIsNone(cache.get("e"))
+            cache.clear()
+            self.assertEqual(cache.stats()["size"],0)
+
+    def test_propagate(self):
+        with tempfile.TemporaryDirectory() as directory:
+            prop = MCPropagation(1000,seed=12345,result_cache=directory)
+            uf,ucorr = prop.propagate_random(function,xs,xerrs,return_corr=True)
+            uf_syst,ucorr_syst,yvalues,xvalues = prop.propagate_systematic(function,xs,xerrs,return_corr=True,return_samples=True)
+            self.assertEqual(prop.result_cache.stats()["size"],2)
+
+            prop_cached = MCPropagation(1000,seed=12345,result_cache=ResultCache(directory))
+            uf_cached,ucorr_cached = prop_cached.propagate_random(function,xs,xerrs,return_corr=True)
+            npt.assert_equal(uf_cached,uf)
+            npt.assert_equal(ucorr_cached,ucorr)
+            self.assertEqual(prop_cached.MCsteps_used,1000)
+            uf_cached,ucorr_cached,yvalues_cached,xvalues_cached = prop_cached.propagate_systematic(function,xs,xerrs,return_corr=True,return_samples=True)
+            npt.assert_equal(uf_cached,uf_syst)
+            npt.assert_equal(yvalues_cached,yvalues)
+            npt.assert_equal(np.asarray(xvalues_cached[1]),np.asarray(xvalues[1]))
+            self.assertEqual(prop_cached.result_cache.stats()["hits"],2)
+
+            # later calls give the same results as without the cache
+            prop_uncached = MCPropagation(1000,seed=12345)
+            prop_uncached.propagate_random(function,xs,xerrs,return_corr=True)
+            prop_uncached.propagate_systematic(function,xs,xerrs,return_corr=True,return_samples=True)
+            npt.assert_equal(prop_cached.propagate_both(function,xs,xerrs,xerrs)[0],prop_uncached.propagate_both(function,xs,xerrs,xerrs)[0])
+
+            # different inputs, seeds or measurement functions are not found in the cache
+            prop_cached = MCPropagation(1000,seed=12345,result_cache=ResultCache(directory))
+            prop_cached.propagate_random(function,[xs[0],2*xs[1]],xerrs,return_corr=True)
+            prop_cached.propagate_random(lambda x1,x2: x1+x2,xs,xerrs,return_corr=True)
+            MCPropagation(1000,seed=1,result_cache=prop_cached.result_cache).propagate_random(function,xs,xerrs,return_corr=True)
+            self.assertEqual(prop_cached.result_cache.stats()["hits"],0)
+            self.assertEqual(prop_cached.result_cache.stats()["size"],6)
+
+        self.assertRaises(ValueError,MCPropagation,1000,result_cache=directory)
+
+    def test_propagate_instances(self):
+        with tempfile.TemporaryDirectory() as directory:
+            uf = MCPropagation(1000,seed=12345,result_cache=directory).propagate_random(Model(1.).measure,xs,xerrs)
+            uf_scaled = MCPropagation(1000,seed=12345,result_cache=directory).propagate_random(Model(100.).measure,xs,xerrs)
+            npt.assert_allclose(uf_scaled,100*uf)
+            uf_call = MCPropagation(1000,seed=12345,result_cache=directory).propagate_random(Model(100.),xs,xerrs)
+            npt.assert_allclose(uf_call,uf_scaled)
+
+            # instances of which the state cannot be hashed are not cached
+            prop = MCPropagation(1000,seed=12345,result_cache=directory)
+            prop.propagate_random(LockedModel(1.),xs,xerrs)
+            npt.assert_allclose(MCPropagation(1000,seed=12345,result_cache=directory).propagate_random(LockedModel(100.),xs,xerrs),uf_scaled)
+            self.assertEqual(prop.result_cache.stats()["size"],3)
+
+if __name__ == '__main__':
+    unittest.main()
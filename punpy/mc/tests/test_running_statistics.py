@@ -0,0 +1,61 @@
+"""
+Tests for running statistics classes
+"""
+
+import unittest
+import numpy as np
+import numpy.testing as npt
+from punpy.version import __version__
+from punpy.mc.running_statistics import RunningStatistics,RunningCovariance,RunningCorrelation
+from punpy.mc.mc_propagation import MCPropagation
+
+'''___Authorship___'''
+__author__ = "Pieter De Vis"
+__created__ = "18/10/2026"
+__version__ = __version__
+__maintainer__ = "Pieter De Vis"
+__email__ = "pieter.de.vis@npl.co.uk"
+__status__ = "Development"
+
+samples = np.random.normal(size=(20,3,1000))*np.arange(1,4)[None,:,None]+50.
+
+class TestRunningStatistics(unittest.TestCase):
+    """
+    Class for unit tests
+    """
+    def test_update(self):
+        stats = RunningStatistics()
+        for start in range(0,1000,300):
+            stats.update(samples[...,start:start+300])
+
+        self.assertEqual(stats.count,1000)
+        npt.assert_allclose(stats.mean,np.mean(samples,axis=-1),rtol=1e-12)
+        npt.assert_allclose(stats.std(),np.std(samples,axis=-1),rtol=1e-10)
+        npt.assert_allclose(stats.variance(ddof=1),np.var(samples,axis=-1,ddof=1),rtol=1e-10)
+
+    def test_update_scalar(self):
+        stats = RunningStatistics()
+        stats.update(samples[0,0,:1])
+        stats.update(samples[0,0,1:])
+        npt.assert_allclose(stats.std(),np.std(samples[0,0]),rtol=1e-10)
+
+    def test_covariance(self):
+        stats = RunningCovariance()
+        for start in range(0,1000,300):
+            stats.update(samples[0,:,start:start+300])
+
+        npt.assert_allclose(stats.covariance(ddof=1),np.cov(samples[0]),rtol=1e-10)
+        npt.assert_allclose(stats.correlation(),np.corrcoef(samples[0]),atol=1e-10)
+
+    def test_correlation(self):
+        prop = MCPropagation(1000)
+        samples4d = np.random.normal(size=(4,3,2,1000))
+        for MC_y,corr_axes in [(samples[0,0],[-99]),(samples[:,0],[-99]),(samples,[-99,0,1]),(samples4d,[-99,0,1,2])]:
+            for corr_axis in corr_axes:
+                stats = RunningCorrelation(corr_axis)
+                for start in range(0,1000,300):
+                    stats.update(MC_y[...,start:start+300])
+                npt.assert_allclose(stats.correlation(),prop.calculate_corr(MC_y,corr_axis),atol=1e-10)
+
+if __name__ == '__main__':
+    unittest.main()
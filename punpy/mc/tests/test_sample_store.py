@@ -0,0 +1,42 @@
+"""
+Tests for sample store
+"""
+
+import tempfile
+import unittest
+import numpy as np
+import numpy.testing as npt
+from punpy.version import __version__
+from punpy.mc.sample_store import SampleStore
+from punpy.mc.factored_samples import SystematicSamples
+
+'''___Authorship___'''
+__author__ = "Pieter De Vis"
+__created__ = "18/10/2026"
+__version__ = __version__
+__maintainer__ = "Pieter De Vis"
+__email__ = "pieter.de.vis@npl.co.uk"
+__status__ = "Development"
+
+class TestSampleStore(unittest.TestCase):
+    """
+    Class for unit tests
+    """
+    def test_write_read(self):
+        rng = np.random.default_rng(12345)
+        MC_y = rng.standard_normal((3,4,100)).astype(np.float32)
+        MC_x = SystematicSamples(np.ones(300),0.5,rng.standard_normal(100))
+        with tempfile.TemporaryDirectory() as directory:
+            store = SampleStore(directory,150)
+            store.write_MC(MC_y[...,:60],[MC_x[...,:60]])
+            store.write_MC(MC_y[...,60:],[MC_x[...,60:]],start=60)
+            MC_y2,MC_data = store.read_MC(1,100)
+            self.assertEqual(MC_y2.dtype,np.float32)
+            self.assertFalse(MC_y2.flags.writeable)
+            npt.assert_array_equal(MC_y2,MC_y)
+            npt.assert_array_equal(MC_data[0],np.asarray(MC_x))
+            self.assertEqual(np.load(store.path("MC_x0")).shape,(300,150))
+            del MC_y2,MC_data
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+"""
+Tests for structured covariance matrices
+"""
+
+import unittest
+import numpy as np
+import numpy.testing as npt
+from punpy.version import __version__
+from punpy.mc.structured_covariance import LowRankCovariance,BlockDiagonalCovariance,KroneckerCovariance
+from punpy.mc.mc_propagation import MCPropagation
+from punpy.lpu.lpu_propagation import LPUPropagation
+
+'''___Authorship___'''
+__author__ = "Pieter De Vis"
+__created__ = "18/10/2026"
+__version__ = __version__
+__maintainer__ = "Pieter De Vis"
+__email__ = "pieter.de.vis@npl.co.uk"
+__status__ = "Development"
+
+def correlation_matrix(n,length):
+    index = np.arange(n)
+    return np.exp(-np.abs(index[:,None]-index[None,:])/length)
+
+rng = np.random.default_rng(12345)
+covs = [LowRankCovariance(np.ones(12)*0.5,rng.normal(size=(12,2))),
+        BlockDiagonalCovariance([correlation_matrix(4,2.),2*correlation_matrix(8,3.)]),
+        KroneckerCovariance([correlation_matrix(3,1.),0.5*correlation_matrix(4,2.)])]
+
+class TestStructuredCovariance(unittest.TestCase):
+    """
+    Class for unit tests
+    """
+    def test_dense(self):
+        cov = covs[0].to_dense()
+        npt.assert_allclose(cov,np.diag(covs[0].diag)+np.dot(covs[0].factor_lowrank,covs[0].factor_lowrank.T))
+        cov = covs[1].to_dense()
+        npt.assert_allclose(cov[:4,:4],correlation_matrix(4,2.))
+        npt.assert_allclose(cov[4:,:4],0)
+        cov = covs[2].to_dense()
+        npt.assert_allclose(cov,np.kron(correlation_matrix(3,1.),0.5*correlation_matrix(4,2.)))
+
+        for cov in covs:
+            npt.assert_allclose(cov.diagonal(),np.diag(cov.to_dense()))
+            index = np.array([1,2,5,6,9,10])
+            npt.assert_allclose(np.asarray(cov.subset(index).to_dense()),cov.to_dense()[np.ix_(index,index)])
+
+    def test_correlate(self):
+        for cov in covs:
+            z = rng.normal(size=(cov.n_random,5))
+            npt.assert_allclose(cov.correlate(z),np.dot(cov.factor(),z))
+            self.assertEqual(cov.correlate(z.astype(np.float32)).dtype,np.float32)
+
+    def test_propagate_cov(self):
+        prop = MCPropagation(20000,seed=12345)
+        x = np.ones((3,4))
+        for cov in covs:
+            uf,ucorr,yvalues,xvalues = prop.propagate_cov(lambda x1,x2: x1+x2,[x,x],[cov,np.zeros((12,12))],return_samples=True)
+            npt.assert_allclose(np.cov(xvalues[0].reshape((12,-1))),cov.to_dense(),atol=0.1)
+            npt.assert_allclose(uf,np.sqrt(cov.diagonal()).reshape((3,4)),rtol=0.03)
+
+            uf_lpu = LPUPropagation().propagate_cov(lambda x1,x2: x1+x2,[x,x],[cov,np.zeros((12,12))],return_corr=False)
+            npt.assert_allclose(uf_lpu,np.sqrt(cov.diagonal()).reshape((3,4)),rtol=1e-6)
+
+            uf_tiles = MCPropagation(20000,seed=12345,tile_shape=(2,)).propagate_cov(lambda x1,x2: x1+x2,[x,x],[cov,np.zeros((12,12))],return_corr=False)
+            npt.assert_allclose(uf_tiles,uf,rtol=0.05)
+
+        self.assertRaises(ValueError,prop.propagate_cov,lambda x1: x1,[np.ones(5)],[covs[0]])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -25,5 +25,6 @@ setup(name='punpy',
       url='https://github.com/pdevis/punpy',
       keywords="uncertainty propagation covariance MC measurement function",
       packages=find_packages(exclude=['contrib', 'docs', 'tests']),
-      install_requires=['numpy','matplotlib'],
+      install_requires=['numpy>=1.18.1','matplotlib'],
+      extras_require={'qmc':['scipy']},
 )